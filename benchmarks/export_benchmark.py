@@ -0,0 +1,376 @@
+"""Benchmarks the physics exporter on synthetic scenes.
+
+Every case of the matrix (object count, triangles per object, parent depth, armature parent,
+combine meshes) runs in a fresh background Blender process, so peak memory is per case.
+Conversions go through stand_in_converter.py instead of LSPakUtilityBulletToPhysX.
+
+    blender -b --factory-startup --python benchmarks/export_benchmark.py -- run --output results.json
+    python benchmarks/export_benchmark.py run --blender /path/to/blender --objects 1,20 --triangles 5000
+    python benchmarks/export_benchmark.py compare before.json after.json
+    python benchmarks/export_benchmark.py writer --triangles 4000000
+
+The addon is loaded from this working tree, not from Blender's addons folder.
+"""
+from itertools import product
+import argparse
+import json
+import os
+import platform
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADDON_NAME = "dos2de_bullet_exporter"
+RESULTS_VERSION = 1
+MATRIX_KEYS = ("objects", "triangles", "parent_depth", "armature", "combine")
+
+def script_arguments(argv):
+    if "--" in argv:
+        return argv[argv.index("--") + 1:]
+    return argv[1:]
+
+def peak_rss_bytes():
+    """Peak resident memory of this process, or None where it can't be read."""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+    return None
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, stderr=subprocess.DEVNULL).decode("ascii").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def write_converter_launcher(directory, python):
+    """Write an executable that runs stand_in_converter.py, since the exporter runs binutil_path directly."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stand_in_converter.py")
+    if sys.platform == "win32":
+        path = os.path.join(directory, "stand_in_converter.bat")
+        with open(path, "w") as f:
+            f.write('@"{}" "{}" %*\n'.format(python, script))
+    else:
+        path = os.path.join(directory, "stand_in_converter.sh")
+        with open(path, "w") as f:
+            f.write('#!/bin/sh\nexec "{}" "{}" "$@"\n'.format(python, script))
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return path
+
+def sphere_arrays(triangle_count, seed):
+    """A closed, slightly lumpy UV sphere with about triangle_count triangles."""
+    import numpy
+    rings = max(2, int(round((triangle_count / 4.0) ** 0.5)))
+    segments = max(3, int(round(triangle_count / (2.0 * rings))))
+    u = numpy.linspace(0.0, 2.0 * numpy.pi, segments, endpoint=False)
+    v = numpy.linspace(0.0, numpy.pi, rings + 1)[1:-1]
+    uu, vv = numpy.meshgrid(u, v, indexing="ij")
+    radius = 1.0 + 0.1 * numpy.sin(3.0 * uu + seed) * numpy.sin(2.0 * vv)
+    ring_points = numpy.stack((numpy.cos(uu) * numpy.sin(vv) * radius, numpy.sin(uu) * numpy.sin(vv) * radius, numpy.cos(vv) * radius), axis=-1)
+    vertices = numpy.concatenate((ring_points.reshape(-1, 3), ((0.0, 0.0, 1.0), (0.0, 0.0, -1.0))))
+    top, bottom = len(vertices) - 2, len(vertices) - 1
+
+    i, j = numpy.meshgrid(numpy.arange(segments), numpy.arange(rings - 2), indexing="ij")
+    a = i * (rings - 1) + j
+    b = ((i + 1) % segments) * (rings - 1) + j
+    quads = numpy.stack((a, b, b + 1, a + 1), axis=-1).reshape(-1, 4)
+    first = numpy.arange(segments) * (rings - 1)
+    following = numpy.roll(first, -1)
+    triangles = numpy.concatenate((
+        quads[:, (0, 1, 2)], quads[:, (0, 2, 3)],
+        numpy.stack((numpy.full(segments, top), following, first), axis=1),
+        numpy.stack((numpy.full(segments, bottom), first + rings - 2, following + rings - 2), axis=1)))
+    return vertices.astype(numpy.float32), triangles.astype(numpy.int32)
+
+def build_scene(scene, case):
+    """Fill scene with the case's synthetic objects."""
+    import bpy
+    import numpy
+    from mathutils import Euler, Vector
+
+    for obj in list(scene.objects):
+        bpy.data.objects.remove(obj, do_unlink=True)
+
+    for index in range(case["objects"]):
+        vertices, triangles = sphere_arrays(case["triangles"], index)
+        mesh = bpy.data.meshes.new("bench_mesh_{}".format(index))
+        mesh.vertices.add(len(vertices))
+        mesh.vertices.foreach_set("co", vertices.ravel())
+        mesh.loops.add(triangles.size)
+        mesh.loops.foreach_set("vertex_index", triangles.ravel())
+        mesh.polygons.add(len(triangles))
+        mesh.polygons.foreach_set("loop_start", numpy.arange(0, triangles.size, 3, dtype=numpy.int32))
+        mesh.polygons.foreach_set("loop_total", numpy.full(len(triangles), 3, dtype=numpy.int32))
+        mesh.update(calc_edges=True)
+
+        obj = bpy.data.objects.new("bench_object_{}".format(index), mesh)
+        obj.location = Vector((index * 3.0, 0.0, 0.0))
+        scene.objects.link(obj)
+
+        parent = None
+        for depth in range(case["parent_depth"]):
+            empty = bpy.data.objects.new("bench_parent_{}_{}".format(index, depth), None)
+            empty.location = Vector((0.0, 0.5, 0.25))
+            empty.rotation_euler = Euler((0.1, 0.0, 0.2))
+            empty.parent = parent
+            scene.objects.link(empty)
+            parent = empty
+        if case["armature"]:
+            armature = bpy.data.objects.new("bench_armature_{}".format(index), bpy.data.armatures.new("bench_armature_{}".format(index)))
+            armature.parent = parent
+            scene.objects.link(armature)
+            parent = armature
+        obj.parent = parent
+    scene.update()
+
+def run_case(case, repeat, settings):
+    """Build the case's scene in the running Blender and export it repeat times."""
+    import addon_utils
+    import bpy
+
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    if addon_utils.enable(ADDON_NAME, default_set=True) is None:
+        raise Exception("[DOS2DE-Physics] Couldn't enable the '{}' addon.".format(ADDON_NAME))
+
+    work_dir = tempfile.mkdtemp(prefix="dos2de_physics_bench_")
+    try:
+        started = time.perf_counter()
+        build_scene(bpy.context.scene, case)
+        generate_seconds = time.perf_counter() - started
+        baseline_rss = peak_rss_bytes()
+
+        kwargs = {
+            "filepath": os.path.join(work_dir, "bench.bullet"),
+            "export_method": "NATIVE",
+            "export_combine_visible": case["combine"],
+            "binconversion_enabled": True,
+            "binutil_path": write_converter_launcher(work_dir, bpy.app.binary_path_python),
+        }
+        kwargs.update(settings)
+
+        seconds = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = bpy.ops.export_scene.dos2de_physics(**kwargs)
+            seconds.append(time.perf_counter() - started)
+            if "FINISHED" not in result:
+                raise Exception("[DOS2DE-Physics] Export returned {}.".format(sorted(result)))
+        outputs = [x for x in os.listdir(work_dir) if x.endswith(".bin")]
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    ordered = sorted(seconds)
+    return {
+        "seconds": seconds,
+        "best_seconds": ordered[0],
+        "median_seconds": ordered[len(ordered) // 2],
+        "generate_seconds": generate_seconds,
+        "baseline_rss_bytes": baseline_rss,
+        "peak_rss_bytes": peak_rss_bytes(),
+        "outputs": len(outputs),
+    }
+
+def case_main(args):
+    try:
+        result = run_case(json.loads(args.case), args.repeat, json.loads(args.settings_json))
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        result = {"error": str(e)}
+    with open(args.result, "w") as f:
+        json.dump(result, f)
+
+def int_list(text):
+    return [int(x) for x in text.split(",") if x.strip()]
+
+def bool_list(text):
+    return [x.strip().lower() in ("1", "true", "yes", "on") for x in text.split(",") if x.strip()]
+
+def run_main(args):
+    blender = args.blender
+    if blender is None:
+        try:
+            import bpy
+            blender = bpy.app.binary_path
+        except ImportError:
+            raise SystemExit("--blender is required outside of Blender")
+
+    settings = {}
+    for pair in args.setting:
+        name, _, value = pair.partition("=")
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass
+        settings[name.strip()] = value
+
+    matrix = [dict(zip(MATRIX_KEYS, values)) for values in product(
+        args.objects, args.triangles, args.parent_depth, args.armature, args.combine)]
+    cases = []
+    for number, case in enumerate(matrix, 1):
+        handle, result_path = tempfile.mkstemp(suffix=".json", prefix="dos2de_physics_bench_")
+        os.close(handle)
+        try:
+            command = [blender, "-b", "--factory-startup", "--python", os.path.abspath(__file__), "--",
+                "case", "--case", json.dumps(case), "--repeat", str(args.repeat),
+                "--settings-json", json.dumps(settings), "--result", result_path]
+            process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            result = {"error": "Blender exited without a result (exit code {}).".format(process.returncode)}
+            if os.path.getsize(result_path) > 0:
+                with open(result_path, "r") as f:
+                    result = json.load(f)
+        finally:
+            os.remove(result_path)
+        result.update(case)
+        cases.append(result)
+        if "error" in result:
+            print("[DOS2DE-Physics] [{}/{}] {} failed: {}".format(number, len(matrix), case, result["error"]))
+        else:
+            print("[DOS2DE-Physics] [{}/{}] {} {:.3f}s".format(number, len(matrix), case, result["median_seconds"]))
+
+    results = {
+        "version": RESULTS_VERSION,
+        "commit": git_commit(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "settings": settings,
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "cases": cases,
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=1, sort_keys=True)
+    print("[DOS2DE-Physics] Wrote {} benchmark results to '{}'.".format(len(cases), args.output))
+    return 1 if any("error" in x for x in cases) else 0
+
+def load_addon_module(name):
+    """Import one of the addon's bpy independent modules straight from the working tree."""
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(name, os.path.join(REPO_ROOT, ADDON_NAME, name + ".py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def writer_main(args):
+    """Write one large triangle mesh and check the writer's peak extra memory stays within a few blocks."""
+    import tracemalloc
+    import numpy
+    bullet_writer = load_addon_module("bullet_writer")
+
+    vertices, triangles = sphere_arrays(args.triangles, 0)
+    shape = bullet_writer.TriangleMeshShape(vertices, triangles)
+    limit = args.max_blocks * bullet_writer.WRITE_BLOCK_BYTES
+    handle, path = tempfile.mkstemp(suffix=".bullet", prefix="dos2de_physics_bench_")
+    os.close(handle)
+    try:
+        tracemalloc.start()
+        started = time.perf_counter()
+        file_bytes = bullet_writer.write_bullet_file(path, [bullet_writer.RigidBody(shape)])
+        seconds = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    finally:
+        os.remove(path)
+
+    result = {
+        "triangles": len(triangles),
+        "vertices": len(vertices),
+        "mesh_bytes": int(vertices.nbytes + triangles.nbytes),
+        "file_bytes": file_bytes,
+        "seconds": seconds,
+        "peak_extra_bytes": peak,
+        "block_bytes": bullet_writer.WRITE_BLOCK_BYTES,
+        "limit_bytes": limit,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=1, sort_keys=True)
+    print("[DOS2DE-Physics] Wrote {} triangles ({} bytes) in {:.3f}s with {} bytes of extra memory at peak (limit {}).".format(
+        result["triangles"], file_bytes, seconds, peak, limit))
+    return 0 if peak <= limit else 1
+
+def compare_main(args):
+    """Print the median time of every case two result files share, and the speedup."""
+    with open(args.before, "r") as f:
+        before = json.load(f)
+    with open(args.after, "r") as f:
+        after = json.load(f)
+    key = lambda case: tuple(case[x] for x in MATRIX_KEYS)
+    previous = dict((key(x), x) for x in before["cases"] if "error" not in x)
+    print("{:>8} {:>10} {:>6} {:>9} {:>8} {:>10} {:>10} {:>8}".format(*(MATRIX_KEYS + ("before", "after", "speedup"))))
+    for case in after["cases"]:
+        if "error" in case or key(case) not in previous:
+            continue
+        old, new = previous[key(case)]["median_seconds"], case["median_seconds"]
+        labels = tuple(str(x) for x in key(case))
+        print("{:>8} {:>10} {:>6} {:>9} {:>8} {:>10.3f} {:>10.3f} {:>7.2f}x".format(*(labels + (old, new, old / new if new else 0.0))))
+    return 0
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="export_benchmark.py", description="Benchmark the Divinity physics exporter.")
+    commands = parser.add_subparsers(dest="command")
+
+    run = commands.add_parser("run", help="Run the benchmark matrix")
+    run.add_argument("--output", default="benchmark_results.json", help="JSON file to write the results to")
+    run.add_argument("--blender", default=os.environ.get("BLENDER"), help="Blender executable (defaults to the running Blender)")
+    run.add_argument("--repeat", type=int, default=3, help="Exports per case; the median is reported")
+    run.add_argument("--objects", type=int_list, default=[1, 10, 50])
+    run.add_argument("--triangles", type=int_list, default=[1000, 20000])
+    run.add_argument("--parent-depth", type=int_list, default=[0, 3])
+    run.add_argument("--armature", type=bool_list, default=[False, True])
+    run.add_argument("--combine", type=bool_list, default=[False, True])
+    run.add_argument("--setting", action="append", default=[], metavar="NAME=VALUE", help="Exporter operator setting")
+
+    compare = commands.add_parser("compare", help="Compare two result files")
+    compare.add_argument("before")
+    compare.add_argument("after")
+
+    writer = commands.add_parser("writer", help="Measure the .bullet writer's peak memory on one large mesh, without Blender")
+    writer.add_argument("--triangles", type=int, default=2000000)
+    writer.add_argument("--max-blocks", type=int, default=2, help="Fail if the writer allocates more than this many write blocks at once")
+    writer.add_argument("--output", help="JSON file to write the measurement to")
+
+    case = commands.add_parser("case")
+    case.add_argument("--case")
+    case.add_argument("--repeat", type=int, default=1)
+    case.add_argument("--settings-json", default="{}")
+    case.add_argument("--result")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        return run_main(args)
+    if args.command == "compare":
+        return compare_main(args)
+    if args.command == "writer":
+        return writer_main(args)
+    if args.command == "case":
+        case_main(args)
+        return 0
+    parser.print_help()
+    return 2
+
+if __name__ == "__main__":
+    sys.exit(main(script_arguments(sys.argv)))
@@ -0,0 +1,24 @@
+"""Stands in for LSPakUtilityBulletToPhysX.exe in benchmarks: `stand_in_converter.py -i file.bullet`.
+
+Copies the .bullet file to a .bin file next to it, after sleeping for
+DOS2DE_CONVERTER_DELAY seconds (0 by default) to mimic the real converter's latency.
+"""
+import os
+import shutil
+import sys
+import time
+
+def main(argv):
+    if len(argv) != 3 or argv[1] != "-i":
+        sys.stderr.write("usage: stand_in_converter.py -i <file.bullet>\n")
+        return 2
+    bullet_path = argv[2]
+    if not os.path.isfile(bullet_path):
+        sys.stderr.write("'{}' not found\n".format(bullet_path))
+        return 1
+    time.sleep(float(os.environ.get("DOS2DE_CONVERTER_DELAY", "0")))
+    shutil.copyfile(bullet_path, os.path.splitext(bullet_path)[0] + ".bin")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
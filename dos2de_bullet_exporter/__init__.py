@@ -1,8 +1,3 @@
-import bpy
-
-from bpy.props import StringProperty, BoolProperty, FloatProperty, EnumProperty
-from bpy.types import Operator, OperatorFileListElement, AddonPreferences
-
 bl_info = {
     "name": "Divinity Physics Exporter",
     "author": "LaughingLeader",
@@ -17,99 +12,47 @@ bl_info = {
     "category": "Import-Export"
 }
 
+try:
+    import bpy
+except ImportError:
+    # Outside of Blender only the array modules (pipeline, geometry, bullet_writer, ...) can be imported.
+    bpy = None
+
 # Fix for reloads
-if "bpy" in locals():
-    from . import physics_exporter
+if bpy is not None and "addon" in locals():
+    from . import addon, physics_exporter, bin_converter, bullet_writer, convex_decomposition, convex_hull, decimate, export_cache, export_plan, export_watch, geometry, instrumentation, pipeline, primitive_fitting, quantized_bvh
     import imp
+    if "bin_converter" in locals():
+        imp.reload(bin_converter) # noqa
+    if "bullet_writer" in locals():
+        imp.reload(bullet_writer) # noqa
+    if "convex_decomposition" in locals():
+        imp.reload(convex_decomposition) # noqa
+    if "convex_hull" in locals():
+        imp.reload(convex_hull) # noqa
+    if "decimate" in locals():
+        imp.reload(decimate) # noqa
+    if "export_cache" in locals():
+        imp.reload(export_cache) # noqa
+    if "export_plan" in locals():
+        imp.reload(export_plan) # noqa
+    if "export_watch" in locals():
+        imp.reload(export_watch) # noqa
+    if "geometry" in locals():
+        imp.reload(geometry) # noqa
+    if "instrumentation" in locals():
+        imp.reload(instrumentation) # noqa
+    if "primitive_fitting" in locals():
+        imp.reload(primitive_fitting) # noqa
+    if "quantized_bvh" in locals():
+        imp.reload(quantized_bvh) # noqa
+    if "pipeline" in locals():
+        imp.reload(pipeline) # noqa
     if "physics_exporter" in locals():
         imp.reload(physics_exporter) # noqa
+    if "addon" in locals():
+        imp.reload(addon) # noqa
 
-from . import physics_exporter
-
-from os.path import basename, dirname
-dos2de_physics_preferences_id = basename(dirname(__file__))
-
-class DivinityPhysicsExporterAddonPreferences(AddonPreferences):
-    bl_idname = dos2de_physics_preferences_id
-
-    binutil_path = StringProperty(
-        name="LSPakUtilityBulletToPhysX",
-        description="Path to LSPakUtilityBulletToPhysX.exe that converts bullet files to bin\nLocated within your Divinity Engine/DefEd folder by default",
-        default="",
-        subtype='FILE_PATH'
-    )
-    
-    export_combine_visible = BoolProperty(
-        name="Combine Visible Meshes",
-        description="Combine all copies of visible meshes before exporting",
-        default=True
-    )
-    
-    export_use_defaults = BoolProperty(
-        name="Use Defaults",
-        description="Meshes with no physics set will use default settings when exporting",
-        default=True
-    )
-
-    default_physics_type = EnumProperty(
-        name="Default Physics Type",
-        description="The type of physical representation to use for meshes",
-        items=physics_exporter.physics_type_items,
-        default=("STATIC")
-    )
-
-    default_collision_bounds_type = EnumProperty(
-        name="Default Bounds",
-        description="The collision shape that better fits the object",
-        items=physics_exporter.collision_bounds_type_items,
-        default=("CONVEX_HULL")
-    )
-
-    def draw(self, context):
-        layout = self.layout
-        layout.label(text="General:", icon="OUTLINER_DATA_META")
-        box = layout.box()
-        box.prop(self, "binutil_path")
-
-        layout.label(text="Export Settings:", icon="EXPORT")
-        box = layout.box()
-        box.prop(self, "export_use_defaults")
-        box.prop(self, "default_physics_type")
-        box.prop(self, "default_collision_bounds_type")
-        box.prop(self, "export_combine_visible")
-
-def get_preferences(context):
-    user_preferences = context.user_preferences
-    
-    if dos2de_physics_preferences_id in user_preferences.addons:
-        return user_preferences.addons[dos2de_physics_preferences_id].preferences
-    
-    return None
-
-addon_keymaps = []
-
-def register():
-    bpy.utils.register_module(__name__)
-    
-    bpy.types.INFO_MT_file_export.append(physics_exporter.menu_func)
-
-    wm = bpy.context.window_manager
-    km = wm.keyconfigs.addon.keymaps.new('Window', space_type='EMPTY', region_type='WINDOW', modal=False)
-    kmi = km.keymap_items.new(physics_exporter.LEADER_OT_physics_exporter.bl_idname, 'E', 'PRESS', ctrl=True, shift=True, alt=True)
-    addon_keymaps.append((km, kmi))
-
-def unregister():
-    bpy.utils.unregister_module(__name__)
-    bpy.types.INFO_MT_file_export.remove(physics_exporter.menu_func)
-
-    try:
-        wm = bpy.context.window_manager
-        kc = wm.keyconfigs.addon
-        if kc:
-            for km, kmi in addon_keymaps:
-                km.keymap_items.remove(kmi)
-        addon_keymaps.clear()
-    except:
-        pass
-if __name__ == "__main__":
-    register()
+if bpy is not None:
+    from . import physics_exporter
+    from .addon import get_preferences, register, unregister
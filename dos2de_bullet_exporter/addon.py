@@ -0,0 +1,113 @@
+"""The addon's preferences, keymap and registration, split from __init__ so the package imports without bpy."""
+import bpy
+
+from bpy.props import StringProperty, BoolProperty, EnumProperty, PointerProperty
+from bpy.types import AddonPreferences
+
+from . import export_watch, physics_exporter
+
+from os.path import basename, dirname
+dos2de_physics_preferences_id = basename(dirname(__file__))
+
+class DivinityPhysicsExporterAddonPreferences(AddonPreferences):
+    bl_idname = dos2de_physics_preferences_id
+
+    binutil_path = StringProperty(
+        name="LSPakUtilityBulletToPhysX",
+        description="Path to LSPakUtilityBulletToPhysX.exe that converts bullet files to bin\nLocated within your Divinity Engine/DefEd folder by default",
+        default="",
+        subtype='FILE_PATH'
+    )
+    
+    export_combine_visible = BoolProperty(
+        name="Combine Visible Meshes",
+        description="Combine all copies of visible meshes before exporting",
+        default=True
+    )
+    
+    export_use_defaults = BoolProperty(
+        name="Use Defaults",
+        description="Meshes with no physics set will use default settings when exporting",
+        default=True
+    )
+
+    default_physics_type = EnumProperty(
+        name="Default Physics Type",
+        description="The type of physical representation to use for meshes",
+        items=physics_exporter.physics_type_items,
+        default=("STATIC")
+    )
+
+    default_collision_bounds_type = EnumProperty(
+        name="Default Bounds",
+        description="The collision shape that better fits the object",
+        items=physics_exporter.collision_bounds_type_items,
+        default=("CONVEX_HULL")
+    )
+
+    default_hull_max_vertices = IntProperty(
+        name="Max Hull Vertices",
+        description="Reduce convex hulls to at most this many vertices, keeping the most significant ones (0 for no limit)",
+        default=64,
+        min=0
+    )
+
+    default_hull_shrink_wrap = BoolProperty(
+        name="Shrink-Wrap Hull",
+        description="Shrink convex hulls by the collision margin, so the margin doesn't inflate the collision shape",
+        default=False
+    )
+
+    def draw(self, context):
+        layout = self.layout
+        layout.label(text="General:", icon="OUTLINER_DATA_META")
+        box = layout.box()
+        box.prop(self, "binutil_path")
+
+        layout.label(text="Export Settings:", icon="EXPORT")
+        box = layout.box()
+        box.prop(self, "export_use_defaults")
+        box.prop(self, "default_physics_type")
+        box.prop(self, "default_collision_bounds_type")
+        box.prop(self, "default_hull_max_vertices")
+        box.prop(self, "default_hull_shrink_wrap")
+        box.prop(self, "export_combine_visible")
+
+def get_preferences(context):
+    user_preferences = context.user_preferences
+    
+    if dos2de_physics_preferences_id in user_preferences.addons:
+        return user_preferences.addons[dos2de_physics_preferences_id].preferences
+    
+    return None
+
+addon_keymaps = []
+
+def register():
+    bpy.utils.register_module(__package__)
+    bpy.types.Object.dos2de_physics = PointerProperty(type=physics_exporter.DivinityPhysicsObjectSettings)
+    
+    bpy.types.INFO_MT_file_export.append(physics_exporter.menu_func)
+
+    wm = bpy.context.window_manager
+    # There are no addon keyconfigs in background mode.
+    if wm.keyconfigs.addon is not None:
+        km = wm.keyconfigs.addon.keymaps.new('Window', space_type='EMPTY', region_type='WINDOW', modal=False)
+        kmi = km.keymap_items.new(physics_exporter.LEADER_OT_physics_exporter.bl_idname, 'E', 'PRESS', ctrl=True, shift=True, alt=True)
+        addon_keymaps.append((km, kmi))
+
+def unregister():
+    export_watch.stop()
+    del bpy.types.Object.dos2de_physics
+    bpy.utils.unregister_module(__package__)
+    bpy.types.INFO_MT_file_export.remove(physics_exporter.menu_func)
+
+    try:
+        wm = bpy.context.window_manager
+        kc = wm.keyconfigs.addon
+        if kc:
+            for km, kmi in addon_keymaps:
+                km.keymap_items.remove(kmi)
+        addon_keymaps.clear()
+    except:
+        pass
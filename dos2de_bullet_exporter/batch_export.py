@@ -0,0 +1,200 @@
+"""Headless batch export of many .blend files.
+
+Exports every .blend file in its own background Blender process, several at a time, and
+writes a JSON summary of the results:
+
+    blender -b --python batch_export.py -- "mod/**/*.blend" --output-root Physics --jobs 4
+    python batch_export.py "mod/**/*.blend" --blender /path/to/blender --output-root Physics
+
+Operator settings are passed as --setting name=value, with JSON values where they parse
+(--setting hull_max_vertices=32 --setting 'object_types=["VISIBLE"]'). The addon must either
+be installed, or this file must sit in the addon's folder.
+
+This file is run as a plain script by each worker, so it doesn't import the rest of the package.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+ADDON_NAME = os.path.basename(os.path.dirname(os.path.abspath(__file__)))
+SUMMARY_VERSION = 1
+
+def script_arguments(argv):
+    """Blender passes everything after "--" through to the script."""
+    if "--" in argv:
+        return argv[argv.index("--") + 1:]
+    return argv[1:]
+
+def parse_settings(pairs):
+    settings = {}
+    for pair in pairs:
+        name, separator, value = pair.partition("=")
+        if not separator:
+            raise ValueError("Setting '{}' isn't in name=value form.".format(pair))
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass
+        settings[name.strip()] = value
+    return settings
+
+def find_blend_files(patterns):
+    files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            path = os.path.abspath(path)
+            if path.endswith(".blend") and os.path.isfile(path) and path not in files:
+                files.append(path)
+    return files
+
+def output_path(blend_path, input_root, output_root):
+    """Mirror blend_path's location under input_root into output_root."""
+    relative = os.path.relpath(os.path.splitext(blend_path)[0], input_root)
+    return os.path.join(os.path.abspath(output_root), relative + ".bullet")
+
+def run_worker(blender, blend_path, export_path, settings, timeout):
+    """Export one .blend file in a background Blender process and return its summary entry."""
+    entry = {"blend": blend_path, "output": export_path, "status": "failed", "outputs": [], "error": None}
+    started = time.time()
+    handle, result_path = tempfile.mkstemp(suffix=".json", prefix="dos2de_physics_")
+    os.close(handle)
+    try:
+        command = [blender, "-b", blend_path, "--python", os.path.abspath(__file__), "--",
+            "--worker", "--export-path", export_path, "--result", result_path,
+            "--settings-json", json.dumps(settings)]
+        try:
+            process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            entry["error"] = "Timed out after {} seconds.".format(timeout)
+            return entry
+        entry["returncode"] = process.returncode
+        result = None
+        if os.path.getsize(result_path) > 0:
+            with open(result_path, "r") as f:
+                result = json.load(f)
+        if result is None:
+            output = process.stdout.decode("utf-8", "replace").strip().splitlines()
+            entry["error"] = "Blender exited without a result. Last output:\n" + "\n".join(output[-20:])
+        else:
+            entry.update(result)
+    finally:
+        entry["seconds"] = round(time.time() - started, 3)
+        os.remove(result_path)
+    return entry
+
+def batch_export(blender, blend_files, output_root, settings, jobs, timeout=None):
+    """Export blend_files over jobs Blender processes. Returns the summary dict."""
+    started = time.time()
+    input_root = os.path.commonpath([os.path.dirname(x) for x in blend_files]) if blend_files else ""
+    with ThreadPoolExecutor(max(jobs, 1)) as executor:
+        futures = [executor.submit(run_worker, blender, x, output_path(x, input_root, output_root), settings, timeout)
+            for x in blend_files]
+        files = []
+        for future in futures:
+            entry = future.result()
+            files.append(entry)
+            print("[DOS2DE-Physics] {} '{}' ({}s).".format(
+                "Exported" if entry["status"] == "ok" else "Failed to export", entry["blend"], entry["seconds"]))
+    return {
+        "version": SUMMARY_VERSION,
+        "output_root": os.path.abspath(output_root),
+        "settings": settings,
+        "succeeded": sum(1 for x in files if x["status"] == "ok"),
+        "failed": sum(1 for x in files if x["status"] != "ok"),
+        "seconds": round(time.time() - started, 3),
+        "files": files,
+    }
+
+def enable_addon():
+    import addon_utils
+    if ADDON_NAME not in sys.modules:
+        # Not installed: import it from next to this script.
+        addon_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        if addon_parent not in sys.path:
+            sys.path.append(addon_parent)
+    if addon_utils.enable(ADDON_NAME, default_set=True) is None:
+        raise Exception("[DOS2DE-Physics] Couldn't enable the '{}' addon.".format(ADDON_NAME))
+    return sys.modules[ADDON_NAME]
+
+def export_current_file(export_path, settings):
+    """Run the exporter on the open .blend file (inside Blender). Returns the worker result."""
+    import bpy
+    addon = enable_addon()
+    if settings.get("export_method", "NATIVE") != "NATIVE":
+        raise Exception("[DOS2DE-Physics] Only the native export method works in background mode.")
+
+    kwargs = addon.physics_exporter.preference_defaults(addon.get_preferences(bpy.context))
+    kwargs.update({"export_method": "NATIVE", "export_combine_visible": True})
+    # Enum flag properties take sets.
+    kwargs.update((name, set(value) if isinstance(value, list) else value) for name, value in settings.items())
+    kwargs["filepath"] = export_path
+    os.makedirs(os.path.dirname(export_path), exist_ok=True)
+
+    result = bpy.ops.export_scene.dos2de_physics(**kwargs)
+    output = os.path.splitext(export_path)[0] + ".bin" if kwargs.get("binconversion_enabled") else export_path
+    return {
+        "status": "ok" if "FINISHED" in result and os.path.isfile(output) else "failed",
+        "outputs": [output] if os.path.isfile(output) else [],
+        "error": None if "FINISHED" in result else "Export returned {}.".format(sorted(result)),
+    }
+
+def worker_main(args):
+    try:
+        result = export_current_file(args.export_path, json.loads(args.settings_json))
+    except Exception as e:
+        traceback.print_exc()
+        result = {"status": "failed", "outputs": [], "error": str(e)}
+    with open(args.result, "w") as f:
+        json.dump(result, f)
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="batch_export.py", description="Export Divinity physics for many .blend files.")
+    parser.add_argument("blend_files", nargs="*", help=".blend files or glob patterns (** matches subfolders)")
+    parser.add_argument("--output-root", default=".", help="Folder the exported files are written to, mirroring the input folders")
+    parser.add_argument("--setting", action="append", default=[], metavar="NAME=VALUE", help="Exporter operator setting")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Number of Blender processes to run at once")
+    parser.add_argument("--blender", default=os.environ.get("BLENDER"), help="Blender executable (defaults to the running Blender)")
+    parser.add_argument("--summary", help="Write the JSON summary to this file instead of stdout")
+    parser.add_argument("--timeout", type=float, help="Seconds before a Blender process is stopped")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--export-path", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    parser.add_argument("--settings-json", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        worker_main(args)
+        return 0
+
+    blender = args.blender
+    if blender is None:
+        try:
+            import bpy
+            blender = bpy.app.binary_path
+        except ImportError:
+            parser.error("--blender is required outside of Blender")
+
+    blend_files = find_blend_files(args.blend_files)
+    if len(blend_files) <= 0:
+        parser.error("No .blend files found.")
+
+    summary = batch_export(blender, blend_files, args.output_root, parse_settings(args.setting), args.jobs, args.timeout)
+    text = json.dumps(summary, indent=1, sort_keys=True)
+    if args.summary:
+        with open(args.summary, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    print("[DOS2DE-Physics] Exported {} of {} files.".format(summary["succeeded"], len(blend_files)))
+    return 1 if summary["failed"] > 0 else 0
+
+if __name__ == "__main__":
+    sys.exit(main(script_arguments(sys.argv)))
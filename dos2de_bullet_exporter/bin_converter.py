@@ -0,0 +1,44 @@
+"""Runs LSPakUtilityBulletToPhysX conversions on a bounded pool of worker threads.
+
+The converter is only invoked as `<binutil_path> -i <file.bullet>`, so any executable
+accepting that command line can stand in for it.
+"""
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import os
+import subprocess
+import time
+
+ConversionResult = namedtuple("ConversionResult", ("bullet_path", "returncode", "stderr", "seconds"))
+
+def convert_bullet_file(binutil_path, bullet_path):
+    """Convert one .bullet file to .bin, deleting the .bullet once the conversion succeeded."""
+    started = time.perf_counter()
+    try:
+        process = subprocess.run([binutil_path, "-i", bullet_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        return ConversionResult(bullet_path, None, str(e), time.perf_counter() - started)
+    stderr = process.stderr.decode("utf-8", "replace").strip()
+    if process.returncode == 0 and os.path.isfile(bullet_path):
+        os.remove(bullet_path)
+    return ConversionResult(bullet_path, process.returncode, stderr, time.perf_counter() - started)
+
+class BinConverter(object):
+    def __init__(self, binutil_path, max_workers=None):
+        self.binutil_path = binutil_path
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+        self.executor = ThreadPoolExecutor(self.max_workers)
+        self.futures = []
+
+    def submit(self, bullet_path):
+        self.futures.append(self.executor.submit(convert_bullet_file, self.binutil_path, bullet_path))
+
+    def wait(self):
+        """Block until every submitted conversion finished and return their results in submission order."""
+        results = [future.result() for future in self.futures]
+        self.futures = []
+        self.executor.shutdown()
+        return results
+
+def failed_conversions(results):
+    return [x for x in results if x.returncode != 0]
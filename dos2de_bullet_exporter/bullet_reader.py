@@ -0,0 +1,509 @@
+"""Reads and summarizes Bullet serialization files (.bullet) without Bullet or Blender.
+
+    python bullet_reader.py Physics/*.bullet
+    python bullet_reader.py "Physics/**/*.bullet" --brief --sort bytes
+    python bullet_reader.py Physics/Tree.bullet --json
+
+The file is streamed: chunk headers are scanned by seeking past their data, the DNA
+(stored last) is read, and only the chunks a shape refers to are read back. Vertex
+arrays are read in blocks to compute bounds, so large meshes are never loaded whole.
+
+From Python, inspect_bullet_file(path) returns the report as a dict and BulletFile
+gives access to the chunks and decoded structs. This file doesn't import the rest
+of the package, so it also runs as a plain script.
+"""
+from array import array
+from collections import OrderedDict, namedtuple
+import argparse
+import glob
+import json
+import os
+import struct
+import sys
+
+REPORT_VERSION = 1
+BLOCK_BYTES = 1 << 16
+
+SHAPE_TYPE_NAMES = {
+    0: "BOX",
+    1: "TRIANGLE",
+    2: "TETRAHEDRAL",
+    3: "CONVEX_TRIANGLE_MESH",
+    4: "CONVEX_HULL",
+    5: "CONVEX_POINT_CLOUD",
+    8: "SPHERE",
+    9: "MULTI_SPHERE",
+    10: "CAPSULE",
+    11: "CONE",
+    13: "CYLINDER",
+    14: "UNIFORM_SCALING",
+    21: "TRIANGLE_MESH",
+    22: "SCALED_TRIANGLE_MESH",
+    25: "GIMPACT",
+    28: "STATIC_PLANE",
+    31: "COMPOUND",
+}
+
+BASIC_FORMATS = {
+    "char": "b",
+    "uchar": "B",
+    "short": "h",
+    "ushort": "H",
+    "int": "i",
+    "long": "i",
+    "ulong": "I",
+    "float": "f",
+    "double": "d",
+}
+
+INDEX_ARRAYS = (
+    ("m_indices32", "int32"),
+    ("m_3indices16", "uint16 triplets"),
+    ("m_indices16", "int16"),
+    ("m_3indices8", "uint8 triplets"),
+)
+
+Chunk = namedtuple("Chunk", ("code", "size", "pointer", "dna_nr", "number", "offset"))
+Field = namedtuple("Field", ("name", "type_name", "pointer", "count", "offset", "size"))
+
+class BulletFileError(Exception):
+    pass
+
+def parse_field_name(name):
+    """Split a DNA field name like '*m_ptr' or 'm_floats[4]' into (name, is_pointer, count)."""
+    pointer = name.startswith("*") or name.startswith("(*")
+    count = 1
+    for dim in name.split("[")[1:]:
+        count *= int(dim.rstrip("]"))
+    return name.split("[")[0].lstrip("(*").rstrip(")"), pointer, count
+
+def _read_names(data, offset, count):
+    names = []
+    for i in range(count):
+        end = data.index(b"\0", offset)
+        names.append(data[offset:end].decode("ascii"))
+        offset = end + 1
+    return names, offset + (-offset % 4)
+
+class DNA(object):
+    """The struct layouts from a file's DNA1 chunk."""
+
+    def __init__(self, data, pointer_size, endian):
+        self.pointer_size = pointer_size
+        self.endian = endian
+        if data[:8] != b"SDNANAME":
+            raise BulletFileError("DNA block doesn't start with SDNANAME.")
+        count, = struct.unpack_from(endian + "i", data, 8)
+        names, offset = _read_names(data, 12, count)
+
+        if data[offset:offset + 4] != b"TYPE":
+            raise BulletFileError("DNA block is missing its TYPE table.")
+        count, = struct.unpack_from(endian + "i", data, offset + 4)
+        self.types, offset = _read_names(data, offset + 8, count)
+
+        if data[offset:offset + 4] != b"TLEN":
+            raise BulletFileError("DNA block is missing its TLEN table.")
+        self.type_sizes = list(struct.unpack_from(endian + "{}h".format(len(self.types)), data, offset + 4))
+        offset += 4 + 2 * len(self.types)
+        offset += -offset % 4
+
+        if data[offset:offset + 4] != b"STRC":
+            raise BulletFileError("DNA block is missing its STRC table.")
+        count, = struct.unpack_from(endian + "i", data, offset + 4)
+        offset += 8
+        self.structs = []
+        for i in range(count):
+            type_index, field_count = struct.unpack_from(endian + "hh", data, offset)
+            pairs = struct.unpack_from(endian + "{}h".format(field_count * 2), data, offset + 4)
+            offset += 4 + 4 * field_count
+            self.structs.append((self.types[type_index], [(self.types[t], names[n]) for t, n in zip(pairs[::2], pairs[1::2])]))
+        self.struct_index = dict((name, i) for i, (name, fields) in enumerate(self.structs))
+        self.layouts = {}
+
+    def struct_name(self, dna_nr):
+        if 0 <= dna_nr < len(self.structs):
+            return self.structs[dna_nr][0]
+        return None
+
+    def layout(self, struct_name):
+        """Return the fields of struct_name with their byte offsets."""
+        fields = self.layouts.get(struct_name)
+        if fields is None:
+            fields = []
+            offset = 0
+            for type_name, field_name in self.structs[self.struct_index[struct_name]][1]:
+                name, pointer, count = parse_field_name(field_name)
+                size = (self.pointer_size if pointer else self.type_sizes[self.types.index(type_name)]) * count
+                fields.append(Field(name, type_name, pointer, count, offset, size))
+                offset += size
+            self.layouts[struct_name] = fields
+        return fields
+
+    def struct_size(self, struct_name):
+        return self.type_sizes[self.types.index(struct_name)]
+
+    def decode(self, struct_name, data, offset=0):
+        """Decode one struct into a dict. Pointers become ints, nested structs dicts, arrays lists."""
+        values = OrderedDict()
+        for field in self.layout(struct_name):
+            start = offset + field.offset
+            if field.pointer:
+                fmt = "Q" if self.pointer_size == 8 else "I"
+                items = list(struct.unpack_from("{}{}{}".format(self.endian, field.count, fmt), data, start))
+            elif field.type_name in BASIC_FORMATS:
+                if field.type_name == "char" and field.count > 1:
+                    values[field.name] = bytes(data[start:start + field.count])
+                    continue
+                items = list(struct.unpack_from("{}{}{}".format(self.endian, field.count, BASIC_FORMATS[field.type_name]), data, start))
+            elif field.type_name in self.struct_index:
+                step = field.size // field.count
+                items = [self.decode(field.type_name, data, start + i * step) for i in range(field.count)]
+            else:
+                items = [None]
+            values[field.name] = items if field.count > 1 else items[0]
+        return values
+
+class BulletFile(object):
+    """Chunk index and DNA of a .bullet file. Chunk data is only read when asked for."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        header = stream.read(12)
+        if len(header) != 12 or header[:6] != b"BULLET":
+            raise BulletFileError("Not a Bullet file.")
+        self.precision = "double" if header[6:7] == b"d" else "float"
+        self.pointer_size = 8 if header[7:8] == b"-" else 4
+        self.endian = ">" if header[8:9] == b"V" else "<"
+        self.version = int(header[9:12])
+        self.chunk_header = struct.Struct(self.endian + "ii{}ii".format("Q" if self.pointer_size == 8 else "I"))
+
+        self.chunks = []
+        self.by_pointer = {}
+        dna_chunk = None
+        while True:
+            data = stream.read(self.chunk_header.size)
+            if len(data) < self.chunk_header.size:
+                break
+            code, size, pointer, dna_nr, number = self.chunk_header.unpack(data)
+            chunk = Chunk(struct.pack(self.endian + "i", code).decode("ascii", "replace"), size, pointer, dna_nr, number, stream.tell())
+            if chunk.code == "DNA1":
+                dna_chunk = chunk
+                break
+            self.chunks.append(chunk)
+            self.by_pointer[pointer] = chunk
+            stream.seek(size, os.SEEK_CUR)
+        self.size = stream.seek(0, os.SEEK_END)
+
+        if dna_chunk is None:
+            raise BulletFileError("No DNA1 chunk found.")
+        self.dna = DNA(self.read(dna_chunk), self.pointer_size, self.endian)
+
+    def read(self, chunk):
+        self.stream.seek(chunk.offset)
+        return self.stream.read(chunk.size)
+
+    def chunk_bytes(self, chunk):
+        """Size of a chunk including its header."""
+        return self.chunk_header.size + chunk.size
+
+    def struct_name(self, chunk):
+        return self.dna.struct_name(chunk.dna_nr)
+
+    def structs(self, chunk):
+        """Decode every struct in a chunk."""
+        name = self.struct_name(chunk)
+        data = self.read(chunk)
+        step = chunk.size // max(chunk.number, 1)
+        return [self.dna.decode(name, data, i * step) for i in range(chunk.number)]
+
+    def iter_blocks(self, chunk, row_size):
+        """Yield a chunk's data in blocks of whole rows, so large arrays are never read at once."""
+        rows = max(BLOCK_BYTES // row_size, 1)
+        self.stream.seek(chunk.offset)
+        remaining = chunk.size
+        while remaining > 0:
+            data = self.stream.read(min(rows * row_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+    def vector_bounds(self, pointer):
+        """Return (count, (min, max)) of a btVector3 array chunk, or (0, None) if there's none."""
+        chunk = self.by_pointer.get(pointer)
+        if chunk is None or chunk.number <= 0:
+            return 0, None
+        typecode = "d" if self.struct_name(chunk) == "btVector3DoubleData" else "f"
+        row_size = chunk.size // chunk.number
+        components = row_size // array(typecode).itemsize
+        lower = [float("inf")] * 3
+        upper = [float("-inf")] * 3
+        for data in self.iter_blocks(chunk, row_size):
+            values = array(typecode)
+            values.frombytes(data)
+            if (self.endian == ">") != (sys.byteorder == "big"):
+                values.byteswap()
+            for axis in range(3):
+                column = values[axis::components]
+                lower[axis] = min(lower[axis], min(column))
+                upper[axis] = max(upper[axis], max(column))
+        return chunk.number, (tuple(lower), tuple(upper))
+
+def merge_aabbs(aabbs):
+    aabbs = [x for x in aabbs if x is not None]
+    if not aabbs:
+        return None
+    return (tuple(min(x[0][i] for x in aabbs) for i in range(3)), tuple(max(x[1][i] for x in aabbs) for i in range(3)))
+
+def transform_aabb(transform, aabb):
+    """Bounds of an AABB moved by a btTransformFloatData dict."""
+    if aabb is None:
+        return None
+    basis = [row["m_floats"][:3] for row in transform["m_basis"]["m_el"]]
+    origin = transform["m_origin"]["m_floats"][:3]
+    center = [(lo + hi) * 0.5 for lo, hi in zip(*aabb)]
+    extent = [(hi - lo) * 0.5 for lo, hi in zip(*aabb)]
+    center = [sum(basis[i][j] * center[j] for j in range(3)) + origin[i] for i in range(3)]
+    extent = [sum(abs(basis[i][j]) * extent[j] for j in range(3)) for i in range(3)]
+    return (tuple(c - e for c, e in zip(center, extent)), tuple(c + e for c, e in zip(center, extent)))
+
+def _vector(values):
+    return tuple(values["m_floats"][:3])
+
+def _find(values, name):
+    """Find a field in a struct or any struct nested in it."""
+    if name in values:
+        return values[name]
+    for value in values.values():
+        if isinstance(value, dict):
+            found = _find(value, name)
+            if found is not None:
+                return found
+    return None
+
+def _primitive_aabb(shape_type, values, margin):
+    dims = _vector(_find(values, "m_implicitShapeDimensions"))
+    if shape_type == 0:
+        half = [x + margin for x in dims]
+    elif shape_type == 8:
+        half = [dims[0]] * 3
+    elif shape_type in (10, 11, 13):
+        up = _find(values, "m_upAxis")
+        up = _find(values, "m_upIndex") if up is None else up
+        if shape_type == 13:
+            half = [x + margin for x in dims]
+        else:
+            radius = dims[(up + 2) % 3]
+            half = [radius] * 3
+            half[up] = dims[up] + radius if shape_type == 10 else dims[up] * 0.5
+    else:
+        return None
+    return (tuple(-x for x in half), tuple(half))
+
+def inspect_shape(bullet, pointer, shapes):
+    """Add the report entry for the shape chunk at pointer (and its children) to shapes, and return it."""
+    if pointer in shapes:
+        return shapes[pointer]
+    chunk = bullet.by_pointer.get(pointer)
+    if chunk is None:
+        return None
+    values = bullet.structs(chunk)[0]
+    shape_type = _find(values, "m_shapeType")
+    margin = _find(values, "m_collisionMargin")
+    entry = OrderedDict((
+        ("pointer", pointer),
+        ("struct", bullet.struct_name(chunk)),
+        ("type", SHAPE_TYPE_NAMES.get(shape_type, str(shape_type))),
+        ("margin", margin),
+        ("bytes", bullet.chunk_bytes(chunk)),
+        ("aabb", None),
+    ))
+    shapes[pointer] = entry
+
+    def add_chunk(chunk_pointer):
+        referenced = bullet.by_pointer.get(chunk_pointer)
+        if referenced is not None:
+            entry["bytes"] += bullet.chunk_bytes(referenced)
+        return referenced
+
+    if "m_unscaledPointsFloatPtr" in values or "m_unscaledPointsDoublePtr" in values:
+        points_pointer = values.get("m_unscaledPointsFloatPtr") or values.get("m_unscaledPointsDoublePtr")
+        add_chunk(points_pointer)
+        entry["points"], entry["aabb"] = bullet.vector_bounds(points_pointer)
+    elif "m_meshInterface" in values:
+        interface = values["m_meshInterface"]
+        parts_chunk = add_chunk(interface["m_meshPartsPtr"])
+        entry["parts"] = []
+        for part in bullet.structs(parts_chunk) if parts_chunk is not None else []:
+            vertices_pointer = part["m_vertices3f"] or part["m_vertices3d"]
+            add_chunk(vertices_pointer)
+            index_type = None
+            for name, label in INDEX_ARRAYS:
+                if part[name]:
+                    add_chunk(part[name])
+                    index_type = label
+                    break
+            count, aabb = bullet.vector_bounds(vertices_pointer)
+            entry["parts"].append(OrderedDict((
+                ("vertices", part["m_numVertices"]),
+                ("triangles", part["m_numTriangles"]),
+                ("index_type", index_type),
+                ("aabb", aabb),
+            )))
+        entry["vertices"] = sum(x["vertices"] for x in entry["parts"])
+        entry["triangles"] = sum(x["triangles"] for x in entry["parts"])
+        entry["aabb"] = merge_aabbs([x["aabb"] for x in entry["parts"]])
+
+        bvh_pointer = values.get("m_quantizedFloatBvh") or values.get("m_quantizedDoubleBvh")
+        bvh_chunk = add_chunk(bvh_pointer)
+        if bvh_chunk is not None:
+            bvh = bullet.structs(bvh_chunk)[0]
+            for name in ("m_contiguousNodesPtr", "m_quantizedContiguousNodesPtr", "m_subTreeInfoPtr"):
+                add_chunk(bvh[name])
+            entry["bvh"] = OrderedDict((
+                ("quantized", bool(bvh["m_useQuantization"])),
+                ("nodes", bvh["m_numQuantizedContiguousNodes"] if bvh["m_useQuantization"] else bvh["m_numContiguousLeafNodes"]),
+                ("subtrees", bvh["m_numSubtreeHeaders"]),
+            ))
+        else:
+            entry["bvh"] = None
+        add_chunk(values.get("m_triangleInfoMap"))
+    elif "m_childShapePtr" in values:
+        children_chunk = add_chunk(values["m_childShapePtr"])
+        children = bullet.structs(children_chunk) if children_chunk is not None else []
+        entry["children"] = [x["m_childShape"] for x in children]
+        aabbs = []
+        for child in children:
+            child_entry = inspect_shape(bullet, child["m_childShape"], shapes)
+            if child_entry is not None:
+                aabbs.append(transform_aabb(child["m_transform"], child_entry["aabb"]))
+        entry["aabb"] = merge_aabbs(aabbs)
+    else:
+        entry["aabb"] = _primitive_aabb(shape_type, values, margin or 0.0)
+    return entry
+
+def inspect_bullet(stream, path=None):
+    """Report a .bullet stream's shapes, bodies and bytes per chunk type as a dict."""
+    bullet = BulletFile(stream)
+    chunks = OrderedDict()
+    for chunk in bullet.chunks:
+        key = "{} {}".format(chunk.code, bullet.struct_name(chunk))
+        stats = chunks.setdefault(key, OrderedDict((("count", 0), ("bytes", 0))))
+        stats["count"] += 1
+        stats["bytes"] += bullet.chunk_bytes(chunk)
+
+    shapes = OrderedDict()
+    for chunk in bullet.chunks:
+        if chunk.code == "SHAP":
+            inspect_shape(bullet, chunk.pointer, shapes)
+
+    bodies = []
+    for chunk in bullet.chunks:
+        if chunk.code in ("RBDY", "COBJ"):
+            for values in bullet.structs(chunk):
+                inverse_mass = _find(values, "m_inverseMass")
+                bodies.append(OrderedDict((
+                    ("shape", _find(values, "m_collisionShape")),
+                    ("mass", 1.0 / inverse_mass if inverse_mass else 0.0),
+                    ("friction", _find(values, "m_friction")),
+                    ("restitution", _find(values, "m_restitution")),
+                    ("collision_flags", _find(values, "m_collisionFlags")),
+                )))
+
+    return OrderedDict((
+        ("version", REPORT_VERSION),
+        ("path", path),
+        ("bytes", bullet.size),
+        ("bullet_version", bullet.version),
+        ("pointer_size", bullet.pointer_size),
+        ("precision", bullet.precision),
+        ("chunks", chunks),
+        ("shapes", list(shapes.values())),
+        ("bodies", bodies),
+        ("vertices", sum(x.get("vertices", x.get("points", 0)) for x in shapes.values())),
+        ("triangles", sum(x.get("triangles", 0) for x in shapes.values())),
+    ))
+
+def inspect_bullet_file(path):
+    with open(path, "rb") as stream:
+        return inspect_bullet(stream, path)
+
+def _format_aabb(aabb):
+    if aabb is None:
+        return "-"
+    return "({}) - ({})".format(", ".join("{:.3f}".format(x) for x in aabb[0]), ", ".join("{:.3f}".format(x) for x in aabb[1]))
+
+def brief_line(report):
+    types = ", ".join(sorted(set(x["type"] for x in report["shapes"])))
+    return "{:>10} bytes  {:>3} shapes  {:>7} vertices  {:>7} triangles  {:>3} bodies  {}  [{}]".format(
+        report["bytes"], len(report["shapes"]), report["vertices"], report["triangles"], len(report["bodies"]), report["path"], types)
+
+def format_report(report):
+    lines = ["{} ({} bytes, Bullet {}, {}-bit, {})".format(
+        report["path"], report["bytes"], report["bullet_version"], report["pointer_size"] * 8, report["precision"])]
+    lines.append("  Chunks:")
+    for key, stats in report["chunks"].items():
+        lines.append("    {:<40} {:>5} x {:>10} bytes".format(key, stats["count"], stats["bytes"]))
+    lines.append("  Shapes:")
+    for shape in report["shapes"]:
+        details = []
+        if "points" in shape:
+            details.append("{} points".format(shape["points"]))
+        if "parts" in shape:
+            details.append("{} vertices, {} triangles in {} part(s), {} indices".format(shape["vertices"], shape["triangles"],
+                len(shape["parts"]), "/".join(sorted(set(str(x["index_type"]) for x in shape["parts"])))))
+            bvh = shape["bvh"]
+            details.append("no bvh" if bvh is None else "{} bvh with {} nodes".format("quantized" if bvh["quantized"] else "plain", bvh["nodes"]))
+        if "children" in shape:
+            details.append("{} children".format(len(shape["children"])))
+        lines.append("    {:#x} {} margin {:.3f}, {} bytes{}".format(shape["pointer"], shape["type"], shape["margin"] or 0.0,
+            shape["bytes"], "".join(", " + x for x in details)))
+        lines.append("      aabb {}".format(_format_aabb(shape["aabb"])))
+    lines.append("  Bodies:")
+    for body in report["bodies"]:
+        lines.append("    shape {:#x}, mass {:.3f}, friction {:.3f}, restitution {:.3f}, flags {}".format(
+            body["shape"], body["mass"], body["friction"], body["restitution"], body["collision_flags"]))
+    return "\n".join(lines)
+
+def find_bullet_files(patterns):
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "**", "*.bullet")
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if path not in files:
+                files.append(path)
+    return files
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="bullet_reader.py", description="Summarize .bullet files.")
+    parser.add_argument("files", nargs="+", help=".bullet files, folders or glob patterns (** matches subfolders)")
+    parser.add_argument("--json", action="store_true", help="Print the reports as JSON")
+    parser.add_argument("--brief", action="store_true", help="Print one line per file")
+    parser.add_argument("--sort", choices=("path", "bytes", "vertices", "triangles"), default="path", help="Order the files are listed in")
+    parser.add_argument("--min-bytes", type=int, default=0, help="Only list files at least this large")
+    args = parser.parse_args(argv)
+
+    reports = []
+    failed = 0
+    for path in find_bullet_files(args.files):
+        try:
+            report = inspect_bullet_file(path)
+        except (OSError, BulletFileError, struct.error, ValueError) as e:
+            sys.stderr.write("[DOS2DE-Physics] Couldn't read '{}': {}\n".format(path, e))
+            failed += 1
+            continue
+        if report["bytes"] >= args.min_bytes:
+            reports.append(report)
+    reports.sort(key=lambda x: x[args.sort], reverse=args.sort != "path")
+
+    if args.json:
+        print(json.dumps(reports, indent=1))
+    else:
+        for report in reports:
+            print(brief_line(report) if args.brief else format_report(report))
+    return 1 if failed > 0 else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,822 @@
+"""Writes Bullet's binary serialization format (.bullet) without the game engine.
+
+The layout follows btDefaultSerializer (Bullet 2.82, 64-bit, single precision):
+a 12 byte header, one chunk per serialized struct or array, and a trailing
+DNA1 chunk describing every struct written. Pointers are replaced by the same
+sequential unique ids btDefaultSerializer::getUniquePointer hands out.
+"""
+import struct
+
+import numpy
+
+BULLET_VERSION = 282
+HEADER = "BULLETf-v{}".format(BULLET_VERSION).encode("ascii")
+POINTER_SIZE = 8
+CHUNK_HEADER = struct.Struct("<iiQii")
+# Array chunks are converted and written this many bytes at a time, so writing never copies a whole array.
+WRITE_BLOCK_BYTES = 1 << 20
+
+def make_id(code):
+    return struct.unpack("<i", code.encode("ascii"))[0]
+
+SHAPE_CODE = make_id("SHAP")
+ARRAY_CODE = make_id("ARAY")
+RIGIDBODY_CODE = make_id("RBDY")
+QUANTIZED_BVH_CODE = make_id("QBVH")
+DNA_CODE = make_id("DNA1")
+
+# BroadphaseNativeTypes
+BOX_SHAPE_PROXYTYPE = 0
+CONVEX_HULL_SHAPE_PROXYTYPE = 4
+SPHERE_SHAPE_PROXYTYPE = 8
+CAPSULE_SHAPE_PROXYTYPE = 10
+CONE_SHAPE_PROXYTYPE = 11
+CYLINDER_SHAPE_PROXYTYPE = 13
+TRIANGLE_MESH_SHAPE_PROXYTYPE = 21
+COMPOUND_SHAPE_PROXYTYPE = 31
+
+# btCollisionObject flags and states
+CF_STATIC_OBJECT = 1
+CF_NO_CONTACT_RESPONSE = 4
+CO_RIGID_BODY = 2
+ACTIVE_TAG = 1
+BT_LARGE_FLOAT = 1e18
+
+DEFAULT_MARGIN = 0.04
+
+BASIC_TYPES = (
+    ("char", 1, "b"),
+    ("uchar", 1, "B"),
+    ("short", 2, "h"),
+    ("ushort", 2, "H"),
+    ("int", 4, "i"),
+    ("long", 4, "i"),
+    ("ulong", 4, "I"),
+    ("float", 4, "f"),
+    ("double", 8, "d"),
+    ("void", 0, None),
+)
+
+# Types that are only ever referenced through pointers.
+OPAQUE_TYPES = ("btTriangleInfoMapData", "btQuantizedBvhDoubleData")
+
+STRUCTS = (
+    ("ListBase", (("void", "*first"), ("void", "*last"))),
+    ("btVector3FloatData", (("float", "m_floats[4]"),)),
+    ("btVector3DoubleData", (("double", "m_floats[4]"),)),
+    ("btMatrix3x3FloatData", (("btVector3FloatData", "m_el[3]"),)),
+    ("btTransformFloatData", (
+        ("btMatrix3x3FloatData", "m_basis"),
+        ("btVector3FloatData", "m_origin"),
+    )),
+    ("btCollisionShapeData", (
+        ("char", "*m_name"),
+        ("int", "m_shapeType"),
+        ("char", "m_padding[4]"),
+    )),
+    ("btConvexInternalShapeData", (
+        ("btCollisionShapeData", "m_collisionShapeData"),
+        ("btVector3FloatData", "m_localScaling"),
+        ("btVector3FloatData", "m_implicitShapeDimensions"),
+        ("float", "m_collisionMargin"),
+        ("int", "m_padding"),
+    )),
+    ("btConvexHullShapeData", (
+        ("btConvexInternalShapeData", "m_convexInternalShapeData"),
+        ("btVector3FloatData", "*m_unscaledPointsFloatPtr"),
+        ("btVector3DoubleData", "*m_unscaledPointsDoublePtr"),
+        ("int", "m_numPoints"),
+        ("char", "m_padding3[4]"),
+    )),
+    ("btCapsuleShapeData", (
+        ("btConvexInternalShapeData", "m_convexInternalShapeData"),
+        ("int", "m_upAxis"),
+        ("char", "m_padding[4]"),
+    )),
+    ("btCylinderShapeData", (
+        ("btConvexInternalShapeData", "m_convexInternalShapeData"),
+        ("int", "m_upAxis"),
+        ("char", "m_padding[4]"),
+    )),
+    ("btConeShapeData", (
+        ("btConvexInternalShapeData", "m_convexInternalShapeData"),
+        ("int", "m_upIndex"),
+        ("char", "m_padding[4]"),
+    )),
+    ("btIntIndexData", (("int", "m_value"),)),
+    ("btShortIntIndexData", (("short", "m_value"), ("char", "m_pad[2]"))),
+    ("btShortIntIndexTripletData", (("short", "m_values[3]"), ("char", "m_pad[2]"))),
+    ("btCharIndexTripletData", (("uchar", "m_values[3]"), ("char", "m_pad"))),
+    ("btMeshPartData", (
+        ("btVector3FloatData", "*m_vertices3f"),
+        ("btVector3DoubleData", "*m_vertices3d"),
+        ("btIntIndexData", "*m_indices32"),
+        ("btShortIntIndexTripletData", "*m_3indices16"),
+        ("btCharIndexTripletData", "*m_3indices8"),
+        ("btShortIntIndexData", "*m_indices16"),
+        ("int", "m_numTriangles"),
+        ("int", "m_numVertices"),
+    )),
+    ("btStridingMeshInterfaceData", (
+        ("btMeshPartData", "*m_meshPartsPtr"),
+        ("btVector3FloatData", "m_scaling"),
+        ("int", "m_numMeshParts"),
+        ("char", "m_padding[4]"),
+    )),
+    ("btQuantizedBvhNodeData", (
+        ("ushort", "m_quantizedAabbMin[3]"),
+        ("ushort", "m_quantizedAabbMax[3]"),
+        ("int", "m_escapeIndexOrTriangleIndex"),
+    )),
+    ("btOptimizedBvhNodeFloatData", (
+        ("btVector3FloatData", "m_aabbMinOrg"),
+        ("btVector3FloatData", "m_aabbMaxOrg"),
+        ("int", "m_escapeIndex"),
+        ("int", "m_subPart"),
+        ("int", "m_triangleIndex"),
+        ("char", "m_pad[4]"),
+    )),
+    ("btBvhSubtreeInfoData", (
+        ("int", "m_rootNodeIndex"),
+        ("int", "m_subtreeSize"),
+        ("ushort", "m_quantizedAabbMin[3]"),
+        ("ushort", "m_quantizedAabbMax[3]"),
+    )),
+    ("btQuantizedBvhFloatData", (
+        ("btVector3FloatData", "m_bvhAabbMin"),
+        ("btVector3FloatData", "m_bvhAabbMax"),
+        ("btVector3FloatData", "m_bvhQuantization"),
+        ("int", "m_curNodeIndex"),
+        ("int", "m_useQuantization"),
+        ("int", "m_numContiguousLeafNodes"),
+        ("int", "m_numQuantizedContiguousNodes"),
+        ("btOptimizedBvhNodeFloatData", "*m_contiguousNodesPtr"),
+        ("btQuantizedBvhNodeData", "*m_quantizedContiguousNodesPtr"),
+        ("btBvhSubtreeInfoData", "*m_subTreeInfoPtr"),
+        ("int", "m_traversalMode"),
+        ("int", "m_numSubtreeHeaders"),
+    )),
+    ("btTriangleMeshShapeData", (
+        ("btCollisionShapeData", "m_collisionShapeData"),
+        ("btStridingMeshInterfaceData", "m_meshInterface"),
+        ("btQuantizedBvhFloatData", "*m_quantizedFloatBvh"),
+        ("btQuantizedBvhDoubleData", "*m_quantizedDoubleBvh"),
+        ("btTriangleInfoMapData", "*m_triangleInfoMap"),
+        ("float", "m_collisionMargin"),
+        ("char", "m_pad3[4]"),
+    )),
+    ("btCompoundShapeChildData", (
+        ("btTransformFloatData", "m_transform"),
+        ("btCollisionShapeData", "*m_childShape"),
+        ("int", "m_childShapeType"),
+        ("float", "m_childMargin"),
+    )),
+    ("btCompoundShapeData", (
+        ("btCollisionShapeData", "m_collisionShapeData"),
+        ("btCompoundShapeChildData", "*m_childShapePtr"),
+        ("int", "m_numChildShapes"),
+        ("float", "m_collisionMargin"),
+    )),
+    ("btCollisionObjectFloatData", (
+        ("void", "*m_broadphaseHandle"),
+        ("void", "*m_collisionShape"),
+        ("btCollisionShapeData", "*m_rootCollisionShape"),
+        ("char", "*m_name"),
+        ("btTransformFloatData", "m_worldTransform"),
+        ("btTransformFloatData", "m_interpolationWorldTransform"),
+        ("btVector3FloatData", "m_interpolationLinearVelocity"),
+        ("btVector3FloatData", "m_interpolationAngularVelocity"),
+        ("btVector3FloatData", "m_anisotropicFriction"),
+        ("float", "m_contactProcessingThreshold"),
+        ("float", "m_deactivationTime"),
+        ("float", "m_friction"),
+        ("float", "m_rollingFriction"),
+        ("float", "m_restitution"),
+        ("float", "m_hitFraction"),
+        ("float", "m_ccdSweptSphereRadius"),
+        ("float", "m_ccdMotionThreshold"),
+        ("int", "m_hasAnisotropicFriction"),
+        ("int", "m_collisionFlags"),
+        ("int", "m_islandTag1"),
+        ("int", "m_companionId"),
+        ("int", "m_activationState1"),
+        ("int", "m_internalType"),
+        ("int", "m_checkCollideWith"),
+        ("char", "m_padding[4]"),
+    )),
+    ("btRigidBodyFloatData", (
+        ("btCollisionObjectFloatData", "m_collisionObjectData"),
+        ("btMatrix3x3FloatData", "m_invInertiaTensorWorld"),
+        ("btVector3FloatData", "m_linearVelocity"),
+        ("btVector3FloatData", "m_angularVelocity"),
+        ("btVector3FloatData", "m_angularFactor"),
+        ("btVector3FloatData", "m_linearFactor"),
+        ("btVector3FloatData", "m_gravity"),
+        ("btVector3FloatData", "m_gravity_acceleration"),
+        ("btVector3FloatData", "m_invInertiaLocal"),
+        ("btVector3FloatData", "m_totalForce"),
+        ("btVector3FloatData", "m_totalTorque"),
+        ("float", "m_inverseMass"),
+        ("float", "m_linearDamping"),
+        ("float", "m_angularDamping"),
+        ("float", "m_additionalDampingFactor"),
+        ("float", "m_additionalLinearDampingThresholdSqr"),
+        ("float", "m_additionalAngularDampingThresholdSqr"),
+        ("float", "m_additionalAngularDampingFactor"),
+        ("float", "m_linearSleepingThreshold"),
+        ("float", "m_angularSleepingThreshold"),
+        ("int", "m_additionalDamping"),
+    )),
+)
+
+BASIC_FORMATS = dict((name, fmt) for name, size, fmt in BASIC_TYPES)
+STRUCT_FIELDS = dict(STRUCTS)
+STRUCT_INDEX = dict((name, i) for i, (name, fields) in enumerate(STRUCTS))
+
+def parse_field(field):
+    """Split a DNA field name like '*m_ptr' or 'm_floats[4]' into (name, is_pointer, count)."""
+    pointer = field.startswith("*")
+    name = field.lstrip("*")
+    count = 1
+    if "[" in name:
+        name, dim = name[:-1].split("[")
+        count = int(dim)
+    return name, pointer, count
+
+def type_size(type_name):
+    for name, size, fmt in BASIC_TYPES:
+        if name == type_name:
+            return size
+    if type_name in STRUCT_FIELDS:
+        total = 0
+        for field_type, field in STRUCT_FIELDS[type_name]:
+            name, pointer, count = parse_field(field)
+            total += (POINTER_SIZE if pointer else type_size(field_type)) * count
+        return total
+    return 0
+
+STRUCT_SIZES = dict((name, type_size(name)) for name, fields in STRUCTS)
+
+def _pack_into(out, struct_name, values):
+    fields = STRUCT_FIELDS[struct_name]
+    if values is not None and not isinstance(values, dict):
+        # Single field structs (vectors, matrices, indices) accept their field value directly.
+        values = {parse_field(fields[0][1])[0]: values}
+    for field_type, field in fields:
+        name, pointer, count = parse_field(field)
+        value = values.get(name) if values else None
+        if pointer or field_type in BASIC_FORMATS:
+            items = [] if value is None else (list(value) if count > 1 else [value])
+            items.extend([0] * (count - len(items)))
+            out.extend(struct.pack("<{}{}".format(count, "Q" if pointer else BASIC_FORMATS[field_type]), *items))
+        else:
+            items = [] if value is None else (list(value) if count > 1 else [value])
+            items.extend([None] * (count - len(items)))
+            for item in items:
+                _pack_into(out, field_type, item)
+
+def pack_struct(struct_name, values=None):
+    """Pack a dict of field values into the binary layout of a DNA struct. Missing fields are zeroed."""
+    out = bytearray()
+    _pack_into(out, struct_name, values)
+    return bytes(out)
+
+def _pad4(data):
+    data.extend(b"\0" * (-len(data) % 4))
+
+def build_dna():
+    """Build the SDNA block (NAME, TYPE, TLEN and STRC tables) for STRUCTS."""
+    names = []
+    types = [name for name, size, fmt in BASIC_TYPES]
+    types.extend(name for name, fields in STRUCTS)
+    types.extend(OPAQUE_TYPES)
+    for name, fields in STRUCTS:
+        for field_type, field in fields:
+            if field not in names:
+                names.append(field)
+
+    data = bytearray(b"SDNANAME")
+    data.extend(struct.pack("<i", len(names)))
+    for name in names:
+        data.extend(name.encode("ascii") + b"\0")
+    _pad4(data)
+
+    data.extend(b"TYPE")
+    data.extend(struct.pack("<i", len(types)))
+    for name in types:
+        data.extend(name.encode("ascii") + b"\0")
+    _pad4(data)
+
+    data.extend(b"TLEN")
+    for name in types:
+        data.extend(struct.pack("<h", type_size(name)))
+    _pad4(data)
+
+    data.extend(b"STRC")
+    data.extend(struct.pack("<i", len(STRUCTS)))
+    for name, fields in STRUCTS:
+        data.extend(struct.pack("<hh", types.index(name), len(fields)))
+        for field_type, field in fields:
+            data.extend(struct.pack("<hh", types.index(field_type), names.index(field)))
+    return bytes(data)
+
+DNA = build_dna()
+
+IDENTITY_TRANSFORM = {
+    "m_basis": ((1.0, 0.0, 0.0), (0.0, 1.0, 0.0), (0.0, 0.0, 1.0)),
+    "m_origin": (0.0, 0.0, 0.0),
+}
+
+def make_transform(basis=((1.0, 0.0, 0.0), (0.0, 1.0, 0.0), (0.0, 0.0, 1.0)), origin=(0.0, 0.0, 0.0)):
+    """Build btTransformFloatData values from basis rows and an origin."""
+    return {"m_basis": tuple(tuple(float(x) for x in row) for row in basis), "m_origin": tuple(float(x) for x in origin)}
+
+def transform_aabb(transform, aabb_min, aabb_max):
+    basis = numpy.array(transform["m_basis"], dtype=numpy.float64)
+    center = (numpy.array(aabb_max) + numpy.array(aabb_min)) * 0.5
+    extent = (numpy.array(aabb_max) - numpy.array(aabb_min)) * 0.5
+    center = basis.dot(center) + numpy.array(transform["m_origin"])
+    extent = numpy.abs(basis).dot(extent)
+    return tuple(center - extent), tuple(center + extent)
+
+class BulletSerializer(object):
+    """Streams chunks to a binary file object, mirroring btDefaultSerializer."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.unique_ids = {}
+        self.last_id = 1
+        self.serialized = set()
+
+    def unique_pointer(self, key):
+        if key is None:
+            return 0
+        uid = self.unique_ids.get(key)
+        if uid is None:
+            self.last_id += 1
+            uid = self.last_id
+            self.unique_ids[key] = uid
+        return uid | (uid << 32)
+
+    def write_chunk_header(self, code, struct_name, number, size, key):
+        dna_nr = STRUCT_INDEX.get(struct_name, -1)
+        self.stream.write(CHUNK_HEADER.pack(code, size, self.unique_pointer(key), dna_nr, number))
+        self.serialized.add(key)
+
+    def write_chunk(self, code, struct_name, number, data, key):
+        data = memoryview(data).cast("B")
+        self.write_chunk_header(code, struct_name, number, len(data), key)
+        self.stream.write(data)
+
+    def write_array(self, struct_name, array, key, rows=None):
+        """Write a numpy array as a chunk of struct_name rows, WRITE_BLOCK_BYTES at a time.
+
+        rows converts a slice of array into contiguous struct_name rows. Without it, array's rows must
+        already use that layout. Contiguous blocks are written through a memoryview without copying.
+        """
+        row_size = STRUCT_SIZES[struct_name]
+        number = len(array)
+        self.write_chunk_header(ARRAY_CODE, struct_name, number, number * row_size, key)
+        step = max(1, WRITE_BLOCK_BYTES // row_size)
+        for start in range(0, number, step):
+            block = array[start:start + step]
+            block = numpy.ascontiguousarray(block if rows is None else rows(block))
+            if block.nbytes != len(block) * row_size:
+                raise ValueError("{} rows are {} bytes, not {}".format(struct_name, block.nbytes // max(len(block), 1), row_size))
+            self.stream.write(memoryview(block).cast("B"))
+
+    def start(self):
+        self.stream.write(HEADER)
+
+    def finish(self):
+        self.write_chunk(DNA_CODE, "DNA1", 1, DNA, "DNA1")
+
+def vector4_array(points):
+    """Convert an (N, 3) point array to btVector3FloatData rows."""
+    points = numpy.asarray(points, dtype=numpy.float32).reshape(-1, 3)
+    rows = numpy.zeros((len(points), 4), dtype="<f4")
+    rows[:, :3] = points
+    return rows
+
+def int_index_array(indices):
+    """Convert indices to btIntIndexData rows, without copying ones that already are."""
+    return numpy.asarray(indices, dtype="<i4")
+
+def short_triplet_array(triangles):
+    """Convert (N, 3) indices below 65536 to btShortIntIndexTripletData rows."""
+    triangles = numpy.asarray(triangles).reshape(-1, 3)
+    rows = numpy.zeros((len(triangles), 4), dtype="<u2")
+    rows[:, :3] = triangles
+    return rows
+
+def char_triplet_array(triangles):
+    """Convert (N, 3) indices below 256 to btCharIndexTripletData rows."""
+    triangles = numpy.asarray(triangles).reshape(-1, 3)
+    rows = numpy.zeros((len(triangles), 4), dtype="u1")
+    rows[:, :3] = triangles
+    return rows
+
+# (btMeshPartData field, row struct, row converter, largest vertex count), narrowest first.
+INDEX_ENCODINGS = (
+    ("m_3indices8", "btCharIndexTripletData", char_triplet_array, 1 << 8),
+    ("m_3indices16", "btShortIntIndexTripletData", short_triplet_array, 1 << 16),
+)
+
+def index_encoding(vertex_count, compact=True):
+    """(btMeshPartData field, row struct, row converter) for the indices of a part with vertex_count vertices."""
+    if compact:
+        for field, struct_name, rows, limit in INDEX_ENCODINGS:
+            if vertex_count <= limit:
+                return field, struct_name, rows
+    return "m_indices32", "btIntIndexData", int_index_array
+
+class CollisionShape(object):
+    shape_type = None
+    struct_name = "btCollisionShapeData"
+
+    def __init__(self, margin=DEFAULT_MARGIN):
+        self.margin = margin
+
+    def shape_data(self, serializer):
+        return {"m_shapeType": self.shape_type}
+
+    def reserve_pointers(self, serializer):
+        """Assign unique ids to child chunks in the order Bullet allocates them."""
+        pass
+
+    def write_children(self, serializer):
+        pass
+
+    def serialize(self, serializer):
+        if self in serializer.serialized:
+            return serializer.unique_pointer(self)
+        self.reserve_pointers(serializer)
+        data = pack_struct(self.struct_name, self.shape_data(serializer))
+        serializer.write_chunk(SHAPE_CODE, self.struct_name, 1, data, self)
+        self.write_children(serializer)
+        return serializer.unique_pointer(self)
+
+    def aabb(self):
+        raise NotImplementedError()
+
+    def local_inertia(self, mass):
+        """Box approximation of the inertia, as btPolyhedralConvexShape::calculateLocalInertia."""
+        aabb_min, aabb_max = self.aabb()
+        lengths = [(hi - lo) + 4.0 * self.margin for lo, hi in zip(aabb_min, aabb_max)]
+        x2, y2, z2 = [l * l for l in lengths]
+        scaled = mass * 0.08333333
+        return (scaled * (y2 + z2), scaled * (x2 + z2), scaled * (x2 + y2))
+
+class ConvexInternalShape(CollisionShape):
+    struct_name = "btConvexInternalShapeData"
+
+    def implicit_dimensions(self):
+        return (0.0, 0.0, 0.0)
+
+    def convex_data(self, serializer):
+        return {
+            "m_collisionShapeData": CollisionShape.shape_data(self, serializer),
+            "m_localScaling": (1.0, 1.0, 1.0),
+            "m_implicitShapeDimensions": self.implicit_dimensions(),
+            "m_collisionMargin": self.margin,
+        }
+
+    def shape_data(self, serializer):
+        return self.convex_data(serializer)
+
+class BoxShape(ConvexInternalShape):
+    shape_type = BOX_SHAPE_PROXYTYPE
+
+    def __init__(self, half_extents, margin=DEFAULT_MARGIN):
+        ConvexInternalShape.__init__(self, margin)
+        self.half_extents = tuple(abs(float(x)) for x in half_extents)
+
+    def implicit_dimensions(self):
+        return tuple(x - self.margin for x in self.half_extents)
+
+    def aabb(self):
+        return tuple(-x for x in self.half_extents), self.half_extents
+
+    def local_inertia(self, mass):
+        lx, ly, lz = [2.0 * x for x in self.half_extents]
+        return (mass / 12.0 * (ly * ly + lz * lz), mass / 12.0 * (lx * lx + lz * lz), mass / 12.0 * (lx * lx + ly * ly))
+
+class SphereShape(ConvexInternalShape):
+    shape_type = SPHERE_SHAPE_PROXYTYPE
+
+    def __init__(self, radius, margin=DEFAULT_MARGIN):
+        ConvexInternalShape.__init__(self, margin)
+        self.radius = float(radius)
+
+    def implicit_dimensions(self):
+        return (self.radius, 0.0, 0.0)
+
+    def aabb(self):
+        r = self.radius
+        return (-r, -r, -r), (r, r, r)
+
+    def local_inertia(self, mass):
+        elem = 0.4 * mass * self.radius * self.radius
+        return (elem, elem, elem)
+
+class AxisShape(ConvexInternalShape):
+    """Base for shapes with an up axis (capsule, cylinder, cone)."""
+    up_field = "m_upAxis"
+
+    def __init__(self, radius, height, up_axis=2, margin=DEFAULT_MARGIN):
+        ConvexInternalShape.__init__(self, margin)
+        self.radius = float(radius)
+        self.height = float(height)
+        self.up_axis = up_axis
+
+    def shape_data(self, serializer):
+        return {"m_convexInternalShapeData": self.convex_data(serializer), self.up_field: self.up_axis}
+
+    def aabb(self):
+        half = [self.radius] * 3
+        half[self.up_axis] = self.half_height()
+        return tuple(-x for x in half), tuple(half)
+
+    def half_height(self):
+        return self.height * 0.5
+
+class CapsuleShape(AxisShape):
+    shape_type = CAPSULE_SHAPE_PROXYTYPE
+    struct_name = "btCapsuleShapeData"
+
+    def implicit_dimensions(self):
+        dims = [self.radius] * 3
+        dims[self.up_axis] = self.height * 0.5
+        return tuple(dims)
+
+    def half_height(self):
+        return self.height * 0.5 + self.radius
+
+class CylinderShape(AxisShape):
+    shape_type = CYLINDER_SHAPE_PROXYTYPE
+    struct_name = "btCylinderShapeData"
+
+    def implicit_dimensions(self):
+        dims = [self.radius - self.margin] * 3
+        dims[self.up_axis] = self.height * 0.5 - self.margin
+        return tuple(dims)
+
+class ConeShape(AxisShape):
+    shape_type = CONE_SHAPE_PROXYTYPE
+    struct_name = "btConeShapeData"
+    up_field = "m_upIndex"
+
+    def implicit_dimensions(self):
+        dims = [self.radius] * 3
+        dims[self.up_axis] = self.height
+        return tuple(dims)
+
+class ConvexHullShape(ConvexInternalShape):
+    shape_type = CONVEX_HULL_SHAPE_PROXYTYPE
+    struct_name = "btConvexHullShapeData"
+
+    def __init__(self, points, margin=DEFAULT_MARGIN):
+        ConvexInternalShape.__init__(self, margin)
+        self.points = numpy.asarray(points, dtype=numpy.float32).reshape(-1, 3)
+
+    def reserve_pointers(self, serializer):
+        if len(self.points):
+            serializer.unique_pointer((self, "points"))
+
+    def shape_data(self, serializer):
+        return {
+            "m_convexInternalShapeData": self.convex_data(serializer),
+            "m_unscaledPointsFloatPtr": serializer.unique_pointer((self, "points")) if len(self.points) else 0,
+            "m_numPoints": len(self.points),
+        }
+
+    def write_children(self, serializer):
+        if len(self.points):
+            serializer.write_array("btVector3FloatData", self.points, (self, "points"), vector4_array)
+
+    def aabb(self):
+        if not len(self.points):
+            return (0.0, 0.0, 0.0), (0.0, 0.0, 0.0)
+        return tuple(self.points.min(axis=0)), tuple(self.points.max(axis=0))
+
+class TriangleMeshShape(CollisionShape):
+    """A btBvhTriangleMeshShape over a btTriangleIndexVertexArray.
+
+    parts optionally replaces vertices and triangles with several (vertices, triangles) mesh parts.
+    With compact_indices, each part's indices use the narrowest type its vertex count allows, otherwise
+    they're 32-bit. bvh is an optional quantized_bvh.QuantizedBvh over the same parts, serialized so it
+    isn't rebuilt on load.
+    """
+    shape_type = TRIANGLE_MESH_SHAPE_PROXYTYPE
+    struct_name = "btTriangleMeshShapeData"
+
+    def __init__(self, vertices=None, triangles=None, margin=DEFAULT_MARGIN, bvh=None, parts=None, compact_indices=False):
+        CollisionShape.__init__(self, margin)
+        if parts is None:
+            parts = [(vertices, triangles)]
+        # Kept as given; they're converted a block at a time when written.
+        self.parts = [(numpy.asarray(v).reshape(-1, 3), numpy.asarray(t).reshape(-1, 3)) for v, t in parts]
+        self.compact_indices = compact_indices
+        self.bvh = bvh
+
+    def reserve_pointers(self, serializer):
+        serializer.unique_pointer((self, "parts"))
+        for index, (vertices, triangles) in enumerate(self.parts):
+            if len(triangles):
+                serializer.unique_pointer((self, "indices", index))
+            if len(vertices):
+                serializer.unique_pointer((self, "vertices", index))
+        if self.bvh is not None:
+            serializer.unique_pointer((self, "bvh"))
+            serializer.unique_pointer((self, "bvh_nodes"))
+            serializer.unique_pointer((self, "bvh_subtrees"))
+
+    def shape_data(self, serializer):
+        return {
+            "m_collisionShapeData": CollisionShape.shape_data(self, serializer),
+            "m_meshInterface": {
+                "m_meshPartsPtr": serializer.unique_pointer((self, "parts")),
+                "m_scaling": (1.0, 1.0, 1.0),
+                "m_numMeshParts": len(self.parts),
+            },
+            "m_quantizedFloatBvh": serializer.unique_pointer((self, "bvh")) if self.bvh is not None else 0,
+            "m_collisionMargin": self.margin,
+        }
+
+    def write_children(self, serializer):
+        data = bytearray()
+        encodings = []
+        for index, (vertices, triangles) in enumerate(self.parts):
+            encoding = index_encoding(len(vertices), self.compact_indices)
+            part = {"m_numTriangles": len(triangles), "m_numVertices": len(vertices)}
+            if len(triangles):
+                part[encoding[0]] = serializer.unique_pointer((self, "indices", index))
+            if len(vertices):
+                part["m_vertices3f"] = serializer.unique_pointer((self, "vertices", index))
+            data.extend(pack_struct("btMeshPartData", part))
+            encodings.append(encoding)
+        serializer.write_chunk(ARRAY_CODE, "btMeshPartData", len(self.parts), data, (self, "parts"))
+        for index, ((vertices, triangles), (field, struct_name, rows)) in enumerate(zip(self.parts, encodings)):
+            if len(triangles):
+                # 32-bit indices are one row per index, the narrower types one row per triangle.
+                indices = triangles.reshape(-1) if struct_name == "btIntIndexData" else triangles
+                serializer.write_array(struct_name, indices, (self, "indices", index), rows)
+            if len(vertices):
+                serializer.write_array("btVector3FloatData", vertices, (self, "vertices", index), vector4_array)
+        if self.bvh is not None:
+            self.write_bvh(serializer)
+
+    def write_bvh(self, serializer):
+        """Write the BVH chunks the way btQuantizedBvh::serialize lays them out."""
+        bvh = self.bvh
+        data = pack_struct("btQuantizedBvhFloatData", {
+            "m_bvhAabbMin": tuple(bvh.aabb_min),
+            "m_bvhAabbMax": tuple(bvh.aabb_max),
+            "m_bvhQuantization": tuple(bvh.quantization),
+            "m_curNodeIndex": bvh.node_count,
+            "m_useQuantization": 1,
+            "m_numQuantizedContiguousNodes": len(bvh.nodes),
+            "m_quantizedContiguousNodesPtr": serializer.unique_pointer((self, "bvh_nodes")),
+            "m_subTreeInfoPtr": serializer.unique_pointer((self, "bvh_subtrees")),
+            "m_numSubtreeHeaders": len(bvh.subtrees),
+        })
+        serializer.write_chunk(QUANTIZED_BVH_CODE, "btQuantizedBvhFloatData", 1, data, (self, "bvh"))
+        serializer.write_array("btQuantizedBvhNodeData", bvh.nodes, (self, "bvh_nodes"))
+        serializer.write_array("btBvhSubtreeInfoData", bvh.subtrees, (self, "bvh_subtrees"))
+
+    def aabb(self):
+        vertices = [x[0] for x in self.parts if len(x[0])]
+        if not vertices:
+            return (0.0, 0.0, 0.0), (0.0, 0.0, 0.0)
+        return (tuple(numpy.min([x.min(axis=0) for x in vertices], axis=0)),
+            tuple(numpy.max([x.max(axis=0) for x in vertices], axis=0)))
+
+    def local_inertia(self, mass):
+        # Triangle meshes can only be static.
+        return (0.0, 0.0, 0.0)
+
+class CompoundShape(CollisionShape):
+    """A btCompoundShape of (shape, transform) children. Children shared with other shapes are written once."""
+    shape_type = COMPOUND_SHAPE_PROXYTYPE
+    struct_name = "btCompoundShapeData"
+
+    def __init__(self, children, margin=DEFAULT_MARGIN):
+        CollisionShape.__init__(self, margin)
+        self.children = list(children)
+
+    def unique_children(self):
+        children = []
+        for child, transform in self.children:
+            if child not in children:
+                children.append(child)
+        return children
+
+    def reserve_pointers(self, serializer):
+        if len(self.children):
+            serializer.unique_pointer((self, "children"))
+        for child in self.unique_children():
+            serializer.unique_pointer(child)
+            if child not in serializer.serialized:
+                child.reserve_pointers(serializer)
+
+    def shape_data(self, serializer):
+        return {
+            "m_collisionShapeData": CollisionShape.shape_data(self, serializer),
+            "m_childShapePtr": serializer.unique_pointer((self, "children")) if len(self.children) else 0,
+            "m_numChildShapes": len(self.children),
+            "m_collisionMargin": self.margin,
+        }
+
+    def write_children(self, serializer):
+        if not len(self.children):
+            return
+        data = bytearray()
+        for child, transform in self.children:
+            data.extend(pack_struct("btCompoundShapeChildData", {
+                "m_transform": transform,
+                "m_childShape": serializer.unique_pointer(child),
+                "m_childShapeType": child.shape_type,
+                "m_childMargin": child.margin,
+            }))
+        serializer.write_chunk(ARRAY_CODE, "btCompoundShapeChildData", len(self.children), data, (self, "children"))
+        for child in self.unique_children():
+            child.serialize(serializer)
+
+    def aabb(self):
+        if not len(self.children):
+            return (0.0, 0.0, 0.0), (0.0, 0.0, 0.0)
+        bounds = [transform_aabb(transform, *child.aabb()) for child, transform in self.children]
+        return tuple(numpy.min([x[0] for x in bounds], axis=0)), tuple(numpy.max([x[1] for x in bounds], axis=0))
+
+class RigidBody(object):
+    def __init__(self, shape, mass=0.0, friction=0.5, restitution=0.0, linear_damping=0.04,
+            angular_damping=0.1, collision_flags=CF_STATIC_OBJECT, angular_factor=(1.0, 1.0, 1.0),
+            transform=IDENTITY_TRANSFORM):
+        self.shape = shape
+        self.mass = mass
+        self.friction = friction
+        self.restitution = restitution
+        self.linear_damping = linear_damping
+        self.angular_damping = angular_damping
+        self.collision_flags = collision_flags
+        self.angular_factor = angular_factor
+        self.transform = transform
+
+    def body_data(self, serializer):
+        inverse_mass = 1.0 / self.mass if self.mass > 0.0 else 0.0
+        inv_inertia = (0.0, 0.0, 0.0)
+        if inverse_mass != 0.0:
+            inv_inertia = tuple(1.0 / x if x != 0.0 else 0.0 for x in self.shape.local_inertia(self.mass))
+        basis = numpy.array(self.transform["m_basis"], dtype=numpy.float64)
+        inv_inertia_world = basis.dot(numpy.diag(inv_inertia)).dot(basis.T)
+        return {
+            "m_collisionObjectData": {
+                "m_collisionShape": serializer.unique_pointer(self.shape),
+                "m_worldTransform": self.transform,
+                "m_interpolationWorldTransform": self.transform,
+                "m_anisotropicFriction": (1.0, 1.0, 1.0),
+                "m_contactProcessingThreshold": BT_LARGE_FLOAT,
+                "m_friction": self.friction,
+                "m_restitution": self.restitution,
+                "m_hitFraction": 1.0,
+                "m_collisionFlags": self.collision_flags,
+                "m_islandTag1": -1,
+                "m_companionId": -1,
+                "m_activationState1": ACTIVE_TAG,
+                "m_internalType": CO_RIGID_BODY,
+            },
+            "m_invInertiaTensorWorld": tuple(tuple(float(x) for x in row) for row in inv_inertia_world),
+            "m_angularFactor": self.angular_factor,
+            "m_linearFactor": (1.0, 1.0, 1.0),
+            "m_invInertiaLocal": inv_inertia,
+            "m_inverseMass": inverse_mass,
+            "m_linearDamping": self.linear_damping,
+            "m_angularDamping": self.angular_damping,
+            "m_additionalDampingFactor": 0.005,
+            "m_additionalLinearDampingThresholdSqr": 0.01,
+            "m_additionalAngularDampingThresholdSqr": 0.01,
+            "m_additionalAngularDampingFactor": 0.01,
+            "m_linearSleepingThreshold": 0.8,
+            "m_angularSleepingThreshold": 1.0,
+        }
+
+    def serialize(self, serializer):
+        data = pack_struct("btRigidBodyFloatData", self.body_data(serializer))
+        serializer.write_chunk(RIGIDBODY_CODE, "btRigidBodyFloatData", 1, data, self)
+
+def write_bullet(stream, bodies):
+    """Serialize rigid bodies the way btDiscreteDynamicsWorld::serialize does: shapes first, then bodies."""
+    serializer = BulletSerializer(stream)
+    serializer.start()
+    for body in bodies:
+        body.shape.serialize(serializer)
+    for body in bodies:
+        body.serialize(serializer)
+    serializer.finish()
+    return serializer
+
+def write_bullet_file(filepath, bodies):
+    """Write bodies to filepath and return the number of bytes written."""
+    with open(filepath, "wb") as stream:
+        write_bullet(stream, bodies)
+        return stream.tell()
@@ -0,0 +1,177 @@
+"""Approximate convex decomposition of concave meshes, in the style of V-HACD.
+
+The mesh is voxelized, then the voxels are split recursively by axis-aligned planes. Each
+split is the one that minimizes the summed concavity of the two halves, where concavity is
+the volume a part's convex hull adds over its voxels. The result only depends on the input, so
+repeated exports are identical.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+
+from . import convex_hull
+from .geometry import contains, mesh_volume
+
+CORNERS = numpy.array([(x, y, z) for x in (0, 1) for y in (0, 1) for z in (0, 1)], dtype=numpy.float64)
+NEIGHBORS = numpy.array(((1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, 1), (0, 0, -1)), dtype=numpy.int64)
+# Vertex budget for the hulls measured while searching for split planes.
+SEARCH_HULL_VERTICES = 48
+
+def sample_triangles(vertices, triangles, spacing):
+    """Deterministic barycentric grid samples with at most spacing between neighbours, plus every vertex."""
+    vertices = numpy.asarray(vertices, dtype=numpy.float64).reshape(-1, 3)
+    triangles = numpy.asarray(triangles, dtype=numpy.int64).reshape(-1, 3)
+    p0, p1, p2 = vertices[triangles[:, 0]], vertices[triangles[:, 1]], vertices[triangles[:, 2]]
+    longest = numpy.sqrt(numpy.max([((p1 - p0) ** 2).sum(axis=1), ((p2 - p1) ** 2).sum(axis=1), ((p0 - p2) ** 2).sum(axis=1)], axis=0))
+    steps = numpy.maximum(numpy.ceil(longest / spacing).astype(numpy.int64), 1)
+    samples = [vertices]
+    for step in numpy.unique(steps):
+        selected = steps == step
+        i, j = numpy.meshgrid(numpy.arange(step + 1), numpy.arange(step + 1), indexing="ij")
+        keep = (i + j) <= step
+        u = i[keep] / float(step)
+        v = j[keep] / float(step)
+        a, b, c = p0[selected], p1[selected], p2[selected]
+        points = a[:, None, :] + (b - a)[:, None, :] * u[None, :, None] + (c - a)[:, None, :] * v[None, :, None]
+        samples.append(points.reshape(-1, 3))
+    return numpy.concatenate(samples)
+
+def _dilate(mask):
+    grown = mask.copy()
+    grown[1:] |= mask[:-1]
+    grown[:-1] |= mask[1:]
+    grown[:, 1:] |= mask[:, :-1]
+    grown[:, :-1] |= mask[:, 1:]
+    grown[:, :, 1:] |= mask[:, :, :-1]
+    grown[:, :, :-1] |= mask[:, :, 1:]
+    return grown
+
+class VoxelGrid(object):
+    """Solid voxelization of a triangle mesh: surface voxels plus everything they enclose."""
+
+    def __init__(self, vertices, triangles, resolution):
+        vertices = numpy.asarray(vertices, dtype=numpy.float64).reshape(-1, 3)
+        aabb_min, aabb_max = vertices.min(axis=0), vertices.max(axis=0)
+        extent = numpy.maximum(aabb_max - aabb_min, 1e-6)
+        self.size = float((extent.prod() / resolution) ** (1.0 / 3.0))
+        self.size = max(self.size, float(extent.max()) / 256.0)
+        # One empty voxel of padding on every side, so the outside is connected.
+        self.origin = aabb_min - self.size
+        self.shape = tuple(int(x) for x in numpy.ceil(extent / self.size).astype(numpy.int64) + 3)
+
+        self.samples = sample_triangles(vertices, triangles, self.size * 0.5)
+        sample_cells = self.cell_of(self.samples)
+        surface = numpy.zeros(self.shape, dtype=bool)
+        surface[sample_cells[:, 0], sample_cells[:, 1], sample_cells[:, 2]] = True
+
+        outside = numpy.zeros(self.shape, dtype=bool)
+        outside[0, :, :] = outside[-1, :, :] = True
+        outside[:, 0, :] = outside[:, -1, :] = True
+        outside[:, :, 0] = outside[:, :, -1] = True
+        outside &= ~surface
+        while True:
+            grown = _dilate(outside) & ~surface
+            if grown.sum() == outside.sum():
+                break
+            outside = grown
+
+        solid = ~outside
+        self.cells = numpy.argwhere(solid).astype(numpy.int64)
+        self.ids = self.cell_ids(self.cells)
+        self.on_surface = surface[solid]
+        self.sample_ids = self.cell_ids(sample_cells)
+        self.voxel_volume = self.size ** 3
+
+    def cell_of(self, points):
+        cells = numpy.floor((points - self.origin) / self.size).astype(numpy.int64)
+        return numpy.clip(cells, 0, numpy.array(self.shape) - 1)
+
+    def cell_ids(self, cells):
+        return (cells[:, 0] * self.shape[1] + cells[:, 1]) * self.shape[2] + cells[:, 2]
+
+    def boundary(self, part):
+        """Indices (into part) of voxels with at least one face-neighbour outside the part."""
+        ids = self.ids[part]
+        cells = self.cells[part]
+        exposed = numpy.zeros(len(part), dtype=bool)
+        for offset in NEIGHBORS:
+            exposed |= ~contains(ids, self.cell_ids(cells + offset))
+        return numpy.nonzero(exposed)[0]
+
+    def corner_points(self, part):
+        boundary = self.cells[part][self.boundary(part)].astype(numpy.float64)
+        return (self.origin + (boundary[:, None, :] + CORNERS[None, :, :]) * self.size).reshape(-1, 3)
+
+    def hull_points(self, part):
+        """Points bounding a part: mesh surface samples in its surface voxels, corners of its interior voxels."""
+        inner = part[~self.on_surface[part]]
+        points = [self.samples[contains(self.ids[part[self.on_surface[part]]], self.sample_ids)]]
+        if len(inner):
+            points.append(self.corner_points(inner))
+        return numpy.concatenate(points)
+
+    def concavity(self, part):
+        if len(part) == 0:
+            return 0.0
+        points, triangles = convex_hull.convex_hull(self.corner_points(part), SEARCH_HULL_VERTICES)
+        hull_volume = mesh_volume(points, triangles) if len(triangles) else 0.0
+        return max(hull_volume - len(part) * self.voxel_volume, 0.0)
+
+def _candidate_planes(cells, planes_per_axis):
+    candidates = []
+    for axis in range(3):
+        low, high = cells[:, axis].min(), cells[:, axis].max()
+        if high <= low:
+            continue
+        positions = numpy.unique(numpy.linspace(low + 1, high, planes_per_axis).astype(numpy.int64))
+        candidates.extend((axis, int(x)) for x in positions)
+    return candidates
+
+def _split(grid, max_parts, max_concavity, max_vertices, planes_per_axis, map_items):
+    total_volume = len(grid.cells) * grid.voxel_volume
+
+    def split_cost(part, plane):
+        axis, position = plane
+        left = grid.cells[part][:, axis] < position
+        return (grid.concavity(part[left]) + grid.concavity(part[~left])) / total_volume
+
+    parts = [numpy.arange(len(grid.cells))]
+    concavities = [grid.concavity(parts[0]) / total_volume]
+    final = [False]
+    while len(parts) < max_parts:
+        open_parts = [i for i in range(len(parts)) if not final[i] and concavities[i] > max_concavity]
+        if not open_parts:
+            break
+        index = max(open_parts, key=lambda i: (concavities[i], -i))
+        part = parts[index]
+        planes = _candidate_planes(grid.cells[part], planes_per_axis)
+        if not planes:
+            final[index] = True
+            continue
+        costs = list(map_items(lambda plane: split_cost(part, plane), planes))
+        axis, position = planes[int(numpy.argmin(costs))]
+        left = grid.cells[part][:, axis] < position
+        halves = [part[left], part[~left]]
+        parts[index:index + 1] = halves
+        concavities[index:index + 1] = list(map_items(lambda x: grid.concavity(x) / total_volume, halves))
+        final[index:index + 1] = [False, False]
+
+    return list(map_items(lambda part: convex_hull.convex_hull(grid.hull_points(part), max_vertices), parts))
+
+def decompose(vertices, triangles, max_parts=8, max_concavity=0.02, resolution=50000,
+        max_vertices=64, planes_per_axis=8, workers=1):
+    """Split a mesh into at most max_parts convex hulls.
+
+    max_concavity is relative to the mesh's voxel volume: parts below it aren't split further.
+    With workers above 1, candidate planes are measured on that many threads; the hulls hold the
+    GIL for most of their time, so it's only worth it on large meshes.
+    Returns a list of (hull_points, triangles) pairs.
+    """
+    vertices = numpy.asarray(vertices, dtype=numpy.float64).reshape(-1, 3)
+    if len(vertices) == 0:
+        return []
+    grid = VoxelGrid(vertices, triangles, resolution)
+    if workers > 1:
+        with ThreadPoolExecutor(workers) as executor:
+            return _split(grid, max_parts, max_concavity, max_vertices, planes_per_axis, executor.map)
+    return _split(grid, max_parts, max_concavity, max_vertices, planes_per_axis, map)
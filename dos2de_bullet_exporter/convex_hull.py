@@ -0,0 +1,176 @@
+"""Vectorized quickhull with a vertex budget, used to build compact btConvexHullShape points."""
+import numpy
+
+from .geometry import contains
+
+def _planes(points, faces):
+    p0 = points[faces[:, 0]]
+    normals = numpy.cross(points[faces[:, 1]] - p0, points[faces[:, 2]] - p0)
+    lengths = numpy.sqrt((normals * normals).sum(axis=1))
+    lengths[lengths == 0.0] = 1.0
+    normals /= lengths[:, None]
+    return normals, (normals * p0).sum(axis=1)
+
+def _planar_hull(points, indices, normal):
+    """Monotone chain hull of coplanar points, returned as a triangle fan."""
+    axis_u = numpy.cross(normal, (1.0, 0.0, 0.0) if abs(normal[0]) < 0.9 else (0.0, 1.0, 0.0))
+    axis_u /= numpy.sqrt((axis_u * axis_u).sum())
+    axis_v = numpy.cross(normal, axis_u)
+    uv = numpy.stack((points[indices].dot(axis_u), points[indices].dot(axis_v)), axis=1)
+    order = numpy.lexsort((uv[:, 1], uv[:, 0]))
+
+    def half(sequence):
+        chain = []
+        for i in sequence:
+            while len(chain) >= 2:
+                o, a = uv[chain[-2]], uv[chain[-1]]
+                if (a[0] - o[0]) * (uv[i][1] - o[1]) - (a[1] - o[1]) * (uv[i][0] - o[0]) > 0.0:
+                    break
+                chain.pop()
+            chain.append(i)
+        return chain[:-1]
+
+    ring = indices[half(order) + half(order[::-1])]
+    faces = numpy.array([(ring[0], ring[i], ring[i + 1]) for i in range(1, len(ring) - 1)], dtype=numpy.int64)
+    return ring, faces.reshape(-1, 3)
+
+def _compact(vertex_indices, faces):
+    """Renumber faces to index into vertex_indices."""
+    remap = numpy.full(vertex_indices.max() + 1 if len(vertex_indices) else 0, -1, dtype=numpy.int64)
+    remap[vertex_indices] = numpy.arange(len(vertex_indices))
+    return remap[faces]
+
+def convex_hull(points, max_vertices=0, tolerance=None):
+    """Compute the convex hull of an (N, 3) point array.
+
+    Points are added farthest first, so stopping at max_vertices (0 for no limit) keeps the
+    most significant ones. Returns (hull_points, triangles), with triangles indexing into
+    hull_points and wound counter-clockwise seen from outside. Flat input gives a triangle fan.
+    """
+    points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 3)
+    if len(points) == 0:
+        return points.astype(numpy.float32), numpy.zeros((0, 3), dtype=numpy.int32)
+    scale = max(numpy.abs(points).max(), 1e-12)
+    eps = scale * 1e-6 if tolerance is None else tolerance
+
+    # Initial simplex from the extreme points.
+    extremes = numpy.concatenate((points.argmin(axis=0), points.argmax(axis=0)))
+    delta = points[extremes][:, None, :] - points[extremes][None, :, :]
+    i, j = numpy.unravel_index(numpy.argmax((delta * delta).sum(axis=2)), (6, 6))
+    a, b = extremes[i], extremes[j]
+    ab = points[b] - points[a]
+    ab_length = numpy.sqrt((ab * ab).sum())
+    if ab_length <= eps:
+        return points[[a]].astype(numpy.float32), numpy.zeros((0, 3), dtype=numpy.int32)
+    cross = numpy.cross(points - points[a], ab)
+    line_dist = numpy.sqrt((cross * cross).sum(axis=1)) / ab_length
+    c = numpy.argmax(line_dist)
+    if line_dist[c] <= eps:
+        return points[[a, b]].astype(numpy.float32), numpy.zeros((0, 3), dtype=numpy.int32)
+    normal = numpy.cross(ab, points[c] - points[a])
+    normal /= numpy.sqrt((normal * normal).sum())
+    plane_dist = (points - points[a]).dot(normal)
+    d = numpy.argmax(numpy.abs(plane_dist))
+    if abs(plane_dist[d]) <= eps:
+        ring, faces = _planar_hull(points, numpy.arange(len(points)), normal)
+        if max_vertices > 2 and len(ring) > max_vertices:
+            # Keep evenly spaced ring vertices.
+            ring = ring[numpy.linspace(0, len(ring) - 1, max_vertices).astype(numpy.int64)]
+            faces = numpy.array([(ring[0], ring[k], ring[k + 1]) for k in range(1, len(ring) - 1)], dtype=numpy.int64)
+        return points[ring].astype(numpy.float32), _compact(ring, faces).astype(numpy.int32)
+
+    faces = numpy.array(((a, b, c), (a, c, d), (a, d, b), (b, d, c)), dtype=numpy.int64)
+    if plane_dist[d] > 0.0:
+        faces = faces[:, ::-1].copy()
+    normals, offsets = _planes(points, faces)
+    alive = numpy.ones(len(faces), dtype=bool)
+    vertex_count = 4
+
+    # Assign every point outside the simplex to the face it is farthest in front of.
+    distances = points.dot(normals.T) - offsets
+    out_face = numpy.argmax(distances, axis=1)
+    out_dist = distances[numpy.arange(len(points)), out_face]
+    outside = out_dist > eps
+    out_index = numpy.nonzero(outside)[0]
+    out_face = out_face[outside]
+    out_dist = out_dist[outside]
+
+    while len(out_index) > 0 and (max_vertices <= 0 or vertex_count < max_vertices):
+        k = numpy.argmax(out_dist)
+        apex = out_index[k]
+        p = points[apex]
+
+        visible = alive & (normals.dot(p) - offsets > eps)
+        visible[out_face[k]] = True
+        edges = faces[visible][:, ((0, 1), (1, 2), (2, 0))].reshape(-1, 2)
+        n = len(points)
+        codes = edges[:, 0] * n + edges[:, 1]
+        horizon = edges[~contains(codes, edges[:, 1] * n + edges[:, 0])]
+
+        new_faces = numpy.empty((len(horizon), 3), dtype=numpy.int64)
+        new_faces[:, :2] = horizon
+        new_faces[:, 2] = apex
+        new_normals, new_offsets = _planes(points, new_faces)
+
+        alive[visible] = False
+        first_new = len(faces)
+        faces = numpy.concatenate((faces, new_faces))
+        normals = numpy.concatenate((normals, new_normals))
+        offsets = numpy.concatenate((offsets, new_offsets))
+        alive = numpy.concatenate((alive, numpy.ones(len(new_faces), dtype=bool)))
+
+        # Points owned by removed faces move to the new face they are farthest in front of, or drop out.
+        orphaned = visible[out_face]
+        orphaned[k] = True
+        keep = ~orphaned
+        keep[k] = False
+        orphans = out_index[orphaned]
+        orphans = orphans[orphans != apex]
+        if len(orphans) > 0 and len(new_faces) > 0:
+            distances = points[orphans].dot(new_normals.T) - new_offsets
+            best = numpy.argmax(distances, axis=1)
+            best_dist = distances[numpy.arange(len(orphans)), best]
+            still_outside = best_dist > eps
+            out_index = numpy.concatenate((out_index[keep], orphans[still_outside]))
+            out_face = numpy.concatenate((out_face[keep], best[still_outside] + first_new))
+            out_dist = numpy.concatenate((out_dist[keep], best_dist[still_outside]))
+        else:
+            out_index = out_index[keep]
+            out_face = out_face[keep]
+            out_dist = out_dist[keep]
+
+        if max_vertices > 0:
+            vertex_count = len(numpy.unique(faces[alive]))
+
+        if alive.sum() * 2 < len(alive):
+            remap = numpy.cumsum(alive) - 1
+            faces = faces[alive]
+            normals = normals[alive]
+            offsets = offsets[alive]
+            alive = numpy.ones(len(faces), dtype=bool)
+            out_face = remap[out_face]
+
+    faces = faces[alive]
+    hull = numpy.unique(faces)
+    return points[hull].astype(numpy.float32), _compact(hull, faces).astype(numpy.int32)
+
+def shrink_hull(points, triangles, distance):
+    """Pull hull vertices inward by distance so a collision margin of the same size restores the original surface.
+
+    Each vertex moves along its averaged face normal, never more than half way to the hull centroid.
+    """
+    points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 3)
+    triangles = numpy.asarray(triangles, dtype=numpy.int64).reshape(-1, 3)
+    if distance <= 0.0 or len(triangles) == 0:
+        return points.astype(numpy.float32)
+    normals, offsets = _planes(points, triangles)
+    vertex_normals = numpy.zeros_like(points)
+    for corner in range(3):
+        numpy.add.at(vertex_normals, triangles[:, corner], normals)
+    lengths = numpy.sqrt((vertex_normals * vertex_normals).sum(axis=1))
+    lengths[lengths == 0.0] = 1.0
+    vertex_normals /= lengths[:, None]
+    centroid = points.mean(axis=0)
+    to_centroid = numpy.sqrt(((points - centroid) ** 2).sum(axis=1))
+    shift = numpy.minimum(distance, to_centroid * 0.5)
+    return (points - vertex_normals * shift[:, None]).astype(numpy.float32)
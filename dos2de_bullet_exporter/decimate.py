@@ -0,0 +1,229 @@
+"""Quadric error metric edge-collapse decimation for collision meshes.
+
+Each pass collapses a batch of independent edges at once: an edge is picked when it is the
+cheapest edge around both of its vertices and no other picked edge touches its triangles, so
+every collapse in a pass can be applied with array operations. Open boundaries are held in
+place by heavily weighted planes perpendicular to them.
+"""
+import numpy
+
+from .geometry import compact_vertices, contains
+
+BOUNDARY_WEIGHT = 1000.0
+
+def _face_planes(vertices, triangles):
+    p0 = vertices[triangles[:, 0]]
+    normals = numpy.cross(vertices[triangles[:, 1]] - p0, vertices[triangles[:, 2]] - p0)
+    areas = numpy.sqrt((normals * normals).sum(axis=1))
+    nonzero = areas > 0.0
+    normals[nonzero] /= areas[nonzero][:, None]
+    return normals, -(normals * p0).sum(axis=1), areas * 0.5
+
+def _plane_quadrics(normals, offsets, weights):
+    planes = numpy.concatenate((normals, offsets[:, None]), axis=1)
+    return planes[:, :, None] * planes[:, None, :] * weights[:, None, None]
+
+def _edges(triangles, vertex_count):
+    """Unique undirected edges, how many triangles use each, and whether each is on an open boundary."""
+    directed = triangles[:, ((0, 1), (1, 2), (2, 0))].reshape(-1, 2)
+    low = directed.min(axis=1)
+    high = directed.max(axis=1)
+    codes, counts = numpy.unique(low * vertex_count + high, return_counts=True)
+    edges = numpy.stack((codes // vertex_count, codes % vertex_count), axis=1)
+    return edges, counts, counts == 1
+
+def vertex_quadrics(vertices, triangles):
+    """Area weighted face quadrics summed per vertex, plus boundary constraint quadrics."""
+    normals, offsets, areas = _face_planes(vertices, triangles)
+    quadrics = numpy.zeros((len(vertices), 4, 4))
+    face_quadrics = _plane_quadrics(normals, offsets, areas)
+    for corner in range(3):
+        numpy.add.at(quadrics, triangles[:, corner], face_quadrics)
+
+    directed = triangles[:, ((0, 1), (1, 2), (2, 0))].reshape(-1, 2)
+    face_of = numpy.repeat(numpy.arange(len(triangles)), 3)
+    n = len(vertices)
+    codes = directed[:, 0] * n + directed[:, 1]
+    boundary = ~contains(codes, directed[:, 1] * n + directed[:, 0])
+    if boundary.any():
+        a, b = directed[boundary, 0], directed[boundary, 1]
+        along = vertices[b] - vertices[a]
+        lengths = numpy.sqrt((along * along).sum(axis=1))
+        side = numpy.cross(along, normals[face_of[boundary]])
+        side_lengths = numpy.sqrt((side * side).sum(axis=1))
+        valid = side_lengths > 0.0
+        side[valid] /= side_lengths[valid][:, None]
+        side_offsets = -(side * vertices[a]).sum(axis=1)
+        boundary_quadrics = _plane_quadrics(side, side_offsets, BOUNDARY_WEIGHT * lengths * lengths * valid)
+        numpy.add.at(quadrics, a, boundary_quadrics)
+        numpy.add.at(quadrics, b, boundary_quadrics)
+    return quadrics
+
+def _plane_weights(quadrics):
+    """The summed weight of the planes in each quadric: its trace over the unit normals."""
+    return numpy.maximum(numpy.einsum("nii->n", quadrics[:, :3, :3]), numpy.finfo(numpy.float64).tiny)
+
+def _quadric_error(quadrics, points):
+    homogeneous = numpy.concatenate((points, numpy.ones((len(points), 1))), axis=1)
+    return numpy.maximum((numpy.einsum("ni,nij,nj->n", homogeneous, quadrics, homogeneous)), 0.0)
+
+def _collapse_targets(vertices, quadrics, edges):
+    """Best position and its error for every edge: the quadric minimum if it's well defined, else an endpoint or the midpoint."""
+    a, b = edges[:, 0], edges[:, 1]
+    summed = quadrics[a] + quadrics[b]
+    candidates = [vertices[a], vertices[b], (vertices[a] + vertices[b]) * 0.5]
+
+    system = summed[:, :3, :3]
+    determinant = numpy.linalg.det(system)
+    scale = numpy.abs(system).max(axis=(1, 2)) ** 3
+    solvable = numpy.abs(determinant) > 1e-9 * numpy.maximum(scale, 1e-30)
+    if solvable.any():
+        optimal = candidates[2].copy()
+        optimal[solvable] = numpy.linalg.solve(system[solvable], -summed[solvable, :3, 3][:, :, None])[:, :, 0]
+        # An optimum far away from the edge means the system is nearly singular.
+        length = numpy.sqrt(((vertices[a] - vertices[b]) ** 2).sum(axis=1))
+        distance = numpy.sqrt(((optimal - candidates[2]) ** 2).sum(axis=1))
+        optimal[distance > 2.0 * length] = candidates[2][distance > 2.0 * length]
+        candidates.append(optimal)
+
+    errors = numpy.stack([_quadric_error(summed, x) for x in candidates], axis=1)
+    best = numpy.argmin(errors, axis=1)
+    rows = numpy.arange(len(edges))
+    return numpy.stack(candidates, axis=1)[rows, best], errors[rows, best]
+
+def _incident(vertices_of, vertex_count, items):
+    """For each of items, the (owner index, corner index) pairs of every corner on that vertex."""
+    order = numpy.argsort(vertices_of, kind="mergesort")
+    starts = numpy.searchsorted(vertices_of[order], numpy.arange(vertex_count))
+    ends = numpy.searchsorted(vertices_of[order], numpy.arange(vertex_count), side="right")
+    degree = ends[items] - starts[items]
+    owner = numpy.repeat(numpy.arange(len(items)), degree)
+    local = numpy.arange(len(owner)) - numpy.repeat(numpy.cumsum(degree) - degree, degree)
+    return owner, order[numpy.repeat(starts[items], degree) + local]
+
+def _link_condition(edges, counts, vertex_count):
+    """True for edges whose endpoints share no neighbours besides the triangles on the edge, so collapsing keeps the mesh manifold."""
+    both = numpy.concatenate((edges, edges[:, ::-1]))
+    codes = both[:, 0] * vertex_count + both[:, 1]
+    owner, index = _incident(both[:, 0], vertex_count, edges[:, 0])
+    shared = contains(codes, edges[owner, 1] * vertex_count + both[index, 1])
+    return numpy.bincount(owner[shared], minlength=len(edges)) <= counts
+
+def _flips(vertices, triangles, edges, positions):
+    """True for edges whose collapse would turn over one of the triangles around them."""
+    flipped = numpy.zeros(len(edges), dtype=bool)
+    corners = triangles.ravel()
+    for side in range(2):
+        owner, corner = _incident(corners, len(vertices), edges[:, side])
+        triangle = triangles[corner // 3]
+        # Triangles on the collapsed edge itself disappear.
+        survives = ~(triangle == edges[owner, 1 - side][:, None]).any(axis=1)
+        owner, corner, triangle = owner[survives], corner[survives], triangle[survives]
+        before = vertices[triangle]
+        after = before.copy()
+        after[numpy.arange(len(owner)), corner % 3] = positions[owner]
+        normal_before = numpy.cross(before[:, 1] - before[:, 0], before[:, 2] - before[:, 0])
+        normal_after = numpy.cross(after[:, 1] - after[:, 0], after[:, 2] - after[:, 0])
+        flipped[owner[(normal_before * normal_after).sum(axis=1) <= 0.0]] = True
+    return flipped
+
+def _plane_distances(vertices, triangles, edges, positions):
+    """The furthest each edge's collapse position is from the planes of the triangles around the edge."""
+    normals, offsets, _ = _face_planes(vertices, triangles)
+    distances = numpy.zeros(len(edges))
+    corners = triangles.ravel()
+    for side in range(2):
+        owner, corner = _incident(corners, len(vertices), edges[:, side])
+        face = corner // 3
+        numpy.maximum.at(distances, owner, numpy.abs((normals[face] * positions[owner]).sum(axis=1) + offsets[face]))
+    return distances
+
+def _independent_collapses(edges, rank, triangles, vertex_count):
+    """Greedily pick the cheapest edges so that no two picked edges touch the same triangle."""
+    none = len(edges)
+    available = rank < none
+    picked = numpy.zeros(len(edges), dtype=bool)
+    locked = numpy.zeros(vertex_count, dtype=bool)
+    while available.any():
+        ranks = numpy.where(available, rank, none)
+        lowest = numpy.full(vertex_count, none, dtype=numpy.int64)
+        numpy.minimum.at(lowest, edges[:, 0], ranks)
+        numpy.minimum.at(lowest, edges[:, 1], ranks)
+        # The cheapest edge around each triangle, then around each vertex's triangles.
+        triangle_lowest = lowest[triangles].min(axis=1)
+        region_lowest = numpy.full(vertex_count, none, dtype=numpy.int64)
+        for corner in range(3):
+            numpy.minimum.at(region_lowest, triangles[:, corner], triangle_lowest)
+        chosen = available & (region_lowest[edges[:, 0]] == ranks) & (region_lowest[edges[:, 1]] == ranks)
+        if not chosen.any():
+            break
+        picked |= chosen
+        touched = numpy.zeros(vertex_count, dtype=bool)
+        touched[edges[chosen].ravel()] = True
+        locked[triangles[touched[triangles].any(axis=1)].ravel()] = True
+        available &= ~(locked[edges[:, 0]] | locked[edges[:, 1]])
+    return picked
+
+def decimate(vertices, triangles, max_triangles=0, tolerance=0.0, max_passes=200):
+    """Collapse edges until at most max_triangles remain, or until the next collapse would move
+    the surface by more than tolerance. Either limit can be 0 to disable it.
+
+    Returns (vertices, triangles) with unused vertices removed.
+    """
+    vertices = numpy.asarray(vertices, dtype=numpy.float64).reshape(-1, 3).copy()
+    triangles = numpy.asarray(triangles, dtype=numpy.int64).reshape(-1, 3)
+    if (max_triangles <= 0 and tolerance <= 0.0) or len(triangles) == 0:
+        return compact_vertices(vertices.astype(numpy.float32), triangles)
+    max_distance = tolerance if tolerance > 0.0 else numpy.inf
+
+    n = len(vertices)
+    quadrics = vertex_quadrics(vertices, triangles)
+    # How far each vertex's surface may already have moved from the original; collapses add to it.
+    deviations = numpy.zeros(n)
+    for _ in range(max_passes):
+        if max_triangles > 0 and len(triangles) <= max_triangles:
+            break
+        edges, counts, boundary = _edges(triangles, n)
+        positions, errors = _collapse_targets(vertices, quadrics, edges)
+
+        on_boundary = numpy.zeros(n, dtype=bool)
+        on_boundary[edges[boundary].ravel()] = True
+        deviation = numpy.maximum(deviations[edges[:, 0]], deviations[edges[:, 1]])
+        if tolerance > 0.0:
+            deviation += _plane_distances(vertices, triangles, edges, positions)
+        # The quadrics are area weighted, so dividing by their weight gives a mean squared distance,
+        # which keeps the boundary planes' say at any scale.
+        mean_errors = errors / _plane_weights(quadrics[edges[:, 0]] + quadrics[edges[:, 1]])
+        valid = (deviation <= max_distance) & (mean_errors <= max_distance * max_distance) & (counts <= 2)
+        # Collapsing an interior edge between two boundary vertices would pinch the mesh.
+        valid &= boundary | ~(on_boundary[edges[:, 0]] & on_boundary[edges[:, 1]])
+        valid &= _link_condition(edges, counts, n)
+
+        valid &= ~_flips(vertices, triangles, edges, positions)
+        if not valid.any():
+            break
+
+        rank = numpy.empty(len(edges), dtype=numpy.int64)
+        rank[numpy.lexsort((numpy.arange(len(edges)), errors))] = numpy.arange(len(edges))
+        rank[~valid] = len(edges)
+        picked = _independent_collapses(edges, rank, triangles, n)
+
+        chosen = numpy.nonzero(picked)[0]
+        if len(chosen) == 0:
+            break
+        if max_triangles > 0:
+            # Stop close to the budget, cheapest collapses first.
+            chosen = chosen[numpy.argsort(errors[chosen], kind="mergesort")]
+            removed = numpy.cumsum(counts[chosen])
+            chosen = chosen[:numpy.searchsorted(removed, len(triangles) - max_triangles) + 1]
+
+        keep, drop = edges[chosen, 0], edges[chosen, 1]
+        vertices[keep] = positions[chosen]
+        deviations[keep] = deviation[chosen]
+        quadrics[keep] += quadrics[drop]
+        remap = numpy.arange(n)
+        remap[drop] = keep
+        triangles = remap[triangles]
+        triangles = triangles[(triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2]) & (triangles[:, 2] != triangles[:, 0])]
+
+    return compact_vertices(vertices.astype(numpy.float32), triangles)
@@ -0,0 +1,64 @@
+"""Content hashes of previous exports, used to skip objects whose output is already up to date.
+
+Each export directory gets a JSON sidecar mapping output file names to the hash of the
+geometry and settings they were last successfully exported with.
+"""
+import hashlib
+import json
+import os
+
+import numpy
+
+CACHE_FILENAME = ".dos2de_physics_cache.json"
+CACHE_VERSION = 1
+
+def content_hash(arrays, settings):
+    """Hash numpy buffers together with a JSON-serializable settings dict."""
+    digest = hashlib.sha1()
+    for array in arrays:
+        array = numpy.ascontiguousarray(array)
+        digest.update("{}{}".format(array.dtype.str, array.shape).encode("ascii"))
+        digest.update(array)
+    digest.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+class ExportCache(object):
+    def __init__(self):
+        self.directories = {}
+        self.changed = set()
+
+    def entries(self, directory):
+        if directory not in self.directories:
+            entries = {}
+            cache_path = os.path.join(directory, CACHE_FILENAME)
+            if os.path.isfile(cache_path):
+                try:
+                    with open(cache_path, "r") as f:
+                        data = json.load(f)
+                    if data.get("version") == CACHE_VERSION:
+                        entries = data.get("exports", {})
+                except (OSError, ValueError):
+                    print("[DOS2DE-Physics] Ignoring unreadable export cache '{}'.".format(cache_path))
+            self.directories[directory] = entries
+        return self.directories[directory]
+
+    def is_current(self, export_path, digest, output_path):
+        """True if export_path was last exported with digest and its output still exists."""
+        directory, name = os.path.split(os.path.abspath(export_path))
+        return self.entries(directory).get(name) == digest and os.path.isfile(output_path)
+
+    def update(self, export_path, digest):
+        directory, name = os.path.split(os.path.abspath(export_path))
+        self.entries(directory)[name] = digest
+        self.changed.add(directory)
+
+    def save(self):
+        for directory in self.changed:
+            if not os.path.isdir(directory):
+                continue
+            cache_path = os.path.join(directory, CACHE_FILENAME)
+            temp_path = cache_path + ".tmp"
+            with open(temp_path, "w") as f:
+                json.dump({"version": CACHE_VERSION, "exports": self.directories[directory]}, f, indent=1, sort_keys=True)
+            os.replace(temp_path, cache_path)
+        self.changed.clear()
@@ -0,0 +1,54 @@
+"""Plans an export before any work is done: the file each object is written to, objects that would
+overwrite each other's file, and the directories to create.
+"""
+from collections import OrderedDict, namedtuple
+import json
+import os
+
+PLAN_VERSION = 1
+
+# objects are written to path, skipped objects would have been but aren't.
+PlannedFile = namedtuple("PlannedFile", ("path", "objects", "skipped"))
+
+def plan_files(entries):
+    """Group (object name, path) pairs by the file they write, in order of first use.
+
+    Paths are compared normalized, so different spellings of one file collide.
+    """
+    files = OrderedDict()
+    for name, path in entries:
+        key = os.path.normcase(os.path.abspath(path))
+        if key not in files:
+            files[key] = PlannedFile(path, [], [])
+        files[key].objects.append(name)
+    return list(files.values())
+
+def collisions(files):
+    """The planned files more than one object writes."""
+    return [x for x in files if len(x.objects) + len(x.skipped) > 1]
+
+def keep_last(planned):
+    """Skip all but the last object writing planned's file, since it would overwrite the others."""
+    planned.skipped.extend(planned.objects[:-1])
+    del planned.objects[:-1]
+
+def create_directories(files):
+    """Create each planned file's directory once. Returns the directories that were created."""
+    created = []
+    for directory in OrderedDict.fromkeys(os.path.dirname(os.path.abspath(x.path)) for x in files):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+            created.append(directory)
+    return created
+
+def plan_dict(files, collision_mode):
+    return OrderedDict((
+        ("version", PLAN_VERSION),
+        ("collision_mode", collision_mode),
+        ("files", [OrderedDict((("path", x.path), ("objects", x.objects), ("skipped", x.skipped))) for x in files]),
+        ("collisions", len(collisions(files))),
+    ))
+
+def save_plan(path, files, collision_mode):
+    with open(path, "w") as f:
+        json.dump(plan_dict(files, collision_mode), f, indent=1)
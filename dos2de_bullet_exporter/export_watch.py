@@ -0,0 +1,151 @@
+"""Re-exports objects shortly after they change, reusing the settings of the export that started watching.
+
+Blender 2.79 has no depsgraph update handlers, so changes are picked up in scene_update_post from the
+is_updated flags, and game physics settings (which don't tag objects) are compared on every timer tick.
+A modal timer operator waits until nothing changed for the debounce delay, then runs the exporter on
+just the changed objects.
+"""
+import time
+
+import bpy
+from bpy.types import Operator
+
+watcher = None
+
+def game_signature(obj):
+    game = obj.game
+    material = obj.data.materials[0] if len(obj.data.materials) > 0 else None
+    return (game.physics_type, game.use_collision_bounds, game.collision_bounds_type, game.collision_margin,
+        game.mass, game.damping, game.rotation_damping,
+        (material.physics.friction, material.physics.elasticity) if material is not None else None)
+
+class ExportWatcher(object):
+    """Collects the names of exportable meshes that changed in a scene, and when they last changed."""
+
+    def __init__(self, scene, settings, is_exportable, delay):
+        self.scene_name = scene.name
+        self.settings = settings
+        self.is_exportable = is_exportable
+        self.delay = delay
+        self.dirty = set()
+        self.changed = 0.0
+        self.exporting = False
+        self.signatures = dict((x.name, game_signature(x)) for x in self.objects(scene))
+
+    def objects(self, scene):
+        return [x for x in scene.objects if x.type == "MESH" and self.is_exportable(scene, x)]
+
+    def mark(self, names):
+        if names:
+            self.dirty.update(names)
+            self.changed = time.perf_counter()
+
+    def scene_updated(self, scene):
+        if self.exporting or scene.name != self.scene_name:
+            return
+        self.mark([x.name for x in self.objects(scene) if x.is_updated or x.is_updated_data])
+
+    def poll_settings(self, scene):
+        changed = []
+        for obj in self.objects(scene):
+            signature = game_signature(obj)
+            if self.signatures.get(obj.name) != signature:
+                self.signatures[obj.name] = signature
+                changed.append(obj.name)
+        self.mark(changed)
+
+    def take_due(self):
+        """Return the changed object names once nothing changed for the delay, and forget them."""
+        if not self.dirty or time.perf_counter() - self.changed < self.delay:
+            return None
+        names = sorted(self.dirty)
+        self.dirty.clear()
+        return names
+
+def scene_update_post(scene):
+    if watcher is not None:
+        watcher.scene_updated(scene)
+
+def start(context, settings, is_exportable, delay):
+    """Start watching context.scene, exporting changed objects with settings (operator keyword arguments)."""
+    global watcher
+    stop()
+    watcher = ExportWatcher(context.scene, settings, is_exportable, delay)
+    bpy.app.handlers.scene_update_post.append(scene_update_post)
+    bpy.ops.export_scene.dos2de_physics_watch("INVOKE_DEFAULT")
+    print("[DOS2DE-Physics] Watching '{}' for changes.".format(context.scene.name))
+
+def stop():
+    global watcher
+    if scene_update_post in bpy.app.handlers.scene_update_post:
+        bpy.app.handlers.scene_update_post.remove(scene_update_post)
+    if watcher is not None:
+        print("[DOS2DE-Physics] Stopped watching '{}'.".format(watcher.scene_name))
+    watcher = None
+
+def is_watching():
+    return watcher is not None
+
+class LEADER_OT_physics_export_watch(Operator):
+    """Re-export changed objects while watch mode is on"""
+    bl_idname = "export_scene.dos2de_physics_watch"
+    bl_label = "Watch Divinity Physics"
+    bl_options = {"INTERNAL"}
+
+    timer_interval = 0.1
+
+    def invoke(self, context, event):
+        self.watcher = watcher
+        self.timer = context.window_manager.event_timer_add(self.timer_interval, context.window)
+        context.window_manager.modal_handler_add(self)
+        return {"RUNNING_MODAL"}
+
+    def finish(self, context):
+        context.window_manager.event_timer_remove(self.timer)
+        return {"CANCELLED"}
+
+    def modal(self, context, event):
+        # A new watch or a stop replaces the module's watcher, which ends this one.
+        if watcher is not self.watcher:
+            return self.finish(context)
+        if event.type != "TIMER":
+            return {"PASS_THROUGH"}
+
+        scene = bpy.data.scenes.get(self.watcher.scene_name)
+        if scene is None:
+            stop()
+            return self.finish(context)
+        self.watcher.poll_settings(scene)
+        names = self.watcher.take_due()
+        if names is not None:
+            self.export(names)
+        return {"PASS_THROUGH"}
+
+    def export(self, names):
+        settings = dict(self.watcher.settings)
+        # Combined and merged meshes share files, so all of them are exported again.
+        if not settings.get("export_combine_visible") and settings.get("path_collisions") != "MERGE":
+            settings["watch_object_names"] = "\n".join(names)
+        print("[DOS2DE-Physics] Re-exporting {} changed object(s): {}".format(len(names), ", ".join(names)))
+        self.watcher.exporting = True
+        try:
+            bpy.ops.export_scene.dos2de_physics("EXEC_DEFAULT", **settings)
+        except Exception as e:
+            print("[DOS2DE-Physics] Watch export failed: {}".format(e))
+        finally:
+            # Anything the export itself tagged isn't a change to export again.
+            self.watcher.dirty.clear()
+            self.watcher.exporting = False
+
+class LEADER_OT_physics_export_watch_stop(Operator):
+    """Stop re-exporting changed objects"""
+    bl_idname = "export_scene.dos2de_physics_watch_stop"
+    bl_label = "Stop Watching Divinity Physics"
+
+    @classmethod
+    def poll(cls, context):
+        return is_watching()
+
+    def execute(self, context):
+        stop()
+        return {"FINISHED"}
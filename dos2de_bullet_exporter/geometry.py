@@ -0,0 +1,245 @@
+"""Array-based mesh helpers used by the native .bullet writer."""
+from collections import namedtuple
+
+import numpy
+
+CleanupStats = namedtuple("CleanupStats", ("welded_vertices", "degenerate_triangles", "duplicate_triangles"))
+
+# Cell offsets that, with the cell itself, cover every neighbouring cell pair once.
+HALF_NEIGHBOURS = [(x, y, z) for x in (-1, 0, 1) for y in (-1, 0, 1) for z in (-1, 0, 1) if (x, y, z) > (0, 0, 0)]
+
+def tessfaces_to_triangles(faces):
+    """Split (N, 4) tessface vertex indices into triangles the way the game engine does.
+
+    Triangles have a 0 fourth index, quads are split into (0, 1, 2) and (0, 2, 3).
+    """
+    faces = numpy.asarray(faces, dtype=numpy.int32).reshape(-1, 4)
+    triangles = numpy.empty((len(faces), 2, 3), dtype=numpy.int32)
+    triangles[:, 0] = faces[:, (0, 1, 2)]
+    triangles[:, 1] = faces[:, (0, 2, 3)]
+    keep = numpy.ones((len(faces), 2), dtype=bool)
+    keep[:, 1] = faces[:, 3] != 0
+    return triangles[keep]
+
+def compact_vertices(vertices, triangles):
+    """Drop vertices no triangle uses, numbering the rest in order of first use."""
+    vertices = numpy.asarray(vertices).reshape(-1, 3)
+    triangles = numpy.asarray(triangles, dtype=numpy.int32).reshape(-1, 3)
+    used, first = numpy.unique(triangles.ravel(), return_index=True)
+    order = used[numpy.argsort(first, kind="mergesort")]
+    remap = numpy.full(len(vertices), -1, dtype=numpy.int32)
+    remap[order] = numpy.arange(len(order), dtype=numpy.int32)
+    return vertices[order], remap[triangles]
+
+def transform_points(points, matrix):
+    """Apply a 4x4 affine matrix to an (N, 3) point array."""
+    points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 3)
+    matrix = numpy.asarray(matrix, dtype=numpy.float64)
+    return numpy.dot(points, matrix[:3, :3].T) + matrix[:3, 3]
+
+def is_mirrored(matrix):
+    """True if matrix turns shapes inside out, so their triangles only face outward with the winding reversed."""
+    return numpy.linalg.det(numpy.asarray(matrix, dtype=numpy.float64)[:3, :3]) < 0.0
+
+def split_rigid_transform(matrix):
+    """Split a 4x4 affine matrix into (rotation, translation, linear) with matrix = [rotation | translation] * linear.
+
+    Scale and shear end up in linear. Mirrored matrices are mirrored on local X first, so the same mirror
+    and scale always give the same linear part whatever the rotation.
+    """
+    matrix = numpy.asarray(matrix, dtype=numpy.float64)
+    basis = matrix[:3, :3].copy()
+    mirrored = is_mirrored(basis)
+    if mirrored:
+        basis[:, 0] = -basis[:, 0]
+    u, s, vt = numpy.linalg.svd(basis)
+    rotation = numpy.dot(u, vt)
+    linear = numpy.dot(rotation.T, basis)
+    if mirrored:
+        linear[:, 0] = -linear[:, 0]
+    return rotation, matrix[:3, 3].copy(), linear
+
+def reversed_loop_order(loop_starts, loop_totals):
+    """Return (vertex_order, edge_order) index arrays that reverse the winding of every polygon.
+
+    Indexing the loop vertex_index and edge_index buffers with them keeps each polygon's first vertex.
+    """
+    loop_starts = numpy.asarray(loop_starts, dtype=numpy.int64)
+    loop_totals = numpy.asarray(loop_totals, dtype=numpy.int64)
+    starts = numpy.repeat(loop_starts, loop_totals)
+    totals = numpy.repeat(loop_totals, loop_totals)
+    local = numpy.arange(len(starts)) - numpy.repeat(numpy.cumsum(loop_totals) - loop_totals, loop_totals)
+    target = starts + local
+    vertex_order = numpy.empty(len(starts), dtype=numpy.int64)
+    edge_order = numpy.empty(len(starts), dtype=numpy.int64)
+    vertex_order[target] = starts + (totals - local) % totals
+    edge_order[target] = starts + (totals - local - 1) % totals
+    return vertex_order, edge_order
+
+def concatenate_meshes(meshes):
+    """Join (vertices, triangles) pairs into one pair, offsetting each mesh's indices."""
+    vertices = []
+    triangles = []
+    offset = 0
+    for mesh_vertices, mesh_triangles in meshes:
+        vertices.append(numpy.asarray(mesh_vertices).reshape(-1, 3))
+        triangles.append(numpy.asarray(mesh_triangles, dtype=numpy.int32).reshape(-1, 3) + offset)
+        offset += len(vertices[-1])
+    return numpy.concatenate(vertices), numpy.concatenate(triangles)
+
+def morton_order(points):
+    """Order that sorts points along a Z-order curve over their bounding box, 10 bits per axis."""
+    points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 3)
+    if len(points) == 0:
+        return numpy.zeros(0, dtype=numpy.int64)
+    lower = points.min(axis=0)
+    size = max((points.max(axis=0) - lower).max(), 1e-12)
+    cells = numpy.minimum((points - lower) * (1023.0 / size), 1023).astype(numpy.int64)
+    # Spread each axis' bits out so they can be interleaved.
+    for shift, mask in ((16, 0x30000ff), (8, 0x300f00f), (4, 0x30c30c3), (2, 0x9249249)):
+        cells = (cells | (cells << shift)) & mask
+    return numpy.argsort((cells[:, 0] << 2) | (cells[:, 1] << 1) | cells[:, 2], kind="mergesort")
+
+def split_mesh_parts(vertices, triangles, max_vertices):
+    """Split a mesh into (vertices, triangles) parts using at most max_vertices vertices each.
+
+    Triangles are taken in Z-order so neighbours end up in the same part, and each part is grown as
+    far as it fits. Meshes that already fit are returned as the only part, unchanged.
+    """
+    vertices = numpy.asarray(vertices).reshape(-1, 3)
+    triangles = numpy.asarray(triangles, dtype=numpy.int32).reshape(-1, 3)
+    if len(vertices) <= max_vertices:
+        return [(vertices, triangles)]
+    centers = vertices[triangles].mean(axis=1)
+    triangles = triangles[morton_order(centers)]
+
+    parts = []
+    start = 0
+    while start < len(triangles):
+        # max_vertices // 3 triangles always fit. Closed meshes have about two triangles per vertex, so
+        # more than four per vertex isn't tried.
+        low = min(start + max(max_vertices // 3, 1), len(triangles))
+        high = min(start + 4 * max_vertices, len(triangles))
+        while low < high:
+            middle = (low + high + 1) // 2
+            if len(numpy.unique(triangles[start:middle])) <= max_vertices:
+                low = middle
+            else:
+                high = middle - 1
+        parts.append(compact_vertices(vertices, triangles[start:low]))
+        start = low
+    return parts
+
+def contains(values, candidates):
+    """Membership test of candidates in values (numpy.in1d, which newer numpy versions removed)."""
+    values = numpy.sort(values)
+    if len(values) == 0:
+        return numpy.zeros(len(candidates), dtype=bool)
+    positions = numpy.searchsorted(values, candidates)
+    positions[positions == len(values)] = 0
+    return values[positions] == candidates
+
+def mesh_volume(vertices, triangles):
+    """Volume enclosed by a closed, consistently wound triangle mesh."""
+    vertices = numpy.asarray(vertices, dtype=numpy.float64).reshape(-1, 3)
+    triangles = numpy.asarray(triangles).reshape(-1, 3)
+    p0, p1, p2 = vertices[triangles[:, 0]], vertices[triangles[:, 1]], vertices[triangles[:, 2]]
+    return abs((p0 * numpy.cross(p1, p2)).sum()) / 6.0
+
+def is_closed(triangles):
+    """True if every edge of the mesh is shared with a triangle wound the other way."""
+    triangles = numpy.asarray(triangles, dtype=numpy.int64).reshape(-1, 3)
+    edges = triangles[:, ((0, 1), (1, 2), (2, 0))].reshape(-1, 2)
+    count = triangles.max() + 1 if len(triangles) else 0
+    return bool(contains(edges[:, 0] * count + edges[:, 1], edges[:, 1] * count + edges[:, 0]).all())
+
+def _row_groups(points):
+    """Group identical rows. Returns (first, inverse): the first row of each group and each row's group."""
+    order = numpy.lexsort(points.T[::-1])
+    starts = numpy.ones(len(points), dtype=bool)
+    starts[1:] = (points[order[1:]] != points[order[:-1]]).any(axis=1)
+    inverse = numpy.empty(len(points), dtype=numpy.int64)
+    inverse[order] = numpy.cumsum(starts) - 1
+    return order[starts], inverse
+
+def _close_pairs(points, tolerance):
+    """Index pairs of points at most tolerance apart, found through a spatial hash."""
+    lower = points.min(axis=0)
+    # Cells are never smaller than the tolerance, so close points are always in neighbouring cells.
+    cell_size = max(tolerance, (points.max(axis=0) - lower).max() / 2 ** 20)
+    cells = numpy.floor((points - lower) / cell_size).astype(numpy.int64)
+    dims = cells.max(axis=0) + 2
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    order = numpy.argsort(keys, kind="mergesort")
+    sorted_keys = keys[order]
+
+    pairs = []
+    for offset in [(0, 0, 0)] + HALF_NEIGHBOURS:
+        neighbours = keys + (offset[0] * dims[1] + offset[1]) * dims[2] + offset[2]
+        start = numpy.searchsorted(sorted_keys, neighbours, "left")
+        counts = numpy.searchsorted(sorted_keys, neighbours, "right") - start
+        first = numpy.repeat(numpy.arange(len(points)), counts)
+        second = order[numpy.repeat(start, counts) + numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)]
+        keep = ((points[first] - points[second]) ** 2).sum(axis=1) <= tolerance * tolerance
+        if offset == (0, 0, 0):
+            keep &= first < second
+        pairs.append((first[keep], second[keep]))
+    return numpy.concatenate([x[0] for x in pairs]), numpy.concatenate([x[1] for x in pairs])
+
+def weld_vertices(vertices, tolerance=0.0):
+    """Map each vertex to the vertex it's welded to.
+
+    Coincident vertices are always welded, and vertices at most tolerance apart when it's positive.
+    Welds chain, so a row of close vertices becomes one.
+    """
+    vertices = numpy.asarray(vertices, dtype=numpy.float64).reshape(-1, 3)
+    if len(vertices) == 0:
+        return numpy.zeros(0, dtype=numpy.int64)
+    first, inverse = _row_groups(vertices)
+    if tolerance <= 0.0 or len(first) < 2:
+        return first[inverse]
+
+    points = vertices[first]
+    a, b = _close_pairs(points, tolerance)
+    labels = numpy.arange(len(points))
+    while True:
+        joined = numpy.minimum(labels[a], labels[b])
+        merged = labels.copy()
+        numpy.minimum.at(merged, a, joined)
+        numpy.minimum.at(merged, b, joined)
+        merged = merged[merged]
+        if (merged == labels).all():
+            break
+        labels = merged
+    return first[labels][inverse]
+
+def clean_mesh(vertices, triangles, tolerance=0.0):
+    """Weld vertices, drop degenerate and duplicate triangles and compact the vertex buffer.
+
+    Triangles thinner than tolerance count as degenerate, as do triangles using a vertex twice.
+    Returns (vertices, triangles, CleanupStats).
+    """
+    vertices = numpy.asarray(vertices).reshape(-1, 3)
+    triangles = numpy.asarray(triangles, dtype=numpy.int32).reshape(-1, 3)
+    remap = weld_vertices(vertices, tolerance)
+    welded = len(vertices) - len(numpy.unique(remap))
+    triangles = remap[triangles].astype(numpy.int32)
+
+    points = vertices.astype(numpy.float64)
+    p0, p1, p2 = points[triangles[:, 0]], points[triangles[:, 1]], points[triangles[:, 2]]
+    doubled_area = numpy.sqrt((numpy.cross(p1 - p0, p2 - p0) ** 2).sum(axis=1))
+    longest = numpy.sqrt(numpy.max([((p1 - p0) ** 2).sum(axis=1), ((p2 - p1) ** 2).sum(axis=1), ((p0 - p2) ** 2).sum(axis=1)], axis=0))
+    degenerate = ((triangles[:, 0] == triangles[:, 1]) | (triangles[:, 1] == triangles[:, 2]) | (triangles[:, 2] == triangles[:, 0])
+        | (doubled_area <= tolerance * longest))
+    triangles = triangles[~degenerate]
+
+    # Triangles over the same vertices are duplicates, whichever way they're wound.
+    duplicate = numpy.zeros(len(triangles), dtype=bool)
+    if len(triangles) > 1:
+        corners = numpy.sort(triangles, axis=1)
+        order = numpy.lexsort(corners.T[::-1])
+        duplicate[order[1:]] = (corners[order[1:]] == corners[order[:-1]]).all(axis=1)
+    triangles = triangles[~duplicate]
+
+    vertices, triangles = compact_vertices(vertices, triangles)
+    return vertices, triangles, CleanupStats(welded, int(degenerate.sum()), int(duplicate.sum()))
@@ -0,0 +1,55 @@
+"""Per-stage timings and counters for one export, reported as a summary line and a JSON trace."""
+from collections import OrderedDict
+from contextlib import contextmanager
+import json
+import time
+
+TRACE_VERSION = 1
+
+class ExportTrace(object):
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = OrderedDict()
+        self.counters = OrderedDict()
+        self.exports = []
+
+    @contextmanager
+    def stage(self, name):
+        """Time a block. Repeated stages accumulate; nested stages are also counted in their parent."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds, calls = self.stages.get(name, (0.0, 0))
+            self.stages[name] = (seconds + time.perf_counter() - started, calls + 1)
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def maximum(self, name, value):
+        """Keep the largest value reported for a counter."""
+        self.counters[name] = max(self.counters.get(name, value), value)
+
+    def record_export(self, object_name, path, seconds, size):
+        self.exports.append({"object": object_name, "path": path, "seconds": seconds, "bytes": size})
+
+    def total_seconds(self):
+        return time.perf_counter() - self.started
+
+    def summary(self):
+        stages = ", ".join("{} {:.2f}s".format(name, seconds) for name, (seconds, _) in self.stages.items())
+        counters = ", ".join("{} {}".format(name.replace("_", " "), value) for name, value in self.counters.items())
+        return "Exported in {:.2f}s ({}). {}.".format(self.total_seconds(), stages, counters)
+
+    def as_dict(self):
+        return {
+            "version": TRACE_VERSION,
+            "total_seconds": self.total_seconds(),
+            "stages": [{"name": name, "seconds": seconds, "calls": calls} for name, (seconds, calls) in self.stages.items()],
+            "counters": self.counters,
+            "exports": self.exports,
+        }
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.as_dict(), f, indent=1)
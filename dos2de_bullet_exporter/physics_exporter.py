@@ -1,15 +1,20 @@
+from collections import OrderedDict, namedtuple
+import json
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 import os.path
-import subprocess
+import time
+
+import numpy
 
-from math import radians
 from mathutils import Euler, Matrix
 
 import bpy
-from bpy.props import StringProperty, BoolProperty, EnumProperty, FloatProperty
-from bpy.types import Operator
+from bpy.props import StringProperty, BoolProperty, EnumProperty, FloatProperty, IntProperty
+from bpy.types import Operator, Panel, PropertyGroup
 from bpy_extras.io_utils import ExportHelper
-import bmesh
+
+from . import bin_converter, bullet_writer, export_cache, export_plan, export_watch, geometry, instrumentation, pipeline
 
 def error_missing_layer_names(self, context):
     self.layout.label("Layer Names are not enabled. Please enable the Layer Management or Leader Helpers addon for layer names.")
@@ -23,6 +28,216 @@ def enum_members_from_type(rna_type, prop_str):
 
 physics_type_items = enum_members_from_type(bpy.types.GameObjectSettings, "physics_type")
 collision_bounds_type_items = enum_members_from_type(bpy.types.GameObjectSettings, "collision_bounds_type")
+# Blender's values have gaps (CAPSULE is 7, 6 is unused), so exporter-only bounds go after the largest one.
+collision_bounds_type_items.append(("CONVEX_DECOMPOSITION", "Convex Decomposition",
+    "Split concave meshes into several convex hulls (exporter only)", "NONE", max(x[4] for x in collision_bounds_type_items) + 1))
+collision_bounds_type_items.append(("AUTO_PRIMITIVE", "Auto Primitive",
+    "Use the cheapest box, sphere, capsule or cylinder that fits the mesh closely enough (exporter only)", "NONE",
+    max(x[4] for x in collision_bounds_type_items) + 1))
+
+# An object placed with a shared shape: rotation and origin place the shape, linear was baked into it.
+Instance = namedtuple("Instance", ("obj", "physics", "rotation", "origin", "linear"))
+
+# Bounds only the native writer supports, and what the game engine gets instead.
+exporter_bounds_fallback = {
+    "CONVEX_DECOMPOSITION": "TRIANGLE_MESH",
+    "AUTO_PRIMITIVE": "CONVEX_HULL",
+}
+
+def read_mesh(mesh):
+    """Read a mesh's vertex positions and tessface indices into flat arrays."""
+    mesh.calc_tessface()
+    vertices = numpy.empty(len(mesh.vertices) * 3, dtype=numpy.float32)
+    mesh.vertices.foreach_get("co", vertices)
+    faces = numpy.empty(len(mesh.tessfaces) * 4, dtype=numpy.int32)
+    mesh.tessfaces.foreach_get("vertices_raw", faces)
+    return vertices, faces
+
+def evaluated_mesh_arrays(scene, obj, matrix):
+    """Read obj's evaluated geometry into transformed arrays without linking a copy into the scene."""
+    mesh = obj.to_mesh(scene, True, "PREVIEW")
+    try:
+        vertices, faces = read_mesh(mesh)
+    finally:
+        bpy.data.meshes.remove(mesh)
+    return pipeline.transform_arrays(vertices, geometry.tessfaces_to_triangles(faces), numpy.array(matrix))
+
+def mesh_arrays(obj):
+    """Return world space vertex positions and tessellated triangle indices for a mesh object, with its modifiers applied."""
+    # Like the game engine, copies are evaluated in the scratch scene they're linked to.
+    return evaluated_mesh_arrays(obj.users_scene[0], obj, obj.matrix_world)
+
+def transform_mesh(mesh, matrix):
+    """Bake matrix into the mesh's vertex buffer, reversing the winding of every polygon if matrix mirrors them."""
+    co = numpy.empty(len(mesh.vertices) * 3, dtype=numpy.float32)
+    mesh.vertices.foreach_get("co", co)
+    co = geometry.transform_points(co, numpy.array(matrix))
+    mesh.vertices.foreach_set("co", co.astype(numpy.float32).ravel())
+
+    if geometry.is_mirrored(numpy.array(matrix)):
+        loop_starts = numpy.empty(len(mesh.polygons), dtype=numpy.int32)
+        loop_totals = numpy.empty(len(mesh.polygons), dtype=numpy.int32)
+        mesh.polygons.foreach_get("loop_start", loop_starts)
+        mesh.polygons.foreach_get("loop_total", loop_totals)
+        vertex_index = numpy.empty(len(mesh.loops), dtype=numpy.int32)
+        edge_index = numpy.empty(len(mesh.loops), dtype=numpy.int32)
+        mesh.loops.foreach_get("vertex_index", vertex_index)
+        mesh.loops.foreach_get("edge_index", edge_index)
+        vertex_order, edge_order = geometry.reversed_loop_order(loop_starts, loop_totals)
+        mesh.loops.foreach_set("vertex_index", vertex_index[vertex_order])
+        mesh.loops.foreach_set("edge_index", edge_index[edge_order])
+
+    mesh.update()
+
+def join_meshes(name, meshes):
+    """Merge meshes that are already in the same space into a new mesh, keeping each face's material."""
+    materials = []
+    parts = []
+    for mesh in meshes:
+        co = numpy.empty(len(mesh.vertices) * 3, dtype=numpy.float32)
+        mesh.vertices.foreach_get("co", co)
+        loop_vertices = numpy.empty(len(mesh.loops), dtype=numpy.int32)
+        mesh.loops.foreach_get("vertex_index", loop_vertices)
+        loop_totals = numpy.empty(len(mesh.polygons), dtype=numpy.int32)
+        mesh.polygons.foreach_get("loop_total", loop_totals)
+        material_indices = numpy.empty(len(mesh.polygons), dtype=numpy.int32)
+        mesh.polygons.foreach_get("material_index", material_indices)
+
+        slots = []
+        for material in (mesh.materials if len(mesh.materials) > 0 else [None]):
+            if material not in materials:
+                materials.append(material)
+            slots.append(materials.index(material))
+        material_indices = numpy.array(slots, dtype=numpy.int32)[numpy.minimum(material_indices, len(slots) - 1)]
+        parts.append((co, loop_vertices, loop_totals, material_indices))
+
+    offsets = numpy.cumsum([0] + [len(x[0]) // 3 for x in parts[:-1]])
+    co = numpy.concatenate([x[0] for x in parts])
+    loop_vertices = numpy.concatenate([x[1] + offset for x, offset in zip(parts, offsets)]).astype(numpy.int32)
+    loop_totals = numpy.concatenate([x[2] for x in parts])
+
+    joined = bpy.data.meshes.new(name)
+    for material in materials:
+        joined.materials.append(material)
+    joined.vertices.add(len(co) // 3)
+    joined.loops.add(len(loop_vertices))
+    joined.polygons.add(len(loop_totals))
+    joined.vertices.foreach_set("co", co)
+    joined.loops.foreach_set("vertex_index", loop_vertices)
+    joined.polygons.foreach_set("loop_start", (numpy.cumsum(loop_totals) - loop_totals).astype(numpy.int32))
+    joined.polygons.foreach_set("loop_total", loop_totals)
+    joined.polygons.foreach_set("material_index", numpy.concatenate([x[3] for x in parts]))
+    joined.update(calc_edges=True)
+    return joined
+
+datablock_collections = {
+    "Object": "objects",
+    "Mesh": "meshes",
+    "Armature": "armatures",
+    "Material": "materials",
+}
+
+@contextmanager
+def scratch_scene(name):
+    """Yield a temporary scene and a list for datablocks made for it, all removed again afterwards."""
+    scene = bpy.data.scenes.new(name)
+    datablocks = []
+    try:
+        yield scene, datablocks
+    finally:
+        # Objects first, so the data they used has no users left.
+        for datablock in sorted(datablocks, key=lambda x: x.bl_rna.identifier != "Object"):
+            getattr(bpy.data, datablock_collections[datablock.bl_rna.identifier]).remove(datablock, do_unlink=True)
+        bpy.data.scenes.remove(scene, do_unlink=True)
+
+def link_copies(scene, objects, datablocks):
+    """Link a copy of each object into scene, giving meshes their own data, and return the copies.
+
+    Parents and armature modifiers are pointed at the copies, as duplicating would.
+    """
+    copies = OrderedDict()
+    for obj in objects:
+        copy = obj.copy()
+        datablocks.append(copy)
+        if obj.type == "MESH":
+            copy.data = obj.data.copy()
+            datablocks.append(copy.data)
+        scene.objects.link(copy)
+        copies[obj.name] = copy
+
+    for copy in copies.values():
+        if copy.parent is not None:
+            copy.parent = copies.get(copy.parent.name)
+        for modifier in copy.modifiers:
+            if modifier.type == "ARMATURE" and modifier.object is not None and modifier.object.name in copies:
+                modifier.object = copies[modifier.object.name]
+    return list(copies.values())
+
+def object_is_exportable(scene, obj, object_types):
+    if "VISIBLE" in object_types and obj.hide or obj.hide_select:
+        return False
+    if "SELECTED" in object_types and obj.select == False:
+        return False
+    if "LAYERS" in object_types:
+        for i in range(20):
+            if scene.layers[i] and not obj.layers[i]:
+                return False
+    return True
+
+def preference_defaults(addon_prefs):
+    """Operator settings taken from the addon preferences, as keyword arguments."""
+    if addon_prefs is None:
+        return {}
+    return {
+        "binconversion_enabled": os.path.isfile(addon_prefs.binutil_path),
+        "binutil_path": addon_prefs.binutil_path,
+        "export_combine_visible": addon_prefs.export_combine_visible,
+        "physics_type": addon_prefs.default_physics_type,
+        "collision_bounds_type": addon_prefs.default_collision_bounds_type,
+        "hull_max_vertices": addon_prefs.default_hull_max_vertices,
+        "hull_shrink_wrap": addon_prefs.default_hull_shrink_wrap,
+    }
+
+class DivinityPhysicsObjectSettings(PropertyGroup):
+    use_decimate_override = BoolProperty(
+        name="Override Decimation",
+        description="Use this object's own triangle budget and tolerance instead of the export settings",
+        default=False
+    )
+
+    decimate_max_triangles = IntProperty(
+        name="Max Triangles",
+        description="Decimate triangle mesh bounds to at most this many triangles (0 for no limit)",
+        default=0,
+        min=0
+    )
+
+    decimate_tolerance = FloatProperty(
+        name="Tolerance",
+        description="Only collapse edges that move the surface by less than this distance (0 for no limit)",
+        default=0.0,
+        min=0.0,
+        precision=4
+    )
+
+class DIVINITY_PT_physics_object_settings(Panel):
+    bl_label = "Divinity Physics Export"
+    bl_space_type = "PROPERTIES"
+    bl_region_type = "WINDOW"
+    bl_context = "physics"
+
+    @classmethod
+    def poll(cls, context):
+        return context.object is not None and context.object.type == "MESH"
+
+    def draw(self, context):
+        settings = context.object.dos2de_physics
+        layout = self.layout
+        layout.prop(settings, "use_decimate_override")
+        col = layout.column()
+        col.active = settings.use_decimate_override
+        col.prop(settings, "decimate_max_triangles")
+        col.prop(settings, "decimate_tolerance")
 
 class LEADER_OT_physics_exporter(bpy.types.Operator, ExportHelper):
     """Export physics data with Divinity-specific options (.bullet, .bin)"""
@@ -154,25 +369,8 @@ class LEADER_OT_physics_exporter(bpy.types.Operator, ExportHelper):
     )
 
     def update_preset(self, context):
-        if self.preset == "WEAPON_RIGID":
-            self.xflip = False
-            self.use_rotation_x_amount = 90
-            self.use_rotation_axis_x = True
-            self.use_rotation_axis_y = False
-            self.use_rotation_axis_z = False
-        elif self.preset == "WEAPON_RIGGED":
-            self.xflip = False
-            self.use_rotation_x_amount = 90
-            self.use_rotation_z_amount = 180
-            self.use_rotation_axis_x = True
-            self.use_rotation_axis_y = False
-            self.use_rotation_axis_z = True
-        elif self.preset == "DEFAULT":
-            self.xflip = True
-            self.use_rotation_x_amount = -90
-            self.use_rotation_axis_x = True
-            self.use_rotation_axis_y = False
-            self.use_rotation_axis_z = False
+        for name, value in pipeline.PRESETS.get(self.preset, {}).items():
+            setattr(self, name, value)
 
     preset = EnumProperty(
         name="Preset",
@@ -214,6 +412,87 @@ class LEADER_OT_physics_exporter(bpy.types.Operator, ExportHelper):
         options={'HIDDEN'}
     )
 
+    export_method = EnumProperty(
+        name="Export Method",
+        description="How .bullet files are written",
+        items=(
+            ("NATIVE", "Native", "Write .bullet files directly, without starting the game engine"),
+            ("GAME_ENGINE", "Game Engine", "Start the game engine and let Bullet export the physics world")
+        ),
+        default="GAME_ENGINE"
+    )
+
+    use_evaluated_mesh = BoolProperty(
+        name="Export Without Copies",
+        description="Read evaluated mesh data directly instead of copying objects into a scratch scene (Native method only)",
+        default=False
+    )
+
+    use_export_cache = BoolProperty(
+        name="Skip Unchanged",
+        description="Skip objects whose geometry and export settings match their last successful export",
+        default=False
+    )
+
+    use_export_trace = BoolProperty(
+        name="Write Timing Trace",
+        description="Write per-stage timings and counters to a .trace.json file next to the export",
+        default=False
+    )
+
+    use_instancing = BoolProperty(
+        name="Share Instanced Shapes",
+        description="Build one collision shape for objects sharing a mesh and place it with each object's transform, "
+            "writing a .instances.json manifest next to the export (Native method only)",
+        default=False
+    )
+
+    path_collisions = EnumProperty(
+        name="Shared Files",
+        description="What to do when several objects would be exported to the same file",
+        items=(
+            ("LAST", "Export Last Only", "Warn and export only the last object, since it would overwrite the others"),
+            ("MERGE", "Merge", "Write all the objects into the file together"),
+        ),
+        default="LAST"
+    )
+
+    use_dry_run = BoolProperty(
+        name="Dry Run",
+        description="Only plan the export: list the files each object would be written to and save the plan as JSON, without exporting anything",
+        default=False
+    )
+
+    use_background_export = BoolProperty(
+        name="Run in Background",
+        description="Export one object at a time without blocking the editor, showing progress. Press Esc to cancel",
+        default=False
+    )
+
+    use_watch_mode = BoolProperty(
+        name="Watch for Changes",
+        description="After exporting, keep re-exporting objects with these settings whenever their geometry, transform or game physics change",
+        default=False
+    )
+
+    watch_delay = FloatProperty(
+        name="Watch Delay",
+        description="Seconds to wait after the last change before re-exporting",
+        default=0.5,
+        min=0.0
+    )
+
+    watch_object_names = StringProperty(
+        default="",
+        options={"HIDDEN"}
+    )
+
+    use_single_game_session = BoolProperty(
+        name="Single Game Session",
+        description="Export every object in one game engine session instead of starting the engine once per object",
+        default=True
+    )
+
     object_types = EnumProperty(
         name="Export Objects",
         options={"ENUM_FLAG"},
@@ -245,6 +524,111 @@ class LEADER_OT_physics_exporter(bpy.types.Operator, ExportHelper):
         default=("CONVEX_HULL")
     )
 
+    hull_max_vertices = IntProperty(
+        name="Max Hull Vertices",
+        description="Reduce convex hulls to at most this many vertices, keeping the most significant ones (0 for no limit)",
+        default=64,
+        min=0
+    )
+
+    hull_shrink_wrap = BoolProperty(
+        name="Shrink-Wrap Hull",
+        description="Shrink convex hulls by the collision margin, so the margin doesn't inflate the collision shape",
+        default=False
+    )
+
+    decomposition_max_parts = IntProperty(
+        name="Max Convex Parts",
+        description="Split convex decompositions into at most this many hulls",
+        default=8,
+        min=1,
+        max=64
+    )
+
+    decomposition_max_concavity = FloatProperty(
+        name="Max Concavity",
+        description="Stop splitting parts once the volume their hulls add is below this fraction of the mesh volume",
+        default=0.02,
+        min=0.0,
+        max=1.0
+    )
+
+    decomposition_resolution = IntProperty(
+        name="Voxel Resolution",
+        description="Approximate number of voxels used to measure concavity",
+        default=50000,
+        min=1000,
+        max=1000000
+    )
+
+    auto_primitive_tolerance = FloatProperty(
+        name="Primitive Tolerance",
+        description="Largest fraction of extra volume a fitted primitive may add over the mesh",
+        default=0.15,
+        min=0.0,
+        subtype="FACTOR"
+    )
+
+    auto_primitive_fallback = EnumProperty(
+        name="Fallback Bounds",
+        description="Bounds to use when no primitive fits within the tolerance",
+        items=(
+            ("CONVEX_HULL", "Convex Hull", ""),
+            ("TRIANGLE_MESH", "Triangle Mesh", ""),
+            ("CONVEX_DECOMPOSITION", "Convex Decomposition", "")
+        ),
+        default=("CONVEX_HULL")
+    )
+
+    use_mesh_cleanup = BoolProperty(
+        name="Clean Up Meshes",
+        description="Weld close vertices and remove degenerate and duplicate triangles before building shapes (Native method only)",
+        default=True
+    )
+
+    weld_distance = FloatProperty(
+        name="Weld Distance",
+        description="Weld vertices closer than this and drop triangles thinner than it",
+        default=0.0001,
+        min=0.0,
+        precision=5
+    )
+
+    decimate_max_triangles = IntProperty(
+        name="Max Triangles",
+        description="Decimate triangle mesh bounds to at most this many triangles (0 for no limit)",
+        default=0,
+        min=0
+    )
+
+    decimate_tolerance = FloatProperty(
+        name="Decimation Tolerance",
+        description="Only collapse edges that move the surface by less than this distance (0 for no limit)",
+        default=0.0,
+        min=0.0,
+        precision=4
+    )
+
+    use_triangle_mesh_bvh = BoolProperty(
+        name="Embed BVH",
+        description="Store a prebuilt BVH with triangle mesh bounds so it doesn't have to be built when the file is loaded (Native method only)",
+        default=False
+    )
+
+    use_compact_indices = BoolProperty(
+        name="Compact Indices",
+        description="Store triangle mesh indices in 8 or 16 bits where the vertex count allows, splitting large meshes into parts of up to 65536 vertices (Native method only)",
+        default=False
+    )
+
+    vertex_grid = FloatProperty(
+        name="Vertex Grid",
+        description="Snap triangle mesh vertices to a grid of this size, welding vertices that meet (0 to keep them exact)",
+        default=0.0,
+        min=0.0,
+        precision=4
+    )
+
     update_path = BoolProperty(
         default=False,
         options={"HIDDEN"},
@@ -276,6 +660,25 @@ class LEADER_OT_physics_exporter(bpy.types.Operator, ExportHelper):
         box = layout.box()
         box.prop(self, "physics_type", text="Type")
         box.prop(self, "collision_bounds_type", text="Bounds")
+        if self.collision_bounds_type == "AUTO_PRIMITIVE" and self.export_method == "NATIVE":
+            box.prop(self, "auto_primitive_tolerance")
+            box.prop(self, "auto_primitive_fallback")
+        if self.collision_bounds_type in ("CONVEX_HULL", "CONVEX_DECOMPOSITION", "AUTO_PRIMITIVE") and self.export_method == "NATIVE":
+            box.prop(self, "hull_max_vertices")
+            box.prop(self, "hull_shrink_wrap")
+        if "CONVEX_DECOMPOSITION" in (self.collision_bounds_type, self.auto_primitive_fallback) and self.export_method == "NATIVE":
+            box.prop(self, "decomposition_max_parts")
+            box.prop(self, "decomposition_max_concavity")
+            box.prop(self, "decomposition_resolution")
+        if self.export_method == "NATIVE":
+            box.prop(self, "use_mesh_cleanup")
+            if self.use_mesh_cleanup:
+                box.prop(self, "weld_distance")
+            box.prop(self, "decimate_max_triangles")
+            box.prop(self, "decimate_tolerance")
+            box.prop(self, "use_triangle_mesh_bvh")
+            box.prop(self, "use_compact_indices")
+            box.prop(self, "vertex_grid")
         box.prop(self, "xflip")
         layout.label(text="Rotation:", icon="ROTATE")
         box = layout.box()
@@ -304,15 +707,42 @@ class LEADER_OT_physics_exporter(bpy.types.Operator, ExportHelper):
 
         layout.label(text="Extra:", icon="LOGIC")
         box = layout.box()
+        box.prop(self, "export_method")
+        if self.export_method == "GAME_ENGINE":
+            box.prop(self, "use_single_game_session")
+        else:
+            box.prop(self, "use_instancing")
+            if not self.use_instancing:
+                box.prop(self, "use_evaluated_mesh")
         box.prop(self, "binconversion_enabled")
         box.prop(self, "export_combine_visible")
+        if not self.export_combine_visible:
+            box.prop(self, "path_collisions")
+        box.prop(self, "use_dry_run")
+        box.prop(self, "use_export_cache")
+        box.prop(self, "use_export_trace")
+        box.prop(self, "use_background_export")
+        box.prop(self, "use_watch_mode")
+        if self.use_watch_mode:
+            box.prop(self, "watch_delay")
 
     @contextmanager
-    def text_snippet(self, context, export_filepath):
+    def text_snippet(self, context, exports):
         self.snip = context.blend_data.texts.new('phys_export_snip')
+        # exportBulletFile dumps the whole physics world, so every other object in the scene is suspended,
+        # including copies that weren't changed since their last export.
         self.snip.write(
+            'import bge\n'
             'import PhysicsConstraints\n'
-            'PhysicsConstraints.exportBulletFile("{}")'.format(export_filepath))
+            'exports = {!r}\n'
+            'scene = bge.logic.getCurrentScene()\n'
+            'for name, path in exports:\n'
+            '    for obj in scene.objects:\n'
+            '        if obj.name == name:\n'
+            '            obj.restorePhysics()\n'
+            '        else:\n'
+            '            obj.suspendPhysics()\n'
+            '    PhysicsConstraints.exportBulletFile(path)\n'.format(list(exports)))
         yield
         context.blend_data.texts.remove(self.snip)
         self.snip = None
@@ -369,18 +799,16 @@ class LEADER_OT_physics_exporter(bpy.types.Operator, ExportHelper):
 
         from . import get_preferences
         addon_prefs = get_preferences(context)
-        if addon_prefs is not None:
-            self.binconversion_enabled = os.path.isfile(addon_prefs.binutil_path)
-            self.binutil_path = addon_prefs.binutil_path
-            self.export_combine_visible = addon_prefs.export_combine_visible
-            self.physics_type = addon_prefs.default_physics_type
-            self.collision_bounds_type = addon_prefs.default_collision_bounds_type
+        for name, value in preference_defaults(addon_prefs).items():
+            setattr(self, name, value)
         
         self.update_filepath(context)
         context.window_manager.fileselect_add(self)
         return {'RUNNING_MODAL'}
 
     def create_filepath(self, context, obj):
+        if obj.name in self.planned_paths:
+            return self.planned_paths[obj.name]
         obj_filepath = ""
 
         if self.filepath != "":
@@ -403,126 +831,275 @@ class LEADER_OT_physics_exporter(bpy.types.Operator, ExportHelper):
         return obj_filepath
 
     def can_export_object(self, context, obj):
-        if "VISIBLE" in self.object_types and obj.hide or obj.hide_select:
+        if self.watch_object_names and obj.type == "MESH" and obj.name not in self.watch_object_names.split("\n"):
             return False
-        if "SELECTED" in self.object_types and obj.select == False:
+        if self.planned_names is not None and obj.type == "MESH" and obj.name not in self.planned_names:
             return False
-        if "LAYERS" in self.object_types:
-            for i in range(20):
-                if context.scene.layers[i] and not obj.layers[i]:
-                    return False
-        return True
+        return object_is_exportable(context.scene, obj, self.object_types)
+
+    def physics_settings(self, obj, addon_prefs):
+        """Return the (physics_type, collision_bounds_type) to export obj with, or None if it has no physics."""
+        game = obj.game
+        if addon_prefs is not None and addon_prefs.export_use_defaults:
+            if game.use_collision_bounds is False or game.physics_type == "NO_COLLISION":
+                return (self.physics_type, self.collision_bounds_type)
+        if game.use_collision_bounds:
+            return (game.physics_type, game.collision_bounds_type)
+        return None
+
+    def decimation_limits(self, obj):
+        """Return the (max_triangles, tolerance) to decimate obj's triangle mesh bounds with."""
+        settings = obj.dos2de_physics
+        if settings.use_decimate_override:
+            return (settings.decimate_max_triangles, settings.decimate_tolerance)
+        return (self.decimate_max_triangles, self.decimate_tolerance)
+
+    def shape_settings(self, obj, collision_bounds_type=None):
+        game = bpy.data.objects[obj.name].game
+        max_triangles, tolerance = self.decimation_limits(obj)
+        return pipeline.ShapeSettings(
+            bounds=collision_bounds_type or game.collision_bounds_type,
+            margin=game.collision_margin,
+            use_mesh_cleanup=self.use_mesh_cleanup,
+            weld_distance=self.weld_distance,
+            decimate_max_triangles=max_triangles,
+            decimate_tolerance=tolerance,
+            use_bvh=self.use_triangle_mesh_bvh,
+            use_compact_indices=self.use_compact_indices,
+            vertex_grid=self.vertex_grid,
+            hull_max_vertices=self.hull_max_vertices,
+            hull_shrink_wrap=self.hull_shrink_wrap,
+            auto_primitive_tolerance=self.auto_primitive_tolerance,
+            auto_primitive_fallback=self.auto_primitive_fallback,
+            decomposition_max_parts=self.decomposition_max_parts,
+            decomposition_max_concavity=self.decomposition_max_concavity,
+            decomposition_resolution=self.decomposition_resolution)
+
+    def body_settings(self, obj, physics_type=None):
+        game = bpy.data.objects[obj.name].game
+        friction = 0.5
+        restitution = 0.0
+        if len(obj.data.materials) > 0 and obj.data.materials[0] is not None:
+            friction = obj.data.materials[0].physics.friction
+            restitution = obj.data.materials[0].physics.elasticity
+        return pipeline.BodySettings(physics_type=physics_type or game.physics_type, mass=game.mass,
+            friction=friction, restitution=restitution, linear_damping=game.damping, angular_damping=game.rotation_damping)
+
+    def create_bullet_body(self, obj, vertices, triangles, physics_type=None, collision_bounds_type=None):
+        with self.trace.stage("shape"):
+            return self.build_bullet_body(obj, vertices, triangles, physics_type, collision_bounds_type)
+
+    def build_bullet_body(self, obj, vertices, triangles, physics_type, collision_bounds_type):
+        return self.rigid_body(obj, self.build_shape(obj, vertices, triangles, collision_bounds_type), physics_type)
+
+    def build_shape(self, obj, vertices, triangles, collision_bounds_type=None):
+        return pipeline.build_shape(vertices, triangles, self.shape_settings(obj, collision_bounds_type), self.trace, obj.name)
+
+    def rigid_body(self, obj, shape, physics_type=None, transform=bullet_writer.IDENTITY_TRANSFORM):
+        return pipeline.rigid_body(shape, self.body_settings(obj, physics_type), transform)
+
+    def output_path(self, export_path):
+        if self.binconversion_enabled:
+            return os.path.splitext(export_path)[0] + ".bin"
+        return export_path
+
+    def export_digest(self, obj, vertices, triangles, physics):
+        """Hash everything that ends up in obj's exported file."""
+        game = bpy.data.objects[obj.name].game
+        material = obj.data.materials[0] if len(obj.data.materials) > 0 else None
+        settings = {
+            "physics": list(physics),
+            "hull": [self.hull_max_vertices, self.hull_shrink_wrap],
+            "cleanup": [self.use_mesh_cleanup, self.weld_distance],
+            "decimation": list(self.decimation_limits(obj)),
+            "bvh": self.use_triangle_mesh_bvh,
+            "triangle_mesh": [self.use_compact_indices, self.vertex_grid],
+            "auto_primitive": [self.auto_primitive_tolerance, self.auto_primitive_fallback],
+            "decomposition": [self.decomposition_max_parts, self.decomposition_max_concavity, self.decomposition_resolution],
+            "game": [game.collision_margin, game.mass, game.damping, game.rotation_damping],
+            "material": [material.physics.friction, material.physics.elasticity] if material is not None else None,
+            "preset": self.preset,
+            "xflip": self.xflip,
+            "rotation": [self.use_rotation_apply_each,
+                self.use_rotation_axis_x, self.use_rotation_x_amount,
+                self.use_rotation_axis_y, self.use_rotation_y_amount,
+                self.use_rotation_axis_z, self.use_rotation_z_amount],
+            "export_method": self.export_method,
+            "instancing": self.use_instancing,
+            "binutil_path": self.binutil_path if self.binconversion_enabled else None,
+        }
+        matrix = numpy.array(self.export_matrix(obj), dtype=numpy.float64)
+        return export_cache.content_hash((vertices, triangles, matrix), settings)
+
+    def copy_digest(self, obj, vertices, triangles):
+        """export_digest for a copy, whose game settings may have been filled in from the defaults."""
+        game = bpy.data.objects[obj.name].game
+        bounds = self.exporter_bounds.get(obj.name, game.collision_bounds_type)
+        return self.export_digest(obj, vertices, triangles, (game.physics_type, bounds))
+
+    def is_unchanged(self, context, obj, digest):
+        export_path = self.create_filepath(context, obj)
+        if self.cache.is_current(export_path, digest, self.output_path(export_path)):
+            print("[DOS2DE-Physics] Skipping '{}', '{}' is up to date.".format(obj.name, export_path))
+            self.trace.count("skipped")
+            return True
+        return False
+
+    def record_export(self, export_path, digest):
+        if self.cache is None or digest is None:
+            return
+        if self.converter is not None:
+            # Only cached once the conversion succeeded.
+            self.pending_cache[export_path] = digest
+        else:
+            self.cache.update(export_path, digest)
 
-    def export_bullet(self, context, obj):
+    def export_bullet(self, context, obj, body=None, digest=None, bodies=None, arrays=None):
 
         export_path = self.create_filepath(context, obj)
 
         print("[DOS2DE-Physics] Exporting bullet file to {}".format(export_path))
 
-        context.scene.objects.active = obj
+        started = time.perf_counter()
+        with self.trace.stage("export"):
+            if self.export_method == "NATIVE":
+                if bodies is None:
+                    if body is None:
+                        vertices, triangles = arrays if arrays is not None else mesh_arrays(obj)
+                        body = self.create_bullet_body(obj, vertices, triangles,
+                            collision_bounds_type=self.exporter_bounds.get(obj.name))
+                    bodies = [body]
+                if self.writer is not None:
+                    # Bodies only hold arrays, so the file is written while the next object is read.
+                    future = self.writer.submit(bullet_writer.write_bullet_file, export_path, bodies)
+                    self.writes.append((future, obj.name, export_path, started, digest))
+                    return
+                with self.trace.stage("write"):
+                    size = bullet_writer.write_bullet_file(export_path, bodies)
+            else:
+                self.export_bullet_game_engine(context, obj, [(obj.name, export_path)])
+                size = os.path.getsize(export_path) if os.path.isfile(export_path) else 0
+        self.finish_export(obj.name, export_path, started, size, digest)
+
+    def finish_export(self, name, export_path, started, size, digest):
+        self.trace.count("bytes_written", size)
+        self.trace.record_export(name, export_path, time.perf_counter() - started, size)
+
+        print("[DOS2DE-Physics] Done. Saved filed to '{}'.".format(export_path))
+
+        if self.binconversion_enabled:
+            self.convert_bullet(export_path)
+
+        self.record_export(export_path, digest)
+
+    def export_bullet_batch(self, context, objects, digests):
+        exports = [(obj.name, self.create_filepath(context, obj)) for obj in objects]
+
+        print("[DOS2DE-Physics] Exporting {} bullet files in one game engine session.".format(len(exports)))
 
-        with self.text_snippet(context, export_path):
+        with self.trace.stage("export"):
+            self.export_bullet_game_engine(context, objects[0], exports)
+
+        for name, export_path in exports:
+            size = os.path.getsize(export_path) if os.path.isfile(export_path) else 0
+            self.trace.count("bytes_written", size)
+            self.trace.record_export(name, export_path, None, size)
+            print("[DOS2DE-Physics] Done. Saved filed to '{}'.".format(export_path))
+            if self.binconversion_enabled:
+                self.convert_bullet(export_path)
+            self.record_export(export_path, digests.get(name))
+
+    def export_bullet_game_engine(self, context, obj, exports):
+        """Run the game engine once on obj's scene, with logic bricks on obj exporting each (object name, path) pair."""
+        scene = obj.users_scene[0]
+        scene.objects.active = obj
+
+        with self.text_snippet(context, exports):
             # create a trigger
-            bpy.ops.logic.sensor_add(type='ALWAYS', name='phys_export_trigger', object=obj.name)
+            self.run_operator(bpy.ops.logic.sensor_add, type='ALWAYS', name='phys_export_trigger', object=obj.name)
             trigger = obj.game.sensors[-1]
 
             # create export controller
-            bpy.ops.logic.controller_add(type='PYTHON', name='phys_export', object=obj.name)
+            self.run_operator(bpy.ops.logic.controller_add, type='PYTHON', name='phys_export', object=obj.name)
             export_ctrl = obj.game.controllers[-1]
             export_ctrl.text = self.snip
             #print(self.snip.as_string())
             trigger.link(export_ctrl)
 
             # create AND controller
-            bpy.ops.logic.controller_add(type='LOGIC_AND', name='phys_export_pass', object=obj.name)
+            self.run_operator(bpy.ops.logic.controller_add, type='LOGIC_AND', name='phys_export_pass', object=obj.name)
             pass_ctrl = obj.game.controllers[-1]
             trigger.link(pass_ctrl)
 
             # create QUIT actuator
-            bpy.ops.logic.actuator_add(type='GAME', name='phys_export_quit', object=obj.name)
+            self.run_operator(bpy.ops.logic.actuator_add, type='GAME', name='phys_export_quit', object=obj.name)
             quit_act = obj.game.actuators[-1]
             quit_act.mode = 'QUIT'
             pass_ctrl.link(actuator=quit_act)
 
             # run game engine!
-            bpy.ops.view3d.game_start()
+            with self.screen_scene(context, scene):
+                self.run_operator(bpy.ops.view3d.game_start)
 
             # cleanup
             print("[DOS2DE-Physics] Cleaning up.")
-            bpy.ops.logic.controller_remove(controller=export_ctrl.name, object=obj.name)
-            bpy.ops.logic.controller_remove(controller=pass_ctrl.name, object=obj.name)
-            bpy.ops.logic.actuator_remove(actuator=quit_act.name, object=obj.name)
-            bpy.ops.logic.sensor_remove(sensor=trigger.name, object=obj.name)
-            print("[DOS2DE-Physics] Done. Saved filed to '{}'.".format(export_path))
+            self.run_operator(bpy.ops.logic.controller_remove, controller=export_ctrl.name, object=obj.name)
+            self.run_operator(bpy.ops.logic.controller_remove, controller=pass_ctrl.name, object=obj.name)
+            self.run_operator(bpy.ops.logic.actuator_remove, actuator=quit_act.name, object=obj.name)
+            self.run_operator(bpy.ops.logic.sensor_remove, sensor=trigger.name, object=obj.name)
 
-            if self.binconversion_enabled:
-                if self.binutil_path is not None and self.binutil_path != "" and os.path.isfile(self.binutil_path):
-                    if os.path.isfile(export_path):
-                        subprocess.run([self.binutil_path,'-i', export_path])
-                        os.remove(export_path)
-                    else:
-                        raise Warning("[DOS2DE-Physics] Bullet file not found. Was it exported? If exporting to a User folder, this may cause it to fail.")
-                else:
-                    raise Exception("[DOS2DE-Physics] Bin conversion program not found.")
-    def finish(self, context, **args):
-        delete_objects = args["delete_objects"]
-        prev_engine = args["prev_engine"]
-        object_settings = args["object_settings"]
-        active_object = args["active_object"]
-        last_mode = args["last_mode"]
-
-        last_material_settings = args["last_material_settings"]
-
-        if last_material_settings is not None:
-            for mat_tuple in last_material_settings:
-                mat = mat_tuple[0]
-                mat.game_settings.alpha_blend = mat_tuple[1]
-
-        for obj in delete_objects:
-            if obj is not None:
-                print("[DOS2DE-Physics] Deleting {}".format(obj.name))
-                data = bpy.data.objects[obj.name]
-                bpy.data.objects.remove(data, do_unlink=True)
-
-        delete_objects.clear()
-
-        context.scene.render.engine = prev_engine
-
-        for obj in context.scene.objects:
-            obj.select = False
-
-        for k in object_settings:
-            settings = object_settings[k]
-            obj = context.scene.objects[k]
-            obj.select = settings["selected"]
-            obj.hide_render = settings["hide_render"]
-            bpy.data.objects[obj.name].game.use_collision_bounds = settings["use_collision_bounds"]
-        
-        if active_object is not None:
-            context.scene.objects.active = active_object
-        
-        # Return to previous mode
-        if (last_mode is not None and active_object is not None 
-                and active_object.hide == False and active_object.hide_select == False):
-            if active_object.type != "ARMATURE" and last_mode == "POSE":
-                bpy.ops.object.mode_set(mode="OBJECT")
-            else:
-                bpy.ops.object.mode_set (mode=last_mode)
+    @contextmanager
+    def screen_scene(self, context, scene):
+        """Show scene in the window while the game engine runs, since it plays the displayed scene."""
+        shown_scene = context.screen.scene
+        context.screen.scene = scene
+        try:
+            yield
+        finally:
+            context.screen.scene = shown_scene
+
+    def run_operator(self, operator, *args, **kwargs):
+        self.trace.count("operator_calls")
+        return operator(*args, **kwargs)
+
+    def convert_bullet(self, export_path):
+        if os.path.isfile(export_path):
+            self.converter.submit(export_path)
+        else:
+            raise Warning("[DOS2DE-Physics] Bullet file not found. Was it exported? If exporting to a User folder, this may cause it to fail.")
+
+    def report_trace(self):
+        summary = self.trace.summary()
+        print("[DOS2DE-Physics] {}".format(summary))
+        self.report({"INFO"}, summary)
+        if self.use_export_trace:
+            trace_path = os.path.splitext(self.filepath)[0] + ".trace.json"
+            self.trace.save(trace_path)
+            print("[DOS2DE-Physics] Wrote timing trace to '{}'.".format(trace_path))
+
+    def report_conversions(self, results):
+        failed = bin_converter.failed_conversions(results)
+        for result in failed:
+            print("[DOS2DE-Physics] Bin conversion failed for '{}' (exit code {}): {}".format(
+                result.bullet_path, result.returncode, result.stderr))
+        if len(failed) > 0:
+            self.report({"ERROR"}, "{} of {} bin conversions failed. See the console for details.".format(len(failed), len(results)))
+        elif len(results) > 0:
+            print("[DOS2DE-Physics] Converted {} bullet files to bin.".format(len(results)))
+
+    def transform_settings(self):
+        rotations = []
+        if self.use_rotation_axis_y:
+            rotations.append(("Y", self.use_rotation_y_amount))
+        if self.use_rotation_axis_z:
+            rotations.append(("Z", self.use_rotation_z_amount))
+        if self.use_rotation_axis_x:
+            rotations.append(("X", self.use_rotation_x_amount))
+        return pipeline.TransformSettings(rotations, self.use_rotation_apply_each, self.xflip)
 
-    def transform_apply(self, context, obj, location=False, rotation=False, scale=False):
-        if obj.parent is not None:
-            self.transform_apply(context, obj.parent, location, rotation, scale)
-        obj.select = True
-        last_selected = getattr(context.scene.objects, "active", None)
-        context.scene.objects.active = obj
-        bpy.ops.object.mode_set(mode="OBJECT")
-        print("   [DOS2DE-Physics] Applying transformations for {}".format(obj.name))
-        bpy.ops.object.transform_apply(location=location, rotation=rotation, scale=scale)
-        obj.select = False
-
-        #for childobj in obj.children:
-        #    self.transform_apply(context, childobj)
-        context.scene.objects.active = last_selected
+    def export_matrix(self, obj):
+        """Compose obj's world transform, the axis rotations and the X-flip into one matrix."""
+        return Matrix(pipeline.export_matrix(numpy.array(obj.matrix_world), self.transform_settings()).tolist())
 
     def get_top_parent(self, obj):
         if obj.parent is not None:
@@ -530,207 +1107,498 @@ class LEADER_OT_physics_exporter(bpy.types.Operator, ExportHelper):
         else:
             return obj
 
-    def execute(self, context):
-        if not self.filepath:
-            raise Exception("[DOS2DE-Physics] Filepath not set.")
-            return {'CANCELLED'}
+    def export_arrays(self, context, obj, vertices, triangles, physics):
+        digest = None
+        if self.cache is not None:
+            digest = self.export_digest(obj, vertices, triangles, physics)
+            if self.is_unchanged(context, obj, digest):
+                return
+        self.export_bullet(context, obj, self.create_bullet_body(obj, vertices, triangles, *physics), digest)
 
-        prev_engine = context.scene.render.engine or 'BLENDER_RENDER'
-        context.scene.render.engine = 'BLENDER_GAME'
+    def execute_evaluated(self, context):
+        """Export evaluated mesh data of the original objects, leaving the scene untouched.
 
-        export_objects = []
-        delete_objects = []
-        object_settings = {}
+        Like the other execute_ methods, this is a generator yielding each object's name once it's done.
+        """
+        from . import get_preferences
+        addon_prefs = get_preferences(context)
 
-        last_mode = getattr(bpy.context.object, "mode", None)
-        
-        active_object = None
-        if context.scene.objects.active:
-            active_object = context.scene.objects.active
+        with self.trace.stage("filter"):
+            exportable_objects = [x for x in context.scene.objects if x.type == "MESH" and self.can_export_object(context, x)]
+            if len(exportable_objects) <= 0:
+                raise Warning("[DOS2DE-Physics] No objects to export.")
+                return {'CANCELLED'}
+        self.progress_total = len(exportable_objects)
 
-        exportable_objects = [x for x in context.scene.objects if (x.type == "ARMATURE" or x.type == "MESH") and self.can_export_object(context, x)]
-        if len(exportable_objects) <= 0:
-            raise Warning("[DOS2DE-Physics] No objects to export.")
-            return {'CANCELLED'}
-        
+        combined = OrderedDict()
         for obj in exportable_objects:
-            object_settings[obj.name] = {
-                "selected": obj.select,
-                "hide_render": obj.hide_render,
-                "use_collision_bounds": bpy.data.objects[obj.name].game.use_collision_bounds
-            }
-
-            obj.select = True
-            obj.hide_render = True
-
-            #Using copies, hide the originals
-            if bpy.data.objects[obj.name] is not None:
-                bpy.data.objects[obj.name].game.use_collision_bounds = False
-
-        context.scene.objects.active = exportable_objects[0]
-        bpy.ops.object.mode_set(mode="OBJECT")
-        print("[DOS2DE-Physics] Duplicating objects.")
-        bpy.ops.object.duplicate()
-        
-        if context.selected_objects is not None:
-            export_objects.extend(context.selected_objects)
-            print("[DOS2DE-Physics] Added context.selected_objects to export_objects ({}).".format(len(export_objects)))
-        elif (context.scene.objects.active != None):
-            print("[DOS2DE-Physics] Added context.scene.objects.active to export_objects.")
-            export_objects.append(context.scene.objects.active)
-
-        context.scene.objects.active = None
-        bpy.ops.object.select_all(action='DESELECT')
-
-        if len(export_objects) <= 0:
-            print("[DOS2DE-Physics] No object to export! Cancelling.")
-            self.finish(context, export_objects=export_objects, delete_objects=delete_objects, 
-                    object_settings=object_settings, active_object=active_object, 
-                    prev_engine=prev_engine, last_mode=last_mode, last_material_settings=None)
-            return {'CANCELLED'}
-
+            physics = self.physics_settings(obj, addon_prefs)
+            if physics is None:
+                print("[DOS2DE-Physics] Skipping '{}', physics are disabled.".format(obj.name))
+                yield obj.name
+                continue
+
+            print("[DOS2DE-Physics] Reading evaluated mesh for '{}'.".format(obj.name))
+            with self.trace.stage("read"):
+                vertices, triangles = evaluated_mesh_arrays(context.scene, obj, self.export_matrix(obj))
+
+            if self.is_merged(obj):
+                combined.setdefault(self.planned_paths[obj.name], []).append((obj, vertices, triangles, physics))
+            else:
+                self.export_arrays(context, obj, vertices, triangles, physics)
+            yield obj.name
+
+        while len(combined) > 0:
+            group = combined.popitem(last=False)[1]
+            print("[DOS2DE-Physics] Combining {} meshes into '{}'.".format(len(group), group[0][0].name))
+            with self.trace.stage("join"):
+                vertices, triangles = geometry.concatenate_meshes([(x[1], x[2]) for x in group])
+            obj, physics = group[0][0], group[0][3]
+            del group[:]
+            self.export_arrays(context, obj, vertices, triangles, physics)
+
+    def instance_groups(self, objects, addon_prefs):
+        """Group objects into lists of Instances that can share one shape: same mesh, shape settings and scale."""
+        groups = OrderedDict()
+        for obj in objects:
+            physics = self.physics_settings(obj, addon_prefs)
+            if physics is None:
+                print("[DOS2DE-Physics] Skipping '{}', physics are disabled.".format(obj.name))
+                continue
+            rotation, origin, linear = geometry.split_rigid_transform(numpy.array(self.export_matrix(obj)))
+            # Modifiers can give every object different geometry, so those objects get a shape of their own.
+            source = ("MESH", obj.data.name) if len(obj.modifiers) == 0 else ("OBJECT", obj.name)
+            key = (source, physics[1], obj.game.collision_margin, self.decimation_limits(obj), tuple(numpy.round(linear, 5).ravel()))
+            groups.setdefault(key, []).append(Instance(obj, physics, rotation, origin, linear))
+        return list(groups.values())
+
+    def write_instance_manifest(self, shapes, instances):
+        manifest_path = os.path.splitext(self.filepath)[0] + ".instances.json"
+        with open(manifest_path, "w") as f:
+            json.dump(OrderedDict((("version", 1), ("shapes", shapes), ("instances", instances))), f, indent=1)
+        print("[DOS2DE-Physics] Wrote instance manifest to '{}'.".format(manifest_path))
+
+    def execute_instanced(self, context):
+        """Export one collision shape per shared mesh, placed with a transform per object that uses it."""
         from . import get_preferences
         addon_prefs = get_preferences(context)
 
-        print("[DOS2DE-Physics] Applying transformations for objects.")
-        for obj in export_objects:
-            # if not self.can_export_object(context, obj):
-            #     bpy.data.objects.remove(obj.data, do_unlink=True)
-            #     export_objects.remove(obj)
-            obj.hide_render = False
-            self.transform_apply(context, obj, location=True, rotation=True, scale=True)
-
-        bpy.ops.object.select_all(action='DESELECT')
-
-        delete_objects.extend(export_objects)
-
-        if self.export_combine_visible and len(export_objects) > 1:
-            print("[DOS2DE-Physics] Joining objects.")
-
-            mesh_copies = [x for x in export_objects if x.type == "MESH"]
-            for obj in mesh_copies:
-                obj.select = True
-                delete_objects.remove(obj)
-
-            context.scene.objects.active = mesh_copies[0]
-            bpy.ops.object.join()
-
-            export_objects.clear()
-            export_objects.append(context.scene.objects.active)
-            delete_objects.append(context.scene.objects.active)
-            print("[DOS2DE-Physics] Objects joined into '{}'.".format(context.scene.objects.active.name))
-
-        if context.scene.objects.active is not None:
-            bpy.ops.object.select_all(action='DESELECT')
-        
-        arm_num = 1
-
-        last_material_settings = []
-        last_cursor_loc = bpy.context.scene.cursor_location.copy()
-        for obj in export_objects:
-            #target = self.get_top_parent(obj)
-            target = obj
-            if self.use_rotation_axis_y == True:
-                target.rotation_euler = (target.rotation_euler.to_matrix() * Matrix.Rotation(radians(self.use_rotation_y_amount), 3, "Y")).to_euler()
-                rotated = True
-                if self.use_rotation_apply_each:
-                    self.transform_apply(context, target, rotation=True, location=True)
-            if self.use_rotation_axis_z == True:
-                target.rotation_euler = (target.rotation_euler.to_matrix() * Matrix.Rotation(radians(self.use_rotation_z_amount), 3, "Z")).to_euler()
-                rotated = True
-                if self.use_rotation_apply_each:
-                    self.transform_apply(context, target, rotation=True, location=True)
-            if self.use_rotation_axis_x == True:
-                target.rotation_euler = (target.rotation_euler.to_matrix() * Matrix.Rotation(radians(self.use_rotation_x_amount), 3, "X")).to_euler()
-                rotated = True
-                if self.use_rotation_apply_each:
-                    self.transform_apply(context, target, rotation=True, location=True)
-
-            self.transform_apply(context, target, rotation=True, location=True)
-            #return {"FINISHED"}
-            if self.xflip == True and obj.type == "MESH":
-                print("[DOS2DE-Physics] X-flipping mesh.")
-                context.scene.objects.active = obj
-                obj.select = True
-                # bpy.context.scene.cursor_location = obj.location
-                # bpy.ops.object.origin_set(type='ORIGIN_GEOMETRY', center='BOUNDS')
-                # if obj.scale[0] > 0:
-                #     obj.scale[0] = -1
-                # else:
-                #     obj.scale[0] *= -1
-                # bpy.ops.object.editmode_toggle()
-                # bpy.ops.mesh.select_all(action='SELECT')
-                # bpy.ops.mesh.flip_normals()
-                # bpy.ops.object.editmode_toggle()
-                # bpy.context.scene.cursor_location = last_cursor_loc
-                self.transform_apply(context, obj, scale=True)
-                obj.scale = (-1.0, 1.0, 1.0)
-                self.transform_apply(context, obj, scale=True)
-                bm = bmesh.new()
-                bm.from_mesh(obj.data)
-                bmesh.ops.reverse_faces(bm, faces=bm.faces)
-                bm.to_mesh(obj.data)
-                bm.clear()
-                obj.data.update()
-                print("[DOS2DE-Physics] Flipped and applied scale transformation for {} ".format(obj.name))
-                #rint("[DOS2DE-Physics] Last cursor loc: {} | Current cursor loc {}:".format(last_cursor_loc, bpy.context.scene.cursor_location))
-                #bpy.ops.object.origin_set(type='ORIGIN_CURSOR')
-                #print("[DOS2DE-Physics] Rotating object '{}' on the {} axis.".format(obj.name, self.use_rotation_axis))
-            #return {"FINISHED"} #Debugging flips
-            if (obj.parent is None or obj.parent.type != "ARMATURE") and obj.type != "ARMATURE":
-                print("[DOS2DE-Physics] Creating armature for '{}'.".format(obj.name))
-                #bpy.ops.object.armature_add()
-                #armature = context.scene.objects.active
-                data_name = 'armbexporttempdata-{}'.format(arm_num)
-                arm_name = 'armbexporttemp-{}'.format(arm_num)
-                arm_num += 1
-
-                armature_data = bpy.data.armatures.new(data_name)
-                armature = bpy.data.objects.new(arm_name, armature_data)
-                armature.hide_render = False
-                context.scene.objects.link(armature)
-
-                obj.select = True
-
-                if len(obj.data.materials) > 0:
-                    mat = obj.data.materials[0]
-                    if(mat.game_settings.alpha_blend is not "OPAQUE"):
-                        last_material_settings.append((mat, mat.game_settings.alpha_blend))
-                        print(" [DOS2DE-Physics] Set non-opaque material '{}[{}]' to OPAQUE.".format(mat.name, mat.game_settings.alpha_blend))
-                        mat.game_settings.alpha_blend = "OPAQUE"
-
-                context.scene.objects.active = armature
-                bpy.ops.object.parent_set(type="ARMATURE")
+        with self.trace.stage("filter"):
+            exportable_objects = [x for x in context.scene.objects if x.type == "MESH" and self.can_export_object(context, x)]
+            if len(exportable_objects) <= 0:
+                raise Warning("[DOS2DE-Physics] No objects to export.")
+                return {'CANCELLED'}
+            groups = self.instance_groups(exportable_objects, addon_prefs)
+        self.progress_total = len(groups)
+
+        shapes = []
+        instances = []
+        combined = OrderedDict()
+        for group in groups:
+            first = group[0]
+            linear = numpy.identity(4)
+            linear[:3, :3] = first.linear
+            print("[DOS2DE-Physics] Reading evaluated mesh for '{}', shared by {} object(s).".format(first.obj.name, len(group)))
+            with self.trace.stage("read"):
+                vertices, triangles = evaluated_mesh_arrays(context.scene, first.obj, linear)
+
+            digests = {}
+            if self.cache is not None:
+                with self.trace.stage("cache"):
+                    for instance in list(group):
+                        if self.is_merged(instance.obj):
+                            continue
+                        digest = self.export_digest(instance.obj, vertices, triangles, instance.physics)
+                        if self.is_unchanged(context, instance.obj, digest):
+                            group.remove(instance)
+                        else:
+                            digests[instance.obj.name] = digest
+                if len(group) == 0:
+                    yield first.obj.name
+                    continue
+
+            with self.trace.stage("shape"):
+                shape = self.build_shape(first.obj, vertices, triangles, first.physics[1])
+            self.trace.count("shapes")
+            self.trace.count("instances", len(group))
+            shapes.append(OrderedDict((
+                ("mesh", first.obj.data.name if len(first.obj.modifiers) == 0 else None),
+                ("source", first.obj.name),
+                ("bounds", first.physics[1]),
+                ("linear", first.linear.tolist()),
+                ("instances", len(group)),
+            )))
+
+            for instance in group:
+                transform = bullet_writer.make_transform(instance.rotation, instance.origin)
+                body = self.rigid_body(instance.obj, shape, instance.physics[0], transform)
+                if self.is_merged(instance.obj):
+                    combined.setdefault(self.planned_paths[instance.obj.name], (instance.obj, []))[1].append(body)
+                else:
+                    self.export_bullet(context, instance.obj, body, digests.get(instance.obj.name))
+                instances.append(OrderedDict((
+                    ("object", instance.obj.name),
+                    ("shape", len(shapes) - 1),
+                    ("file", self.create_filepath(context, instance.obj)),
+                    ("physics_type", instance.physics[0]),
+                    ("basis", transform["m_basis"]),
+                    ("origin", transform["m_origin"]),
+                )))
+            yield first.obj.name
+
+        for obj, bodies in combined.values():
+            print("[DOS2DE-Physics] Writing {} bodies into one file.".format(len(bodies)))
+            self.export_bullet(context, obj, bodies=bodies)
+        self.write_instance_manifest(shapes, instances)
 
-                for i in range(20):
-                    armature.layers[i] = obj.layers[i]
+    def execute(self, context):
+        if not self.filepath:
+            raise Exception("[DOS2DE-Physics] Filepath not set.")
+            return {'CANCELLED'}
 
-                delete_objects.append(armature)
-                print(" [DOS2DE-Physics] Armature '{}' created.".format(armature.name))
-        
-        for obj in [x for x in export_objects if x.type == "MESH"]:
-            phys_type = bpy.data.objects[obj.name].game.physics_type
-            phys_enabled = bpy.data.objects[obj.name].game.use_collision_bounds
+        self.trace = instrumentation.ExportTrace()
+        files = self.plan_export(context)
+        if self.use_dry_run:
+            for planned in files:
+                print("[DOS2DE-Physics] '{}': {}".format(planned.path, ", ".join(planned.objects)))
+            plan_path = os.path.splitext(self.filepath)[0] + ".plan.json"
+            export_plan.save_plan(plan_path, files, self.collision_mode())
+            print("[DOS2DE-Physics] Dry run, wrote export plan to '{}'.".format(plan_path))
+            self.report({"INFO"}, "Planned {} file(s) for {} object(s).".format(len(files), sum(len(x.objects) for x in files)))
+            return {"FINISHED"}
+        export_plan.create_directories(files)
+
+        self.converter = None
+        if self.binconversion_enabled:
+            if self.binutil_path is None or self.binutil_path == "" or not os.path.isfile(self.binutil_path):
+                raise Exception("[DOS2DE-Physics] Bin conversion program not found.")
+            # Conversions run in the background while the next objects are exported.
+            self.converter = bin_converter.BinConverter(self.binutil_path)
+
+        self.cache = export_cache.ExportCache() if self.use_export_cache else None
+        self.pending_cache = {}
+        # Copies can't store exporter-only bounds in their game settings, so they're tracked by object name.
+        self.exporter_bounds = {}
+        self.writer = None
+        self.writes = []
+        self.progress_total = 0
+
+        if self.use_background_export and context.window is not None:
+            return self.start_background(context)
+
+        try:
+            for name in self.export_steps(context):
+                pass
+        finally:
+            self.end_export()
+        self.start_watch(context)
+        return {"FINISHED"}
 
-            print("[DOS2DE-Physics] Phys type for '{}' is {}.".format(obj.name, phys_type))
+    def collision_mode(self):
+        # Combining joins every object into one file anyway.
+        return "MERGE" if self.export_combine_visible else self.path_collisions
 
-            if addon_prefs is not None and addon_prefs.export_use_defaults:
-                if phys_enabled is False or phys_type is None or phys_type == "NO_COLLISION":
-                    print("[DOS2DE-Physics] Using default physics settings for '{}'.".format(obj.name))
-                    bpy.data.objects[obj.name].game.physics_type = self.physics_type
-                    bpy.data.objects[obj.name].game.collision_bounds_type = self.collision_bounds_type
-                    bpy.data.objects[obj.name].game.use_collision_bounds = True
-                    phys_enabled = True
+    def plan_export(self, context):
+        """Resolve every exported object's file before anything is copied, handling objects that share one.
 
-            if phys_enabled:
-                print("[DOS2DE-Physics] Exporting object '{}'".format(obj.name))
-                self.export_bullet(context, obj)
+        Fills in planned_paths, planned_names (the meshes left to export) and merged_paths, and returns the
+        export_plan.PlannedFile list.
+        """
+        from . import get_preferences
+        addon_prefs = get_preferences(context)
+        self.planned_paths = {}
+        self.planned_names = None
+        self.merged_paths = set()
+
+        with self.trace.stage("plan"):
+            objects = [x for x in context.scene.objects if x.type == "MESH" and self.can_export_object(context, x)
+                and self.physics_settings(x, addon_prefs) is not None]
+            if self.export_combine_visible and len(objects) > 0:
+                entries = [(x.name, self.create_filepath(context, objects[0])) for x in objects]
+            else:
+                entries = [(x.name, self.create_filepath(context, x)) for x in objects]
+            files = export_plan.plan_files(entries)
+
+        mode = self.collision_mode()
+        for planned in export_plan.collisions(files):
+            if mode == "MERGE":
+                self.merged_paths.add(planned.path)
+                if not self.export_combine_visible:
+                    print("[DOS2DE-Physics] {} objects share '{}', writing them into it together: {}".format(
+                        len(planned.objects), planned.path, ", ".join(planned.objects)))
+            else:
+                print("[DOS2DE-Physics] {} objects share '{}', only exporting '{}', which would overwrite the others: {}".format(
+                    len(planned.objects), planned.path, planned.objects[-1], ", ".join(planned.objects[:-1])))
+                self.report({"WARNING"}, "{} objects would be exported to '{}', only '{}' is. See the console for details.".format(
+                    len(planned.objects), os.path.basename(planned.path), planned.objects[-1]))
+                export_plan.keep_last(planned)
+
+        for planned in files:
+            for name in planned.objects:
+                self.planned_paths[name] = planned.path
+        self.planned_names = set(self.planned_paths)
+        return files
+
+    def is_merged(self, obj):
+        """True if obj shares its planned file with other objects, and is written into it together with them."""
+        return self.planned_paths.get(obj.name) in self.merged_paths
+
+    def export_steps(self, context):
+        if self.export_method == "NATIVE" and self.use_instancing:
+            return self.execute_instanced(context)
+        if self.export_method == "NATIVE" and self.use_evaluated_mesh:
+            return self.execute_evaluated(context)
+        return self.execute_copies(context)
+
+    def end_export(self):
+        """Wait for conversions, then save the cache and report the trace."""
+        results = []
+        if self.converter is not None:
+            with self.trace.stage("conversion"):
+                results = self.converter.wait()
+            self.trace.count("conversions", len(results))
+            self.trace.count("conversion_seconds", round(sum(x.seconds for x in results), 3))
+            self.report_conversions(results)
+            self.converter = None
+        if self.cache is not None:
+            for result in results:
+                if result.returncode == 0 and result.bullet_path in self.pending_cache:
+                    self.cache.update(result.bullet_path, self.pending_cache[result.bullet_path])
+            self.cache.save()
+            self.cache = None
+        self.report_trace()
+
+    def start_watch(self, context):
+        if self.use_watch_mode:
+            settings = self.as_keywords(ignore=("use_watch_mode", "watch_delay", "watch_object_names", "use_background_export"))
+            object_types = set(self.object_types)
+            export_watch.start(context, settings, lambda scene, obj: object_is_exportable(scene, obj, object_types), self.watch_delay)
+
+    def start_background(self, context):
+        """Run the export steps from a timer, so the editor stays responsive and Esc cancels."""
+        # Steps run long after execute returned, so they look the context up each time.
+        self.steps = self.export_steps(bpy.context)
+        self.progress_done = 0
+        self.writer = ThreadPoolExecutor(1)
+        self.timer = context.window_manager.event_timer_add(0.01, context.window)
+        context.window_manager.modal_handler_add(self)
+        context.window_manager.progress_begin(0, 1)
+        print("[DOS2DE-Physics] Exporting in the background, press Esc to cancel.")
+        return {"RUNNING_MODAL"}
+
+    def finish_writes(self):
+        """Finish the exports whose background write is done. Raises the error of a failed write."""
+        pending = []
+        for future, name, export_path, started, digest in self.writes:
+            if future.done():
+                self.finish_export(name, export_path, started, future.result(), digest)
+            else:
+                pending.append((future, name, export_path, started, digest))
+        self.writes = pending
+
+    def background_busy(self):
+        # finish_writes drops done writes, so any left are still running.
+        return len(self.writes) > 0 or (self.converter is not None and not all(x.done() for x in self.converter.futures))
+
+    def modal(self, context, event):
+        if event.type == "ESC" and event.value == "PRESS":
+            self.cancel(context)
+            self.report({"WARNING"}, "[DOS2DE-Physics] Export cancelled.")
+            return {"CANCELLED"}
+        if event.type != "TIMER" or event.timer is not self.timer:
+            return {"PASS_THROUGH"}
+
+        try:
+            self.finish_writes()
+            name = next(self.steps) if self.steps is not None else None
+        except StopIteration:
+            self.steps = None
+        except Exception as e:
+            self.cancel(context)
+            self.report({"ERROR"}, str(e))
+            return {"CANCELLED"}
+        else:
+            if name is not None:
+                self.progress_done += 1
+                total = max(self.progress_total, self.progress_done)
+                context.window_manager.progress_update(self.progress_done / total)
+                print("[DOS2DE-Physics] [{}/{}] Exported '{}'.".format(self.progress_done, total, name))
+                return {"PASS_THROUGH"}
+
+        if self.steps is not None or self.background_busy():
+            return {"PASS_THROUGH"}
+        self.end_background(context)
+        self.end_export()
+        self.start_watch(context)
+        return {"FINISHED"}
 
-        self.finish(context, export_objects=export_objects, delete_objects=delete_objects, 
-                object_settings=object_settings, active_object=active_object, 
-                prev_engine=prev_engine, last_mode=last_mode, last_material_settings=last_material_settings)
+    def end_background(self, context):
+        context.window_manager.event_timer_remove(self.timer)
+        context.window_manager.progress_end()
+        self.writer.shutdown()
+        self.writer = None
+
+    def cancel(self, context):
+        """Stop a background export: the scratch scene is removed and queued writes and conversions are dropped."""
+        if self.steps is not None:
+            self.steps.close()
+            self.steps = None
+        for write in self.writes:
+            write[0].cancel()
+        if self.converter is not None:
+            for future in self.converter.futures:
+                future.cancel()
+        # Writes and conversions that already started finish, so their files aren't left half written.
+        self.end_background(context)
+        self.writes = [x for x in self.writes if not x[0].cancelled()]
+        try:
+            self.finish_writes()
+        except Exception as e:
+            print("[DOS2DE-Physics] Export failed: {}".format(e))
+        if self.converter is not None:
+            self.converter.futures = [x for x in self.converter.futures if not x.cancelled()]
+        self.end_export()
+
+    def execute_copies(self, context):
+        """Export copies of the objects, made and changed in a scratch scene so the user's scene is left untouched."""
+        from . import get_preferences
+        addon_prefs = get_preferences(context)
 
-        return {"FINISHED"}
+        with self.trace.stage("filter"):
+            exportable_objects = [x for x in context.scene.objects if (x.type == "ARMATURE" or x.type == "MESH") and self.can_export_object(context, x)]
+            if len(exportable_objects) <= 0:
+                raise Warning("[DOS2DE-Physics] No objects to export.")
+                return {'CANCELLED'}
+
+        # Edits only reach the mesh data once they're loaded from edit mode.
+        if context.object is not None and context.object.mode == "EDIT":
+            context.object.update_from_editmode()
+
+        with scratch_scene("DOS2DE_Physics_Export") as (scene, datablocks):
+            # The game engine plays every visible layer of the scene.
+            scene.layers = [True] * 20
+            if self.export_method == "GAME_ENGINE":
+                scene.render.engine = "BLENDER_GAME"
+
+            with self.trace.stage("duplicate"):
+                print("[DOS2DE-Physics] Copying objects.")
+                export_objects = link_copies(scene, exportable_objects, datablocks)
+                # Copies are written to their original's planned file.
+                for source, obj in zip(exportable_objects, export_objects):
+                    if source.name in self.planned_paths:
+                        self.planned_paths[obj.name] = self.planned_paths[source.name]
+
+            with self.trace.stage("transform"):
+                print("[DOS2DE-Physics] Applying transformations for objects.")
+                # Matrices come from the originals, so children still see their parents' transforms.
+                for source, obj in zip(exportable_objects, export_objects):
+                    obj.hide_render = False
+                    if obj.type == "MESH":
+                        transform_mesh(obj.data, self.export_matrix(source))
+                        obj.matrix_world = Matrix.Identity(4)
+                if self.xflip:
+                    print("[DOS2DE-Physics] X-flipped meshes.")
+
+            with self.trace.stage("join"):
+                merged = OrderedDict()
+                for obj in export_objects:
+                    if obj.type == "MESH" and self.is_merged(obj):
+                        merged.setdefault(self.planned_paths[obj.name], []).append(obj)
+                for group in merged.values():
+                    print("[DOS2DE-Physics] Joining objects.")
+                    joined = group[0]
+                    joined.data = join_meshes(joined.name, [x.data for x in group])
+                    datablocks.append(joined.data)
+                    export_objects = [x for x in export_objects if x not in group[1:]]
+                    print("[DOS2DE-Physics] Objects joined into '{}'.".format(joined.name))
+
+            with self.trace.stage("armature"):
+                # The game engine only exports meshes parented to an armature, so unparented meshes share a temporary one.
+                unparented = [x for x in export_objects if self.export_method == "GAME_ENGINE" and x.type != "ARMATURE"
+                    and (x.parent is None or x.parent.type != "ARMATURE")]
+                if len(unparented) > 0:
+                    armature = bpy.data.objects.new("armbexporttemp", bpy.data.armatures.new("armbexporttempdata"))
+                    datablocks.extend((armature, armature.data))
+                    scene.objects.link(armature)
+                    armature.layers = [any(x.layers[i] for x in unparented) for i in range(20)]
+                    print("[DOS2DE-Physics] Created armature '{}' for {} object(s).".format(armature.name, len(unparented)))
+
+                opaque_materials = {}
+                for obj in unparented:
+                    mat = obj.data.materials[0] if len(obj.data.materials) > 0 else None
+                    if mat is not None and mat.game_settings.alpha_blend != "OPAQUE":
+                        # The copy's mesh gets an opaque copy of the material, the original stays as it is.
+                        if mat.name not in opaque_materials:
+                            print(" [DOS2DE-Physics] Set non-opaque material '{}[{}]' to OPAQUE.".format(mat.name, mat.game_settings.alpha_blend))
+                            opaque_materials[mat.name] = mat.copy()
+                            opaque_materials[mat.name].game_settings.alpha_blend = "OPAQUE"
+                            datablocks.append(opaque_materials[mat.name])
+                        obj.data.materials[0] = opaque_materials[mat.name]
+
+                    # Same result as parent_set(type="ARMATURE"): transforms are already baked and the armature sits at the origin.
+                    obj.parent = armature
+                    obj.matrix_parent_inverse = Matrix.Identity(4)
+                    obj.matrix_basis = Matrix.Identity(4)
+                    obj.modifiers.new("Armature", "ARMATURE").object = armature
+
+            bullet_objects = []
+            for obj in [x for x in export_objects if x.type == "MESH"]:
+                phys_type = bpy.data.objects[obj.name].game.physics_type
+                phys_enabled = bpy.data.objects[obj.name].game.use_collision_bounds
+
+                print("[DOS2DE-Physics] Phys type for '{}' is {}.".format(obj.name, phys_type))
+
+                if addon_prefs is not None and addon_prefs.export_use_defaults:
+                    if phys_enabled is False or phys_type is None or phys_type == "NO_COLLISION":
+                        print("[DOS2DE-Physics] Using default physics settings for '{}'.".format(obj.name))
+                        bpy.data.objects[obj.name].game.physics_type = self.physics_type
+                        if self.collision_bounds_type in exporter_bounds_fallback:
+                            bpy.data.objects[obj.name].game.collision_bounds_type = exporter_bounds_fallback[self.collision_bounds_type]
+                            if self.export_method == "NATIVE":
+                                self.exporter_bounds[obj.name] = self.collision_bounds_type
+                            else:
+                                print("[DOS2DE-Physics] The game engine can't export {} bounds, using {} for '{}'.".format(
+                                    self.collision_bounds_type, exporter_bounds_fallback[self.collision_bounds_type], obj.name))
+                        else:
+                            bpy.data.objects[obj.name].game.collision_bounds_type = self.collision_bounds_type
+                        bpy.data.objects[obj.name].game.use_collision_bounds = True
+                        phys_enabled = True
+
+                if phys_enabled:
+                    bullet_objects.append(obj)
+
+            if self.export_method == "GAME_ENGINE" and self.use_single_game_session and len(bullet_objects) > 1:
+                digests = {}
+                if self.cache is not None:
+                    with self.trace.stage("cache"):
+                        for obj in list(bullet_objects):
+                            digest = self.copy_digest(obj, *mesh_arrays(obj))
+                            if self.is_unchanged(context, obj, digest):
+                                bullet_objects.remove(obj)
+                            else:
+                                digests[obj.name] = digest
+                self.progress_total = 1
+                if len(bullet_objects) > 0:
+                    self.export_bullet_batch(context, bullet_objects, digests)
+                    yield bullet_objects[0].name
+            else:
+                self.progress_total = len(bullet_objects)
+                for obj in bullet_objects:
+                    arrays = None
+                    digest = None
+                    if self.cache is not None:
+                        with self.trace.stage("cache"):
+                            # The arrays that are hashed are the ones exported, so the digest always matches the file.
+                            arrays = mesh_arrays(obj)
+                            digest = self.copy_digest(obj, *arrays)
+                        if self.is_unchanged(context, obj, digest):
+                            yield obj.name
+                            continue
+                    print("[DOS2DE-Physics] Exporting object '{}'".format(obj.name))
+                    self.export_bullet(context, obj, digest=digest, arrays=arrays)
+                    yield obj.name
 
 def menu_func(self, context):
     self.layout.operator(LEADER_OT_physics_exporter.bl_idname, text="Divinity Physics (.bullet, .bin)")
+    if export_watch.is_watching():
+        self.layout.operator(export_watch.LEADER_OT_physics_export_watch_stop.bl_idname, text="Stop Watching Divinity Physics")
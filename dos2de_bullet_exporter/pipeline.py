@@ -0,0 +1,235 @@
+"""The export pipeline on plain arrays: export transforms, presets, shape building and rigid bodies.
+
+Nothing here touches bpy, so it runs in worker processes and plain Python as well as in Blender.
+Settings are plain namedtuples; physics_exporter fills them in from the operator and each object.
+"""
+from collections import namedtuple
+from math import cos, radians, sin
+
+import numpy
+
+from . import bullet_writer, convex_decomposition, convex_hull, decimate, geometry, instrumentation, primitive_fitting, quantized_bvh
+
+# Operator settings each preset sets.
+PRESETS = {
+    "DEFAULT": {
+        "xflip": True,
+        "use_rotation_x_amount": -90,
+        "use_rotation_axis_x": True,
+        "use_rotation_axis_y": False,
+        "use_rotation_axis_z": False,
+    },
+    "WEAPON_RIGID": {
+        "xflip": False,
+        "use_rotation_x_amount": 90,
+        "use_rotation_axis_x": True,
+        "use_rotation_axis_y": False,
+        "use_rotation_axis_z": False,
+    },
+    "WEAPON_RIGGED": {
+        "xflip": False,
+        "use_rotation_x_amount": 90,
+        "use_rotation_z_amount": 180,
+        "use_rotation_axis_x": True,
+        "use_rotation_axis_y": False,
+        "use_rotation_axis_z": True,
+    },
+}
+
+# rotations are (axis, degrees) pairs in the order they're applied: Y, Z, then X.
+TransformSettings = namedtuple("TransformSettings", ("rotations", "apply_each", "xflip"))
+
+ShapeSettings = namedtuple("ShapeSettings", (
+    "bounds", "margin", "use_mesh_cleanup", "weld_distance", "decimate_max_triangles", "decimate_tolerance",
+    "use_bvh", "use_compact_indices", "vertex_grid", "hull_max_vertices", "hull_shrink_wrap", "auto_primitive_tolerance", "auto_primitive_fallback",
+    "decomposition_max_parts", "decomposition_max_concavity", "decomposition_resolution"))
+
+BodySettings = namedtuple("BodySettings", ("physics_type", "mass", "friction", "restitution", "linear_damping", "angular_damping"))
+
+def axis_rotation(axis, degrees):
+    """4x4 rotation about "X", "Y" or "Z", like mathutils.Matrix.Rotation."""
+    c, s = cos(radians(degrees)), sin(radians(degrees))
+    i, j = {"X": (1, 2), "Y": (2, 0), "Z": (0, 1)}[axis]
+    matrix = numpy.identity(4)
+    matrix[i, i] = matrix[j, j] = c
+    matrix[i, j] = -s
+    matrix[j, i] = s
+    return matrix
+
+def export_matrix(world_matrix, settings):
+    """Compose an object's world matrix, the axis rotations and the X-flip into one matrix."""
+    rotation = numpy.identity(4)
+    for axis, degrees in settings.rotations:
+        if settings.apply_each:
+            rotation = axis_rotation(axis, degrees).dot(rotation)
+        else:
+            rotation = rotation.dot(axis_rotation(axis, degrees))
+    matrix = rotation.dot(numpy.asarray(world_matrix, dtype=numpy.float64))
+    if settings.xflip:
+        matrix = numpy.diag((-1.0, 1.0, 1.0, 1.0)).dot(matrix)
+    return matrix
+
+def transform_arrays(vertices, triangles, matrix):
+    """Bake matrix into vertex positions, reversing every triangle's winding if matrix mirrors them."""
+    vertices = geometry.transform_points(vertices, matrix).astype(numpy.float32)
+    triangles = numpy.asarray(triangles, dtype=numpy.int32).reshape(-1, 3)
+    if geometry.is_mirrored(matrix):
+        triangles = triangles[:, (0, 2, 1)]
+    return vertices, triangles
+
+def hull_points(vertices, settings):
+    points, triangles = convex_hull.convex_hull(vertices, settings.hull_max_vertices)
+    if settings.hull_shrink_wrap:
+        points = convex_hull.shrink_hull(points, triangles, settings.margin)
+    print("[DOS2DE-Physics] Reduced convex hull from {} to {} vertices.".format(len(vertices), len(points)))
+    return points
+
+def decomposition_shape(vertices, triangles, settings):
+    margin = settings.margin
+    parts = convex_decomposition.decompose(vertices, triangles, max_parts=settings.decomposition_max_parts,
+        max_concavity=settings.decomposition_max_concavity, resolution=settings.decomposition_resolution,
+        max_vertices=settings.hull_max_vertices)
+    children = []
+    for points, hull_triangles in parts:
+        if settings.hull_shrink_wrap:
+            points = convex_hull.shrink_hull(points, hull_triangles, margin)
+        children.append((bullet_writer.ConvexHullShape(points, margin), bullet_writer.IDENTITY_TRANSFORM))
+    print("[DOS2DE-Physics] Decomposed mesh into {} convex parts.".format(len(children)))
+    return bullet_writer.CompoundShape(children, margin)
+
+def primitive_shape(vertices, triangles, settings):
+    """Shape for the cheapest primitive that fits within the tolerance, or None."""
+    margin = settings.margin
+    fit = primitive_fitting.best_primitive(vertices, triangles, settings.auto_primitive_tolerance)
+    if fit is None:
+        return None
+    radius, height = fit.dimensions[0], fit.dimensions[-1]
+    if fit.shape == "SPHERE":
+        shape = bullet_writer.SphereShape(radius, margin)
+    elif fit.shape == "CAPSULE":
+        shape = bullet_writer.CapsuleShape(radius, height, margin=margin)
+    elif fit.shape == "BOX":
+        shape = bullet_writer.BoxShape(fit.dimensions, margin)
+    else:
+        shape = bullet_writer.CylinderShape(radius, height, margin=margin)
+    print("[DOS2DE-Physics] Fitted {} bounds, {:.1%} larger than the mesh.".format(fit.shape, fit.volume_error))
+    if numpy.allclose(fit.basis, numpy.identity(3), atol=1e-6) and numpy.allclose(fit.center, 0.0, atol=1e-6):
+        return shape
+    # Primitives are centered on their origin, so rotated or offset fits are placed by a compound.
+    return bullet_writer.CompoundShape([(shape, bullet_writer.make_transform(fit.basis, fit.center))], margin)
+
+def decimated_arrays(vertices, triangles, settings, name):
+    max_triangles, tolerance = settings.decimate_max_triangles, settings.decimate_tolerance
+    if (max_triangles <= 0 or len(triangles) <= max_triangles) and tolerance <= 0.0:
+        return vertices, triangles
+    decimated_vertices, decimated_triangles = decimate.decimate(vertices, triangles, max_triangles, tolerance)
+    print("[DOS2DE-Physics] Decimated '{}' from {} to {} triangles.".format(name, len(triangles), len(decimated_triangles)))
+    return decimated_vertices, decimated_triangles
+
+def snapped_arrays(vertices, triangles, settings, trace, name):
+    """Snap vertices to a grid of settings.vertex_grid, welding the ones that land on the same point."""
+    grid = settings.vertex_grid
+    snapped = numpy.round(numpy.asarray(vertices, dtype=numpy.float64) / grid) * grid
+    error = float(numpy.sqrt(((snapped - vertices) ** 2).sum(axis=1)).max()) if len(vertices) else 0.0
+    vertices, triangles, stats = geometry.clean_mesh(snapped.astype(numpy.float32), triangles)
+    trace.count("snapped_vertices", stats.welded_vertices)
+    trace.maximum("snap_error", error)
+    print("[DOS2DE-Physics] Snapped '{}' to a {} grid: moved vertices up to {:.6f}, welded {} vertices, removed {} triangles.".format(
+        name, grid, error, stats.welded_vertices, stats.degenerate_triangles + stats.duplicate_triangles))
+    return vertices, triangles
+
+def triangle_mesh_shape(vertices, triangles, settings, trace, name):
+    vertices, triangles = decimated_arrays(vertices, triangles, settings, name)
+    if settings.vertex_grid > 0.0:
+        vertices, triangles = snapped_arrays(vertices, triangles, settings, trace, name)
+    parts = [(vertices, triangles)]
+    if settings.use_compact_indices:
+        # Parts of up to 65536 vertices can use 16-bit indices.
+        parts = geometry.split_mesh_parts(vertices, triangles, 1 << 16)
+        trace.count("mesh_parts", len(parts))
+        if len(parts) > 1:
+            print("[DOS2DE-Physics] Split '{}' into {} parts for 16-bit indices.".format(name, len(parts)))
+    bvh = None
+    if settings.use_bvh:
+        with trace.stage("bvh"):
+            bvh = quantized_bvh.build_parts_bvh(parts)
+        if bvh is None and len(triangles):
+            print("[DOS2DE-Physics] '{}' has too many triangles for an embedded BVH, it will be built on load.".format(name))
+    return bullet_writer.TriangleMeshShape(margin=settings.margin, bvh=bvh, parts=parts,
+        compact_indices=settings.use_compact_indices)
+
+def cleaned_arrays(vertices, triangles, settings, trace, name):
+    with trace.stage("cleanup"):
+        vertices, triangles, stats = geometry.clean_mesh(vertices, triangles, settings.weld_distance)
+    trace.count("welded_vertices", stats.welded_vertices)
+    trace.count("removed_triangles", stats.degenerate_triangles + stats.duplicate_triangles)
+    if any(stats):
+        print("[DOS2DE-Physics] Cleaned up '{}': welded {} vertices, removed {} degenerate and {} duplicate triangles.".format(
+            name, *stats))
+    return vertices, triangles
+
+def build_shape(vertices, triangles, settings, trace=None, name="mesh"):
+    """Build the collision shape for a mesh already in export space. name only labels messages."""
+    if trace is None:
+        trace = instrumentation.ExportTrace()
+    if settings.use_mesh_cleanup:
+        vertices, triangles = cleaned_arrays(vertices, triangles, settings, trace, name)
+    else:
+        vertices, triangles = geometry.compact_vertices(vertices, triangles)
+    trace.count("vertices", len(vertices))
+    trace.count("triangles", len(triangles))
+    margin = settings.margin
+
+    bounds = settings.bounds
+    if bounds == "AUTO_PRIMITIVE":
+        shape = primitive_shape(vertices, triangles, settings)
+        if shape is None:
+            print("[DOS2DE-Physics] No primitive fits '{}', using {} bounds.".format(name, settings.auto_primitive_fallback))
+            bounds = settings.auto_primitive_fallback
+
+    if bounds == "AUTO_PRIMITIVE":
+        pass
+    elif bounds == "TRIANGLE_MESH":
+        shape = triangle_mesh_shape(vertices, triangles, settings, trace, name)
+    elif bounds == "CONVEX_HULL":
+        shape = bullet_writer.ConvexHullShape(hull_points(vertices, settings), margin)
+    elif bounds == "CONVEX_DECOMPOSITION":
+        shape = decomposition_shape(vertices, triangles, settings)
+    else:
+        # Like the game engine, primitive bounds are centered on the object origin.
+        extents = (vertices.max(axis=0) - vertices.min(axis=0)) * 0.5 if len(vertices) else numpy.zeros(3)
+        radius = max(extents[0], extents[1])
+        if bounds == "BOX":
+            shape = bullet_writer.BoxShape(extents, margin)
+        elif bounds == "SPHERE":
+            shape = bullet_writer.SphereShape(extents.max(), margin)
+        elif bounds == "CYLINDER":
+            shape = bullet_writer.CylinderShape(radius, 2.0 * extents[2], margin=margin)
+        elif bounds == "CONE":
+            shape = bullet_writer.ConeShape(radius, 2.0 * extents[2], margin=margin)
+        elif bounds == "CAPSULE":
+            shape = bullet_writer.CapsuleShape(radius, max(2.0 * (extents[2] - radius), 0.0), margin=margin)
+        else:
+            raise Exception("[DOS2DE-Physics] Unsupported collision bounds '{}'.".format(bounds))
+    return shape
+
+def rigid_body(shape, settings, transform=bullet_writer.IDENTITY_TRANSFORM):
+    """Place shape in a rigid body with the game engine's flags and damping for settings.physics_type."""
+    mass = 0.0
+    collision_flags = bullet_writer.CF_STATIC_OBJECT
+    angular_factor = (1.0, 1.0, 1.0)
+    if settings.physics_type in ("DYNAMIC", "RIGID_BODY"):
+        mass = settings.mass
+        collision_flags = 0
+        if settings.physics_type == "DYNAMIC":
+            angular_factor = (0.0, 0.0, 0.0)
+    elif settings.physics_type == "SENSOR":
+        collision_flags |= bullet_writer.CF_NO_CONTACT_RESPONSE
+
+    return bullet_writer.RigidBody(shape, mass=mass, friction=settings.friction, restitution=settings.restitution,
+        linear_damping=settings.linear_damping, angular_damping=settings.angular_damping,
+        collision_flags=collision_flags, angular_factor=angular_factor, transform=transform)
+
+def build_body(vertices, triangles, shape_settings, body_settings, trace=None, name="mesh"):
+    """Shape and rigid body for a mesh in export space, e.g. from a worker process."""
+    return rigid_body(build_shape(vertices, triangles, shape_settings, trace, name), body_settings)
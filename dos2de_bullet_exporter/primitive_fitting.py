@@ -0,0 +1,141 @@
+"""Fit enclosing primitives (sphere, capsule, box, cylinder) to a mesh and pick the cheapest one that fits."""
+from collections import namedtuple
+from math import pi
+
+import numpy
+
+from . import convex_hull
+from .geometry import is_closed, mesh_volume
+
+# Cheapest first, by how expensive the primitive is for the narrowphase.
+PRIMITIVE_ORDER = ("SPHERE", "CAPSULE", "BOX", "CYLINDER")
+# Vertex budget of the hull that orients the primitives and, for open meshes, stands in for their volume.
+FIT_HULL_VERTICES = 256
+
+# shape is a PRIMITIVE_ORDER entry. basis columns are the primitive's local axes (Z is the capsule
+# and cylinder axis), center is its origin, dimensions are half extents for boxes and
+# (radius, height) for the rest. volume_error is the volume it adds relative to the mesh.
+PrimitiveFit = namedtuple("PrimitiveFit", ("shape", "basis", "center", "dimensions", "volume_error"))
+
+def principal_axes(points, triangles):
+    """Right-handed axes of the area weighted covariance of a closed surface, longest axis last."""
+    p0, p1, p2 = points[triangles[:, 0]], points[triangles[:, 1]], points[triangles[:, 2]]
+    areas = numpy.sqrt((numpy.cross(p1 - p0, p2 - p0) ** 2).sum(axis=1)) * 0.5
+    if areas.sum() <= 0.0:
+        return numpy.identity(3)
+    centroids = (p0 + p1 + p2) / 3.0
+    mean = (centroids * areas[:, None]).sum(axis=0) / areas.sum()
+    # Covariance of a uniformly sampled triangle, summed over the surface.
+    covariance = numpy.zeros((3, 3))
+    for a, b in ((p0, p0), (p1, p1), (p2, p2)):
+        covariance += ((a - mean)[:, :, None] * (b - mean)[:, None, :] * areas[:, None, None]).sum(axis=0)
+    covariance += 9.0 * ((centroids - mean)[:, :, None] * (centroids - mean)[:, None, :] * areas[:, None, None]).sum(axis=0)
+    _, axes = numpy.linalg.eigh(covariance)
+    if numpy.linalg.det(axes) < 0.0:
+        axes[:, 0] = -axes[:, 0]
+    return axes
+
+def _circumsphere(points):
+    """Smallest sphere through 1 to 4 points."""
+    if len(points) == 1:
+        return points[0], 0.0
+    origin = points[0]
+    edges = points[1:] - origin
+    # Center = origin + edges.T * weights, equidistant from every point.
+    gram = edges.dot(edges.T)
+    rhs = 0.5 * (edges * edges).sum(axis=1)
+    try:
+        weights = numpy.linalg.solve(gram, rhs)
+    except numpy.linalg.LinAlgError:
+        weights = numpy.linalg.lstsq(gram, rhs)[0]
+    center = origin + edges.T.dot(weights)
+    return center, float(numpy.sqrt(((points - center) ** 2).sum(axis=1).max()))
+
+def _welzl(points, tolerance):
+    """Exact smallest enclosing sphere of a few points."""
+    def first_outside(center, radius, count):
+        outside = ((points[:count] - center) ** 2).sum(axis=1) > (radius + tolerance) ** 2
+        return int(numpy.argmax(outside)) if outside.any() else None
+
+    def grow(support, count):
+        center, radius = _circumsphere(points[support]) if support else (points[0], 0.0)
+        if len(support) == 4:
+            return center, radius
+        while True:
+            index = first_outside(center, radius, count)
+            if index is None:
+                return center, radius
+            center, radius = grow(support + [index], index)
+
+    return grow([], len(points))
+
+def minimal_sphere(points):
+    """Smallest enclosing sphere, solved exactly on a core set that grows by the farthest point outside it."""
+    points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 3)
+    tolerance = 1e-7 * max(numpy.abs(points).max(), 1e-12)
+    core = sorted(set(numpy.concatenate((points.argmin(axis=0), points.argmax(axis=0))).tolist()))
+    while True:
+        center, radius = _welzl(points[core], tolerance)
+        distances = ((points - center) ** 2).sum(axis=1)
+        farthest = int(numpy.argmax(distances))
+        if distances[farthest] <= (radius + tolerance) ** 2:
+            return center, radius
+        core.append(farthest)
+
+def _capsule(points, basis, center):
+    """Capsule along basis' Z axis through center, enclosing points."""
+    local = (points - center).dot(basis)
+    radius = numpy.sqrt((local[:, :2] ** 2).sum(axis=1)).max()
+    # Each point's axial position, minus the part a hemisphere of this radius can cover.
+    reach = numpy.sqrt(numpy.maximum(radius * radius - (local[:, :2] ** 2).sum(axis=1), 0.0))
+    top = (local[:, 2] - reach).max()
+    bottom = (local[:, 2] + reach).min()
+    height = max(top - bottom, 0.0)
+    return center + basis[:, 2] * ((top + bottom) * 0.5 if top > bottom else local[:, 2].mean()), radius, height
+
+def fit_primitives(vertices, triangles):
+    """Fit every primitive to the mesh. Returns a list of PrimitiveFit in PRIMITIVE_ORDER, or an empty list for flat meshes."""
+    vertices = numpy.asarray(vertices, dtype=numpy.float64).reshape(-1, 3)
+    triangles = numpy.asarray(triangles, dtype=numpy.int64).reshape(-1, 3)
+    if len(vertices) < 4:
+        return []
+    hull_points, hull_triangles = convex_hull.convex_hull(vertices, FIT_HULL_VERTICES)
+    hull_points = hull_points.astype(numpy.float64)
+    if len(hull_triangles) == 0:
+        return []
+    volume = mesh_volume(hull_points, hull_triangles)
+    if len(triangles) and is_closed(triangles):
+        volume = min(volume, mesh_volume(vertices, triangles))
+    if volume <= 0.0:
+        return []
+
+    # The budgeted hull only orients the primitives, they are sized to enclose every vertex.
+    basis = principal_axes(hull_points, hull_triangles)
+    local = vertices.dot(basis)
+    low, high = local.min(axis=0), local.max(axis=0)
+    box_center = basis.dot((low + high) * 0.5)
+    half_extents = (high - low) * 0.5
+
+    sphere_center, sphere_radius = minimal_sphere(vertices)
+    capsule_center, capsule_radius, capsule_height = _capsule(vertices, basis, box_center)
+    cylinder_radius = numpy.sqrt(((local[:, :2] - (low + high)[:2] * 0.5) ** 2).sum(axis=1)).max()
+
+    def fit(shape, basis, center, dimensions, primitive_volume):
+        return PrimitiveFit(shape, basis, center, tuple(float(x) for x in dimensions), (primitive_volume - volume) / volume)
+
+    identity = numpy.identity(3)
+    return [
+        fit("SPHERE", identity, sphere_center, (sphere_radius, 0.0), 4.0 / 3.0 * pi * sphere_radius ** 3),
+        fit("CAPSULE", basis, capsule_center, (capsule_radius, capsule_height),
+            pi * capsule_radius ** 2 * capsule_height + 4.0 / 3.0 * pi * capsule_radius ** 3),
+        fit("BOX", basis, box_center, half_extents, 8.0 * half_extents.prod()),
+        fit("CYLINDER", basis, box_center, (cylinder_radius, 2.0 * half_extents[2]),
+            pi * cylinder_radius ** 2 * 2.0 * half_extents[2]),
+    ]
+
+def best_primitive(vertices, triangles, tolerance):
+    """The cheapest primitive whose volume is within tolerance of the mesh's, or None."""
+    for candidate in fit_primitives(vertices, triangles):
+        if candidate.volume_error <= tolerance:
+            return candidate
+    return None
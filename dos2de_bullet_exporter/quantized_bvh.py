@@ -0,0 +1,178 @@
+"""Builds the quantized BVH a btBvhTriangleMeshShape carries, so it can be serialized instead of built on load.
+
+The tree follows btOptimizedBvh::build with quantized AABB compression: leaves are triangle AABBs
+quantized to 16 bits, nodes are laid out depth first with negative escape indices, and each range of
+triangles is split at the mean centroid along the axis of largest centroid variance, falling back to
+an even split when either side would get less than a third of the triangles. All ranges on one level
+of the tree are split at once with array operations.
+
+It's an equivalent tree, not the identical one: Bullet partitions each range with in-place swaps and
+computes splits in float32, while this partition is stable and uses float64, so node order and the order
+of triangles in the leaves can differ from what Bullet would build.
+"""
+from collections import namedtuple
+
+import numpy
+
+QUANTIZATION_MARGIN = 1.0
+MIN_AABB_DIMENSION = 0.002
+# Bullet packs the mesh part into the top bits of a leaf's triangle index.
+MAX_TRIANGLES = 1 << 21
+MAX_PARTS = 1 << 10
+# btQuantizedBvh's MAX_SUBTREE_SIZE_IN_BYTES, in 16 byte nodes.
+MAX_SUBTREE_NODES = 2048 // 16
+
+NODE_DTYPE = numpy.dtype([
+    ("m_quantizedAabbMin", "<u2", (3,)),
+    ("m_quantizedAabbMax", "<u2", (3,)),
+    ("m_escapeIndexOrTriangleIndex", "<i4"),
+])
+
+SUBTREE_DTYPE = numpy.dtype([
+    ("m_rootNodeIndex", "<i4"),
+    ("m_subtreeSize", "<i4"),
+    ("m_quantizedAabbMin", "<u2", (3,)),
+    ("m_quantizedAabbMax", "<u2", (3,)),
+])
+
+QuantizedBvh = namedtuple("QuantizedBvh", ("aabb_min", "aabb_max", "quantization", "node_count", "nodes", "subtrees"))
+
+def _quantize(points, aabb_min, aabb_max, quantization, is_max):
+    """btQuantizedBvh::quantizeWithClamp. Minimums round down to even values, maximums up to odd ones."""
+    scaled = (numpy.minimum(numpy.maximum(points, aabb_min), aabb_max) - aabb_min) * quantization
+    if is_max:
+        return (scaled + numpy.float32(1.0)).astype(numpy.uint16) | 1
+    return scaled.astype(numpy.uint16) & 0xfffe
+
+def _segments(starts, counts):
+    """Element positions of every [start, start + count) range, and which range each belongs to."""
+    offsets = numpy.cumsum(counts) - counts
+    ids = numpy.repeat(numpy.arange(len(counts)), counts)
+    return numpy.repeat(starts, counts) + numpy.arange(counts.sum()) - offsets[ids], ids, offsets
+
+def _max_axis(values):
+    """btVector3::maxAxis for each row."""
+    return numpy.where(values[:, 0] < values[:, 1],
+        numpy.where(values[:, 1] < values[:, 2], 2, 1),
+        numpy.where(values[:, 0] < values[:, 2], 2, 0))
+
+def build_quantized_bvh(vertices, triangles):
+    """Build the quantized BVH for a single part triangle mesh, or None if there are no triangles or too many."""
+    return build_parts_bvh([(vertices, triangles)])
+
+def build_parts_bvh(parts):
+    """Build the quantized BVH for a mesh of (vertices, triangles) parts.
+
+    Returns None if there are no triangles, too many parts or a part has too many triangles.
+    """
+    if len(parts) > MAX_PARTS or any(len(x[1]) >= MAX_TRIANGLES for x in parts):
+        return None
+    corners = numpy.concatenate([numpy.asarray(vertices, dtype=numpy.float32).reshape(-1, 3)[
+        numpy.asarray(triangles, dtype=numpy.int64).reshape(-1, 3)] for vertices, triangles in parts])
+    count = len(corners)
+    if count == 0:
+        return None
+    # Leaves hold the part in the top bits and the triangle within the part below them.
+    leaf_ids = numpy.concatenate([(numpy.int32(index) << 21) + numpy.arange(len(x[1]), dtype=numpy.int32)
+        for index, x in enumerate(parts)])
+
+    lower = corners.min(axis=1)
+    upper = corners.max(axis=1)
+    # Flat triangles get a minimum thickness, as in Bullet's QuantizedNodeTriangleCallback.
+    flat = upper - lower < MIN_AABB_DIMENSION
+    lower[flat] -= numpy.float32(MIN_AABB_DIMENSION * 0.5)
+    upper[flat] += numpy.float32(MIN_AABB_DIMENSION * 0.5)
+
+    aabb_min = corners.reshape(-1, 3).min(axis=0) - numpy.float32(QUANTIZATION_MARGIN)
+    aabb_max = corners.reshape(-1, 3).max(axis=0) + numpy.float32(QUANTIZATION_MARGIN)
+    quantization = numpy.float32(65533.0) / (aabb_max - aabb_min)
+    leaf_min = _quantize(lower, aabb_min, aabb_max, quantization, False)
+    leaf_max = _quantize(upper, aabb_min, aabb_max, quantization, True)
+    # Splits use the dequantized leaf centers, like Bullet.
+    centers = ((leaf_min.astype(numpy.float64) + leaf_max) * 0.5 / quantization + aabb_min)
+
+    node_min = numpy.zeros((2 * count, 3), dtype=numpy.uint16)
+    node_max = numpy.zeros((2 * count, 3), dtype=numpy.uint16)
+    escapes = numpy.zeros(2 * count, dtype=numpy.int32)
+    order = numpy.arange(count)
+    starts = numpy.zeros(1, dtype=numpy.int64)
+    counts = numpy.full(1, count, dtype=numpy.int64)
+    positions = numpy.zeros(1, dtype=numpy.int64)
+    large = []
+
+    while len(starts):
+        leaves = counts == 1
+        leaf_positions = positions[leaves]
+        leaf_triangles = order[starts[leaves]]
+        node_min[leaf_positions] = leaf_min[leaf_triangles]
+        node_max[leaf_positions] = leaf_max[leaf_triangles]
+        escapes[leaf_positions] = leaf_ids[leaf_triangles]
+
+        starts, counts, positions = starts[~leaves], counts[~leaves], positions[~leaves]
+        if not len(starts):
+            break
+        elements, ids, offsets = _segments(starts, counts)
+        members = order[elements]
+
+        node_min[positions] = numpy.minimum.reduceat(leaf_min[members], offsets)
+        node_max[positions] = numpy.maximum.reduceat(leaf_max[members], offsets)
+        escapes[positions] = -(2 * counts - 1)
+
+        member_centers = centers[members]
+        means = numpy.add.reduceat(member_centers, offsets) / counts[:, None]
+        variance = numpy.add.reduceat(member_centers * member_centers, offsets) - means * means * counts[:, None]
+        axes = _max_axis(variance)
+
+        # Centers above the mean go first, then the tree is split after them unless that's too lopsided.
+        above = member_centers[numpy.arange(len(members)), axes[ids]] > means[numpy.arange(len(starts)), axes][ids]
+        above_before = numpy.cumsum(above) - above
+        above_before -= above_before[offsets][ids]
+        left = numpy.bincount(ids, weights=above, minlength=len(starts)).astype(numpy.int64)
+        local = numpy.arange(len(members)) - offsets[ids]
+        order[starts[ids] + numpy.where(above, above_before, left[ids] + local - above_before)] = members
+        third = counts // 3
+        unbalanced = (left <= third) | (left >= counts - 1 - third)
+        left[unbalanced] = counts[unbalanced] >> 1
+
+        sizes = 2 * counts - 1
+        split = sizes > MAX_SUBTREE_NODES
+        large.append(numpy.stack((positions[split], sizes[split], left[split]), axis=1))
+
+        starts = numpy.stack((starts, starts + left), axis=1).ravel()
+        positions = numpy.stack((positions + 1, positions + 2 * left), axis=1).ravel()
+        counts = numpy.stack((left, counts - left), axis=1).ravel()
+
+    # Bullet sizes the node array for 2n nodes and fills 2n - 1 of them.
+    nodes = numpy.zeros(2 * count, dtype=NODE_DTYPE)
+    nodes["m_quantizedAabbMin"] = node_min
+    nodes["m_quantizedAabbMax"] = node_max
+    nodes["m_escapeIndexOrTriangleIndex"] = escapes
+    large = numpy.concatenate(large) if large else numpy.zeros((0, 3), dtype=numpy.int64)
+    return QuantizedBvh(aabb_min, aabb_max, quantization, 2 * count - 1, nodes, _subtree_headers(nodes, large))
+
+def _subtree_headers(nodes, large):
+    """Subtree headers in the order btQuantizedBvh::updateSubtreeHeaders adds them.
+
+    large holds (position, size, left leaf count) of every node over MAX_SUBTREE_NODES. Bullet visits
+    them after their children and adds whichever children fit in a subtree.
+    """
+    if len(large) == 0:
+        # Like btOptimizedBvh::build, a root that's a leaf gets a subtree size of 0.
+        root_size = max(-int(nodes["m_escapeIndexOrTriangleIndex"][0]), 0)
+        roots = numpy.zeros(1, dtype=numpy.int64)
+        sizes = numpy.full(1, root_size, dtype=numpy.int64)
+    else:
+        positions, sizes, left = large[:, 0], large[:, 1], large[:, 2]
+        large = large[numpy.lexsort((-positions, positions + sizes))]
+        positions, sizes, left = large[:, 0], large[:, 1], large[:, 2]
+        children = numpy.stack((positions + 1, positions + 2 * left), axis=1).ravel()
+        child_sizes = numpy.stack((2 * left - 1, sizes - 2 * left), axis=1).ravel()
+        fits = child_sizes <= MAX_SUBTREE_NODES
+        roots, sizes = children[fits], child_sizes[fits]
+
+    subtrees = numpy.zeros(len(roots), dtype=SUBTREE_DTYPE)
+    subtrees["m_rootNodeIndex"] = roots
+    subtrees["m_subtreeSize"] = sizes
+    subtrees["m_quantizedAabbMin"] = nodes["m_quantizedAabbMin"][roots]
+    subtrees["m_quantizedAabbMax"] = nodes["m_quantizedAabbMax"][roots]
+    return subtrees
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import numpy
+import pytest
+
+# The bpy-free modules import without Blender once the repository root is on the path.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def make_sphere(segments, rings, radius=1.0):
+    """A closed UV sphere, wound counter-clockwise seen from outside."""
+    u = numpy.linspace(0.0, 2.0 * numpy.pi, segments, endpoint=False)
+    v = numpy.linspace(0.0, numpy.pi, rings + 1)[1:-1]
+    uu, vv = numpy.meshgrid(u, v, indexing="ij")
+    ring_points = numpy.stack((numpy.cos(uu) * numpy.sin(vv), numpy.sin(uu) * numpy.sin(vv), numpy.cos(vv)), axis=-1) * radius
+    vertices = numpy.concatenate((ring_points.reshape(-1, 3), ((0.0, 0.0, radius), (0.0, 0.0, -radius))))
+    top, bottom = len(vertices) - 2, len(vertices) - 1
+
+    i, j = numpy.meshgrid(numpy.arange(segments), numpy.arange(rings - 2), indexing="ij")
+    a = i * (rings - 1) + j
+    b = ((i + 1) % segments) * (rings - 1) + j
+    quads = numpy.stack((a, b, b + 1, a + 1), axis=-1).reshape(-1, 4)
+    first = numpy.arange(segments) * (rings - 1)
+    last = first + rings - 2
+    triangles = numpy.concatenate((
+        quads[:, (0, 2, 1)], quads[:, (0, 3, 2)],
+        numpy.stack((numpy.full(segments, top), first, numpy.roll(first, -1)), axis=1),
+        numpy.stack((numpy.full(segments, bottom), numpy.roll(last, -1), last), axis=1),
+    ))
+    return vertices.astype(numpy.float32), triangles.astype(numpy.int32)
+
+@pytest.fixture
+def sphere():
+    return make_sphere
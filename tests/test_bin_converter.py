@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+
+import pytest
+
+from benchmarks.export_benchmark import write_converter_launcher
+from dos2de_bullet_exporter import bin_converter
+
+@pytest.fixture
+def converter(tmpdir):
+    return write_converter_launcher(str(tmpdir), sys.executable)
+
+def bullet_files(tmpdir, count):
+    paths = []
+    for index in range(count):
+        path = tmpdir.join("Object{}.bullet".format(index))
+        path.write_binary(b"BULLET" + bytes([index]))
+        paths.append(str(path))
+    return paths
+
+def test_conversions_replace_bullet_files(tmpdir, converter):
+    paths = bullet_files(tmpdir, 5)
+    pool = bin_converter.BinConverter(converter, max_workers=2)
+    for path in paths:
+        pool.submit(path)
+    results = pool.wait()
+    assert [x.bullet_path for x in results] == paths
+    assert bin_converter.failed_conversions(results) == []
+    for index, path in enumerate(paths):
+        assert not os.path.exists(path)
+        with open(os.path.splitext(path)[0] + ".bin", "rb") as f:
+            assert f.read() == b"BULLET" + bytes([index])
+
+def test_failures_keep_their_errors(tmpdir, converter):
+    missing = str(tmpdir.join("Missing.bullet"))
+    result = bin_converter.convert_bullet_file(converter, missing)
+    assert result.returncode == 1
+    assert "not found" in result.stderr
+    no_converter = bin_converter.convert_bullet_file(str(tmpdir.join("nothing.exe")), bullet_files(tmpdir, 1)[0])
+    assert no_converter.returncode is None and no_converter.stderr
+    assert bin_converter.failed_conversions([result, no_converter]) == [result, no_converter]
+
+def test_conversions_overlap(tmpdir, converter, monkeypatch):
+    monkeypatch.setenv("DOS2DE_CONVERTER_DELAY", "0.5")
+    pool = bin_converter.BinConverter(converter, max_workers=4)
+    started = time.perf_counter()
+    for path in bullet_files(tmpdir, 4):
+        pool.submit(path)
+    results = pool.wait()
+    assert bin_converter.failed_conversions(results) == []
+    # One at a time they'd take at least 2 seconds.
+    assert time.perf_counter() - started < 1.5
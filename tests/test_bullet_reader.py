@@ -0,0 +1,55 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from dos2de_bullet_exporter import bullet_reader, bullet_writer
+
+@pytest.fixture
+def bullet_folder(tmpdir, sphere):
+    vertices, triangles = sphere(16, 12)
+    tmpdir.mkdir("rocks")
+    bullet_writer.write_bullet_file(str(tmpdir.join("Box.bullet")), [bullet_writer.RigidBody(bullet_writer.BoxShape((1.0, 1.0, 1.0)))])
+    bullet_writer.write_bullet_file(str(tmpdir.join("rocks", "Rock.bullet")),
+        [bullet_writer.RigidBody(bullet_writer.TriangleMeshShape(vertices, triangles))])
+    return tmpdir
+
+def run_main(capsys, *args):
+    status = bullet_reader.main(list(args))
+    out, err = capsys.readouterr()
+    return status, out, err
+
+def test_folders_are_searched_recursively(bullet_folder, capsys):
+    status, out, _ = run_main(capsys, str(bullet_folder), "--json")
+    assert status == 0
+    reports = json.loads(out)
+    assert [os.path.basename(x["path"]) for x in reports] == ["Box.bullet", "Rock.bullet"]
+    assert [x["triangles"] for x in reports] == [0, 352]
+
+def test_sort_and_size_filter(bullet_folder, capsys):
+    _, out, _ = run_main(capsys, str(bullet_folder.join("**", "*.bullet")), "--json", "--sort", "bytes")
+    reports = json.loads(out)
+    assert [os.path.basename(x["path"]) for x in reports] == ["Rock.bullet", "Box.bullet"]
+    _, out, _ = run_main(capsys, str(bullet_folder), "--json", "--min-bytes", str(reports[1]["bytes"] + 1))
+    assert [os.path.basename(x["path"]) for x in json.loads(out)] == ["Rock.bullet"]
+
+def test_brief_and_full_reports(bullet_folder, capsys):
+    _, out, _ = run_main(capsys, str(bullet_folder), "--brief")
+    lines = out.splitlines()
+    assert len(lines) == 2
+    assert lines[1].endswith("Rock.bullet  [TRIANGLE_MESH]")
+    _, out, _ = run_main(capsys, str(bullet_folder.join("rocks", "Rock.bullet")))
+    assert "TRIANGLE_MESH" in out and "352 triangles in 1 part(s), int32 indices" in out
+
+def test_unreadable_files_fail(bullet_folder, capsys):
+    bullet_folder.join("Broken.bullet").write_binary(b"BULLET2.82 not really")
+    status, out, err = run_main(capsys, str(bullet_folder), "--brief")
+    assert status == 1
+    assert "Broken.bullet" in err
+    assert len(out.splitlines()) == 2
+
+def test_runs_as_a_plain_script(bullet_folder):
+    out = subprocess.check_output([sys.executable, bullet_reader.__file__, str(bullet_folder.join("Box.bullet")), "--brief"], cwd=str(bullet_folder))
+    assert "BOX" in out.decode("utf-8")
@@ -0,0 +1,80 @@
+import io
+
+import numpy
+import pytest
+
+from dos2de_bullet_exporter import bullet_reader, bullet_writer, geometry, quantized_bvh
+
+def round_trip(bodies):
+    stream = io.BytesIO()
+    bullet_writer.write_bullet(stream, bodies)
+    stream.seek(0)
+    return stream.getvalue(), bullet_reader.inspect_bullet(stream)
+
+def test_convex_hull_body_round_trip():
+    points = numpy.array(((0, 0, 0), (1, 0, 0), (0, 2, 0), (0, 0, 3)), dtype=numpy.float32)
+    body = bullet_writer.RigidBody(bullet_writer.ConvexHullShape(points, 0.04), mass=2.0, friction=0.7, restitution=0.1,
+        collision_flags=0)
+    data, report = round_trip([body])
+    assert report["bullet_version"] == bullet_writer.BULLET_VERSION
+    shape, = report["shapes"]
+    assert shape["type"] == "CONVEX_HULL"
+    assert shape["points"] == 4
+    assert shape["margin"] == pytest.approx(0.04)
+    assert numpy.allclose(shape["aabb"], ((0, 0, 0), (1, 2, 3)))
+    body, = report["bodies"]
+    assert body["mass"] == pytest.approx(2.0)
+    assert body["friction"] == pytest.approx(0.7)
+    assert body["restitution"] == pytest.approx(0.1)
+
+@pytest.mark.parametrize("segments, rings, compact, index_type", [
+    (8, 6, False, "int32"),
+    (8, 6, True, "uint8 triplets"),
+    (40, 30, True, "uint16 triplets"),
+])
+def test_triangle_mesh_index_types(sphere, segments, rings, compact, index_type):
+    vertices, triangles = sphere(segments, rings)
+    bvh = quantized_bvh.build_quantized_bvh(vertices, triangles)
+    shape = bullet_writer.TriangleMeshShape(vertices, triangles, bvh=bvh, compact_indices=compact)
+    data, report = round_trip([bullet_writer.RigidBody(shape)])
+    shape, = report["shapes"]
+    part, = shape["parts"]
+    assert part["index_type"] == index_type
+    assert (shape["vertices"], shape["triangles"]) == (len(vertices), len(triangles))
+    assert numpy.allclose(shape["aabb"], (vertices.min(axis=0), vertices.max(axis=0)))
+    assert shape["bvh"]["nodes"] == len(bvh.nodes)
+
+def test_compact_indices_are_smaller(sphere):
+    vertices, triangles = sphere(40, 30)
+    wide, _ = round_trip([bullet_writer.RigidBody(bullet_writer.TriangleMeshShape(vertices, triangles))])
+    compact, _ = round_trip([bullet_writer.RigidBody(bullet_writer.TriangleMeshShape(vertices, triangles, compact_indices=True))])
+    # 12 bytes of indices per triangle become 8.
+    assert len(wide) - len(compact) == 4 * len(triangles)
+
+def test_mesh_parts_round_trip(sphere):
+    vertices, triangles = sphere(64, 48)
+    parts = geometry.split_mesh_parts(vertices, triangles, 256)
+    shape = bullet_writer.TriangleMeshShape(parts=parts, bvh=quantized_bvh.build_parts_bvh(parts), compact_indices=True)
+    _, report = round_trip([bullet_writer.RigidBody(shape)])
+    shape, = report["shapes"]
+    assert len(shape["parts"]) == len(parts)
+    assert [x["vertices"] for x in shape["parts"]] == [len(x[0]) for x in parts]
+    assert set(x["index_type"] for x in shape["parts"]) == {"uint8 triplets"}
+    assert shape["triangles"] == len(triangles)
+
+def test_streamed_blocks_match_whole_writes(sphere, monkeypatch):
+    vertices, triangles = sphere(40, 30)
+    bodies = [bullet_writer.RigidBody(bullet_writer.TriangleMeshShape(vertices, triangles, compact_indices=True))]
+    whole, _ = round_trip(bodies)
+    monkeypatch.setattr(bullet_writer, "WRITE_BLOCK_BYTES", 64)
+    streamed, _ = round_trip(bodies)
+    assert streamed == whole
+
+def test_shared_child_shape_is_written_once():
+    box = bullet_writer.BoxShape((1.0, 2.0, 3.0))
+    compound = bullet_writer.CompoundShape([(box, bullet_writer.IDENTITY_TRANSFORM),
+        (box, bullet_writer.make_transform(origin=(5.0, 0.0, 0.0)))])
+    _, report = round_trip([bullet_writer.RigidBody(compound)])
+    assert [x["type"] for x in report["shapes"]].count("BOX") == 1
+    compound_entry = [x for x in report["shapes"] if x["type"] == "COMPOUND"][0]
+    assert numpy.allclose(compound_entry["aabb"], ((-1, -2, -3), (6, 2, 3)), atol=0.1)
@@ -0,0 +1,42 @@
+import numpy
+
+from dos2de_bullet_exporter import convex_decomposition, geometry
+
+def two_spheres(sphere):
+    vertices, triangles = sphere(16, 12)
+    return numpy.concatenate((vertices, vertices + (3.0, 0.0, 0.0))), numpy.concatenate((triangles, triangles + len(vertices)))
+
+def inside_hull(points, hull_points, triangles, tolerance):
+    p0, p1, p2 = (hull_points[triangles[:, i]].astype(numpy.float64) for i in range(3))
+    normals = numpy.cross(p1 - p0, p2 - p0)
+    normals /= numpy.linalg.norm(normals, axis=1)[:, None]
+    return (numpy.dot(points, normals.T) - (normals * p0).sum(axis=1) <= tolerance).all(axis=1)
+
+def test_convex_mesh_stays_one_part(sphere):
+    vertices, triangles = sphere(16, 12)
+    # Voxel steps make even a sphere's hull a little bigger than its voxels.
+    parts = convex_decomposition.decompose(vertices, triangles, max_concavity=0.2, resolution=2000)
+    assert len(parts) == 1
+
+def test_separate_pieces_get_their_own_hulls(sphere):
+    vertices, triangles = two_spheres(sphere)
+    parts = convex_decomposition.decompose(vertices, triangles, max_concavity=0.2, resolution=2000)
+    assert len(parts) == 2
+    for hull_points, hull_triangles in parts:
+        assert geometry.is_closed(hull_triangles)
+        # No hull bridges the gap between the spheres.
+        assert hull_points[:, 0].max() < 1.5 or hull_points[:, 0].min() > 1.5
+
+    # Every vertex is inside one of the hulls, up to a voxel.
+    covered = numpy.zeros(len(vertices), dtype=bool)
+    for hull_points, hull_triangles in parts:
+        covered |= inside_hull(vertices, hull_points, hull_triangles, 0.25)
+    assert covered.all()
+
+def test_threads_give_the_same_parts(sphere):
+    vertices, triangles = two_spheres(sphere)
+    serial = convex_decomposition.decompose(vertices, triangles, max_parts=4, resolution=2000)
+    threaded = convex_decomposition.decompose(vertices, triangles, max_parts=4, resolution=2000, workers=3)
+    assert len(serial) == len(threaded)
+    for (a_points, a_triangles), (b_points, b_triangles) in zip(serial, threaded):
+        assert numpy.array_equal(a_points, b_points) and numpy.array_equal(a_triangles, b_triangles)
@@ -0,0 +1,40 @@
+import itertools
+
+import numpy
+
+from dos2de_bullet_exporter import convex_hull, geometry
+
+def face_planes(points, triangles):
+    p0, p1, p2 = points[triangles[:, 0]], points[triangles[:, 1]], points[triangles[:, 2]]
+    normals = numpy.cross(p1 - p0, p2 - p0)
+    normals /= numpy.linalg.norm(normals, axis=1)[:, None]
+    return normals, (normals * p0).sum(axis=1)
+
+def test_hull_contains_points_and_faces_outward():
+    points = numpy.random.RandomState(4).normal(size=(500, 3))
+    hull_points, triangles = convex_hull.convex_hull(points)
+    assert geometry.is_closed(triangles)
+    normals, offsets = face_planes(hull_points.astype(numpy.float64), triangles)
+    assert (numpy.dot(points, normals.T) - offsets <= 1e-4).all()
+    assert (numpy.dot(hull_points.mean(axis=0), normals.T) - offsets < 0.0).all()
+
+def test_hull_of_cube_keeps_corners():
+    corners = numpy.array(list(itertools.product((-1.0, 1.0), repeat=3)))
+    inside = numpy.random.RandomState(1).uniform(-0.9, 0.9, size=(100, 3))
+    hull_points, triangles = convex_hull.convex_hull(numpy.concatenate((inside, corners)))
+    assert len(hull_points) == 8
+    assert sorted(map(tuple, hull_points.tolist())) == sorted(map(tuple, corners.tolist()))
+    assert geometry.mesh_volume(hull_points, triangles) == numpy.float32(8.0)
+
+def test_hull_vertex_limit():
+    points = numpy.random.RandomState(2).normal(size=(400, 3))
+    hull_points, triangles = convex_hull.convex_hull(points, max_vertices=16)
+    assert len(hull_points) <= 16
+    assert geometry.is_closed(triangles)
+
+def test_shrink_hull_moves_inward():
+    corners = numpy.array(list(itertools.product((-1.0, 1.0), repeat=3)))
+    hull_points, triangles = convex_hull.convex_hull(corners)
+    shrunk = convex_hull.shrink_hull(hull_points, triangles, 0.1)
+    assert (numpy.abs(shrunk) < 1.0).all()
+    assert (numpy.abs(shrunk) > 0.8).all()
@@ -0,0 +1,44 @@
+import numpy
+import pytest
+
+from dos2de_bullet_exporter import decimate, geometry
+
+def test_decimate_to_triangle_limit(sphere):
+    vertices, triangles = sphere(32, 24)
+    decimated_vertices, decimated_triangles = decimate.decimate(vertices, triangles, max_triangles=200)
+    assert 0 < len(decimated_triangles) <= 200
+    assert decimated_triangles.max() < len(decimated_vertices)
+    assert geometry.is_closed(decimated_triangles)
+    # The surface stays close to the unit sphere.
+    assert numpy.allclose(numpy.linalg.norm(decimated_vertices, axis=1), 1.0, atol=0.1)
+
+@pytest.mark.parametrize("scale", [0.01, 1.0, 100.0])
+def test_decimate_tolerance_is_a_distance(sphere, scale):
+    vertices, triangles = sphere(32, 24, radius=scale)
+    tolerance = 0.01 * scale
+    decimated_vertices, decimated_triangles = decimate.decimate(vertices, triangles, tolerance=tolerance)
+    assert len(decimated_triangles) < len(triangles) // 2
+    assert geometry.is_closed(decimated_triangles)
+
+    def deviation(vertices, triangles):
+        """How far the vertices and triangle centres are inside or outside the sphere."""
+        points = numpy.concatenate((vertices, vertices[triangles].mean(axis=1)))
+        return numpy.abs(numpy.linalg.norm(points, axis=1) - scale).max()
+    # The original already sags inside the sphere between its vertices.
+    assert deviation(decimated_vertices, decimated_triangles) <= tolerance + deviation(vertices, triangles)
+
+def test_decimate_flat_surface_with_tolerance():
+    grid = numpy.stack(numpy.meshgrid(numpy.arange(6.0), numpy.arange(6.0), indexing="ij"), axis=-1).reshape(-1, 2)
+    vertices = numpy.concatenate((grid, numpy.zeros((len(grid), 1))), axis=1)
+    index = numpy.arange(36).reshape(6, 6)
+    a, b, c, d = index[:-1, :-1].ravel(), index[1:, :-1].ravel(), index[1:, 1:].ravel(), index[:-1, 1:].ravel()
+    triangles = numpy.concatenate((numpy.stack((a, b, c), axis=1), numpy.stack((a, c, d), axis=1)))
+    decimated_vertices, decimated_triangles = decimate.decimate(vertices, triangles, tolerance=1e-4)
+    assert len(decimated_triangles) < len(triangles)
+    assert numpy.allclose(decimated_vertices[:, 2], 0.0)
+
+def test_decimate_without_limits_only_compacts(sphere):
+    vertices, triangles = sphere(8, 6)
+    decimated_vertices, decimated_triangles = decimate.decimate(vertices, triangles)
+    assert len(decimated_triangles) == len(triangles)
+    assert len(decimated_vertices) == len(vertices)
@@ -0,0 +1,50 @@
+import json
+import os
+
+import numpy
+
+from dos2de_bullet_exporter import export_cache
+
+def test_content_hash_covers_arrays_and_settings():
+    vertices = numpy.arange(9, dtype=numpy.float32).reshape(3, 3)
+    triangles = numpy.array(((0, 1, 2),), dtype=numpy.int32)
+    digest = export_cache.content_hash([vertices, triangles], {"margin": 0.04, "bounds": "TRIANGLE_MESH"})
+    assert digest == export_cache.content_hash([vertices.copy(), triangles], {"bounds": "TRIANGLE_MESH", "margin": 0.04})
+    moved = vertices.copy()
+    moved[0, 0] = 0.5
+    assert digest != export_cache.content_hash([moved, triangles], {"margin": 0.04, "bounds": "TRIANGLE_MESH"})
+    assert digest != export_cache.content_hash([vertices, triangles], {"margin": 0.06, "bounds": "TRIANGLE_MESH"})
+    # The same bytes with another type or shape are other geometry.
+    assert digest != export_cache.content_hash([vertices.view(numpy.int32), triangles], {"margin": 0.04, "bounds": "TRIANGLE_MESH"})
+    assert digest != export_cache.content_hash([vertices.reshape(9, 1), triangles], {"margin": 0.04, "bounds": "TRIANGLE_MESH"})
+
+def test_cache_round_trip(tmpdir):
+    export_path = str(tmpdir.join("Rock.bullet"))
+    output_path = str(tmpdir.join("Rock.bin"))
+    cache = export_cache.ExportCache()
+    assert not cache.is_current(export_path, "abc", export_path)
+    cache.update(export_path, "abc")
+    cache.save()
+
+    cache = export_cache.ExportCache()
+    # The output has to exist too.
+    assert not cache.is_current(export_path, "abc", output_path)
+    open(output_path, "wb").close()
+    assert cache.is_current(export_path, "abc", output_path)
+    assert not cache.is_current(export_path, "abd", output_path)
+
+def test_unreadable_or_old_caches_are_ignored(tmpdir):
+    export_path = str(tmpdir.join("Rock.bullet"))
+    open(export_path, "wb").close()
+    cache_path = str(tmpdir.join(export_cache.CACHE_FILENAME))
+    with open(cache_path, "w") as f:
+        json.dump({"version": export_cache.CACHE_VERSION - 1, "exports": {"Rock.bullet": "abc"}}, f)
+    assert not export_cache.ExportCache().is_current(export_path, "abc", export_path)
+    with open(cache_path, "w") as f:
+        f.write("{not json")
+    cache = export_cache.ExportCache()
+    assert not cache.is_current(export_path, "abc", export_path)
+    cache.update(export_path, "abc")
+    cache.save()
+    assert export_cache.ExportCache().is_current(export_path, "abc", export_path)
+    assert not os.path.exists(cache_path + ".tmp")
@@ -0,0 +1,47 @@
+import json
+import os
+
+from dos2de_bullet_exporter import export_plan
+
+def test_plan_groups_objects_by_normalized_path(tmpdir):
+    root = str(tmpdir)
+    files = export_plan.plan_files([
+        ("Rock", os.path.join(root, "rocks", "Rock.bullet")),
+        ("Tree", os.path.join(root, "Tree.bullet")),
+        ("Rock.001", os.path.join(root, "rocks", "..", "rocks", "Rock.bullet")),
+    ])
+    assert [x.objects for x in files] == [["Rock", "Rock.001"], ["Tree"]]
+    # The first spelling of a path is the one kept.
+    assert files[0].path == os.path.join(root, "rocks", "Rock.bullet")
+    assert export_plan.collisions(files) == [files[0]]
+
+def test_keep_last_still_reports_the_collision(tmpdir):
+    files = export_plan.plan_files([(name, str(tmpdir.join("Rock.bullet"))) for name in ("A", "B", "C")])
+    export_plan.keep_last(files[0])
+    assert files[0].objects == ["C"]
+    assert files[0].skipped == ["A", "B"]
+    assert export_plan.collisions(files) == files
+
+def test_create_directories_once(tmpdir):
+    files = export_plan.plan_files([
+        ("A", str(tmpdir.join("new", "A.bullet"))),
+        ("B", str(tmpdir.join("new", "B.bullet"))),
+        ("C", str(tmpdir.join("C.bullet"))),
+    ])
+    assert export_plan.create_directories(files) == [str(tmpdir.join("new"))]
+    assert tmpdir.join("new").check(dir=True)
+    assert export_plan.create_directories(files) == []
+
+def test_save_plan(tmpdir):
+    files = export_plan.plan_files([("A", str(tmpdir.join("A.bullet"))), ("B", str(tmpdir.join("A.bullet")))])
+    export_plan.keep_last(files[0])
+    path = str(tmpdir.join("plan.json"))
+    export_plan.save_plan(path, files, "LAST")
+    with open(path) as f:
+        plan = json.load(f)
+    assert plan == {
+        "version": export_plan.PLAN_VERSION,
+        "collision_mode": "LAST",
+        "files": [{"path": str(tmpdir.join("A.bullet")), "objects": ["B"], "skipped": ["A"]}],
+        "collisions": 1,
+    }
@@ -0,0 +1,76 @@
+import numpy
+import pytest
+
+from dos2de_bullet_exporter import geometry, pipeline
+
+def compose(rotation, translation, linear):
+    matrix = numpy.identity(4)
+    matrix[:3, :3] = numpy.dot(rotation, linear)
+    matrix[:3, 3] = translation
+    return matrix
+
+@pytest.mark.parametrize("scale", [(1.0, 1.0, 1.0), (2.0, 0.5, 3.0), (-1.0, 1.0, 1.0), (1.0, -2.0, 1.5)])
+def test_split_rigid_transform_recomposes(scale):
+    rotation = pipeline.axis_rotation("Z", 30.0).dot(pipeline.axis_rotation("X", -75.0))
+    matrix = rotation.dot(numpy.diag(tuple(scale) + (1.0,)))
+    matrix[:3, 3] = (1.0, -2.0, 0.5)
+
+    rotation, translation, linear = geometry.split_rigid_transform(matrix)
+    assert numpy.allclose(numpy.dot(rotation, rotation.T), numpy.identity(3))
+    assert numpy.linalg.det(rotation) == pytest.approx(1.0)
+    assert numpy.allclose(compose(rotation, translation, linear), matrix)
+
+def test_split_rigid_transform_linear_ignores_rotation():
+    mirror = numpy.diag((-2.0, 1.0, 1.0, 1.0))
+    linears = [geometry.split_rigid_transform(pipeline.axis_rotation(axis, angle).dot(mirror))[2]
+        for axis, angle in (("X", 0.0), ("Y", 40.0), ("Z", 130.0))]
+    for linear in linears[1:]:
+        assert numpy.allclose(linear, linears[0])
+
+def test_split_mesh_parts(sphere):
+    vertices, triangles = sphere(64, 48)
+    parts = geometry.split_mesh_parts(vertices, triangles, 500)
+    assert len(parts) > 1
+    assert all(len(part_vertices) <= 500 for part_vertices, _ in parts)
+    assert sum(len(part_triangles) for _, part_triangles in parts) == len(triangles)
+
+    def corners(parts):
+        """Each triangle's corner positions, in a comparable order."""
+        return sorted(map(tuple, numpy.concatenate([numpy.round(v[t].reshape(-1, 9), 5) for v, t in parts]).tolist()))
+    assert corners(parts) == corners([(vertices, triangles)])
+
+def test_split_mesh_parts_keeps_small_meshes(sphere):
+    vertices, triangles = sphere(8, 6)
+    parts = geometry.split_mesh_parts(vertices, triangles, 1 << 16)
+    assert len(parts) == 1
+    assert numpy.array_equal(parts[0][0], vertices) and numpy.array_equal(parts[0][1], triangles)
+
+def test_clean_mesh_welds_and_drops_degenerate_triangles():
+    vertices = numpy.array(((0, 0, 0), (1, 0, 0), (0, 1, 0), (1e-6, 0, 0)), dtype=numpy.float32)
+    triangles = numpy.array(((0, 1, 2), (3, 1, 2), (0, 3, 1)), dtype=numpy.int32)
+    vertices, triangles, stats = geometry.clean_mesh(vertices, triangles, 1e-4)
+    assert len(vertices) == 3
+    assert len(triangles) == 1
+    assert stats.welded_vertices == 1
+
+@pytest.mark.parametrize("xflip", [False, True])
+def test_negatively_scaled_objects_keep_facing_outward(sphere, xflip):
+    vertices, triangles = sphere(8, 6)
+    world = pipeline.axis_rotation("Z", 30.0).dot(numpy.diag((1.0, -2.0, 1.5, 1.0)))
+    world[:3, 3] = (3.0, 0.0, -1.0)
+    matrix = pipeline.export_matrix(world, pipeline.TransformSettings([("X", 90.0)], False, xflip))
+
+    def signed_volume(vertices, triangles):
+        p0, p1, p2 = (vertices[triangles[:, i]].astype(numpy.float64) for i in range(3))
+        return (p0 * numpy.cross(p1, p2)).sum() / 6.0
+
+    # Evaluated and copied objects bake the whole matrix, instances only its linear part.
+    evaluated = pipeline.transform_arrays(vertices, triangles, matrix)
+    rotation, origin, linear = geometry.split_rigid_transform(matrix)
+    shared = numpy.identity(4)
+    shared[:3, :3] = linear
+    instanced = pipeline.transform_arrays(vertices, triangles, shared)
+    for baked_vertices, baked_triangles in (evaluated, instanced):
+        assert signed_volume(baked_vertices - baked_vertices.mean(axis=0), baked_triangles) > 0.0
+    assert numpy.array_equal(evaluated[1], instanced[1])
+    assert numpy.allclose(numpy.dot(instanced[0], rotation.T) + origin, evaluated[0], atol=1e-5)
@@ -0,0 +1,78 @@
+import numpy
+import pytest
+
+from dos2de_bullet_exporter import bullet_writer, instrumentation, pipeline
+
+SETTINGS = pipeline.ShapeSettings(
+    bounds="TRIANGLE_MESH", margin=0.04, use_mesh_cleanup=False, weld_distance=0.0001, decimate_max_triangles=0,
+    decimate_tolerance=0.0, use_bvh=False, use_compact_indices=False, vertex_grid=0.0, hull_max_vertices=32,
+    hull_shrink_wrap=False, auto_primitive_tolerance=0.1, auto_primitive_fallback="CONVEX_HULL",
+    decomposition_max_parts=4, decomposition_max_concavity=0.2, decomposition_resolution=2000)
+
+def test_triangle_mesh_options(sphere):
+    vertices, triangles = sphere(16, 12)
+    # A duplicated vertex for the cleanup to weld.
+    vertices = numpy.concatenate((vertices, vertices[:1]))
+    triangles = numpy.where(triangles == 0, len(vertices) - 1, triangles)
+    trace = instrumentation.ExportTrace()
+    shape = pipeline.build_shape(vertices, triangles, SETTINGS._replace(use_mesh_cleanup=True, use_bvh=True,
+        use_compact_indices=True, decimate_max_triangles=100), trace)
+    assert isinstance(shape, bullet_writer.TriangleMeshShape)
+    (part_vertices, part_triangles), = shape.parts
+    assert part_triangles.max() < len(part_vertices)
+    assert 0 < len(part_triangles) <= 100
+    assert shape.compact_indices and shape.bvh is not None
+    assert trace.counters["welded_vertices"] == 1
+    assert trace.counters["triangles"] == len(triangles)
+
+def test_plain_triangle_mesh_drops_unused_vertices(sphere):
+    vertices, triangles = sphere(8, 6)
+    shape = pipeline.build_shape(numpy.concatenate((vertices, [(5.0, 5.0, 5.0)])), triangles, SETTINGS)
+    (part_vertices, part_triangles), = shape.parts
+    assert len(part_vertices) == len(vertices) and len(part_triangles) == len(triangles)
+    assert shape.bvh is None and not shape.compact_indices
+
+def test_convex_hull_vertex_budget(sphere):
+    vertices, triangles = sphere(16, 12)
+    shape = pipeline.build_shape(vertices, triangles, SETTINGS._replace(bounds="CONVEX_HULL"))
+    assert isinstance(shape, bullet_writer.ConvexHullShape)
+    assert 4 <= len(shape.points) <= SETTINGS.hull_max_vertices
+
+def test_convex_decomposition(sphere):
+    vertices, triangles = sphere(12, 8)
+    vertices = numpy.concatenate((vertices, vertices + (3.0, 0.0, 0.0)))
+    triangles = numpy.concatenate((triangles, triangles + len(vertices) // 2))
+    shape = pipeline.build_shape(vertices, triangles, SETTINGS._replace(bounds="CONVEX_DECOMPOSITION"))
+    assert isinstance(shape, bullet_writer.CompoundShape)
+    assert len(shape.children) == 2
+    assert all(isinstance(child, bullet_writer.ConvexHullShape) for child, _ in shape.children)
+
+def test_auto_primitive(sphere):
+    vertices, triangles = sphere(32, 24)
+    shape = pipeline.build_shape(vertices, triangles, SETTINGS._replace(bounds="AUTO_PRIMITIVE"))
+    assert isinstance(shape, bullet_writer.SphereShape)
+    assert shape.radius == pytest.approx(1.0, abs=1e-4)
+
+    # Offset fits are placed by a compound.
+    shape = pipeline.build_shape(vertices + (0.0, 2.0, 0.0), triangles, SETTINGS._replace(bounds="AUTO_PRIMITIVE"))
+    (child, transform), = shape.children
+    assert isinstance(child, bullet_writer.SphereShape)
+    assert numpy.allclose(transform["m_origin"][:3], (0.0, 2.0, 0.0), atol=1e-4)
+
+def test_auto_primitive_fallback(sphere):
+    vertices, triangles = sphere(16, 12)
+    # Nothing fits two spheres closely, so they get the fallback bounds.
+    vertices = numpy.concatenate((vertices, vertices + (3.0, 0.0, 0.0)))
+    triangles = numpy.concatenate((triangles, triangles + len(vertices) // 2))
+    shape = pipeline.build_shape(vertices, triangles, SETTINGS._replace(bounds="AUTO_PRIMITIVE"))
+    assert isinstance(shape, bullet_writer.ConvexHullShape)
+
+def test_primitive_bounds_are_centered_on_the_origin(sphere):
+    vertices, triangles = sphere(8, 6)
+    vertices = vertices * (2.0, 1.0, 0.5) + (1.0, 0.0, 0.0)
+    box = pipeline.build_shape(vertices, triangles, SETTINGS._replace(bounds="BOX"))
+    assert box.half_extents == pytest.approx((2.0, 1.0, 0.5), abs=1e-3)
+    capsule = pipeline.build_shape(vertices, triangles, SETTINGS._replace(bounds="CAPSULE"))
+    assert (capsule.radius, capsule.height) == pytest.approx((2.0, 0.0), abs=1e-3)
+    with pytest.raises(Exception):
+        pipeline.build_shape(vertices, triangles, SETTINGS._replace(bounds="PLANE"))
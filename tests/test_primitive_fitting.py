@@ -0,0 +1,72 @@
+import itertools
+
+import numpy
+import pytest
+
+from dos2de_bullet_exporter import convex_hull, pipeline, primitive_fitting
+
+ROTATION = pipeline.axis_rotation("Z", 35.0).dot(pipeline.axis_rotation("X", 60.0))[:3, :3]
+OFFSET = numpy.array((2.0, -1.0, 0.5))
+
+def place(vertices):
+    return numpy.dot(vertices, ROTATION.T) + OFFSET
+
+def encloses(fit, points, tolerance=1e-5):
+    local = numpy.dot(points - fit.center, fit.basis)
+    radius, height = fit.dimensions[:2]
+    if fit.shape == "SPHERE":
+        return (numpy.linalg.norm(local, axis=1) <= radius + tolerance).all()
+    if fit.shape == "BOX":
+        return (numpy.abs(local) <= numpy.array(fit.dimensions) + tolerance).all()
+    if fit.shape == "CYLINDER":
+        return (numpy.linalg.norm(local[:, :2], axis=1) <= radius + tolerance).all() and (numpy.abs(local[:, 2]) <= height * 0.5 + tolerance).all()
+    axial = numpy.clip(local[:, 2], -height * 0.5, height * 0.5)
+    return (numpy.linalg.norm(local - axial[:, None] * (0.0, 0.0, 1.0), axis=1) <= radius + tolerance).all()
+
+def test_minimal_sphere():
+    points = numpy.random.RandomState(3).normal(size=(300, 3))
+    center, radius = primitive_fitting.minimal_sphere(points)
+    distances = numpy.linalg.norm(points - center, axis=1)
+    assert (distances <= radius + 1e-6).all()
+    # Smallest: at least two points lie on it.
+    assert (distances >= radius - 1e-6).sum() >= 2
+
+def test_box_fits_a_box():
+    corners = numpy.array(list(itertools.product((-1.5, 1.5), (-0.5, 0.5), (-0.25, 0.25))))
+    vertices, triangles = convex_hull.convex_hull(place(corners))
+    fit = primitive_fitting.best_primitive(vertices, triangles, 0.05)
+    assert fit.shape == "BOX"
+    assert sorted(fit.dimensions) == pytest.approx([0.25, 0.5, 1.5], abs=1e-4)
+    assert numpy.allclose(fit.center, OFFSET, atol=1e-4)
+
+def test_sphere_fits_a_sphere(sphere):
+    vertices, triangles = sphere(32, 24)
+    fit = primitive_fitting.best_primitive(place(vertices), triangles, 0.05)
+    assert fit.shape == "SPHERE"
+    assert fit.dimensions[0] == pytest.approx(1.0, abs=1e-4)
+    assert numpy.allclose(fit.center, OFFSET, atol=1e-4)
+
+def test_capsule_fits_a_stretched_sphere(sphere):
+    vertices, triangles = sphere(32, 24)
+    # Pull the hemispheres apart along Z, leaving a cylinder of height 3 between them.
+    vertices = vertices + numpy.where(vertices[:, 2:] > 1e-6, 1.5, -1.5) * (0.0, 0.0, 1.0)
+    fit = primitive_fitting.best_primitive(place(vertices), triangles, 0.05)
+    assert fit.shape == "CAPSULE"
+    assert fit.dimensions == pytest.approx((1.0, 3.0), abs=1e-2)
+    assert abs(numpy.dot(fit.basis[:, 2], ROTATION[:, 2])) == pytest.approx(1.0, abs=1e-4)
+
+@pytest.mark.parametrize("stretch", [1.0, 3.0])
+def test_every_fit_encloses_the_mesh(sphere, stretch):
+    vertices, triangles = sphere(12, 8)
+    vertices = place(vertices * (1.0, 0.5, stretch) + numpy.random.RandomState(5).uniform(-0.1, 0.1, size=vertices.shape))
+    fits = primitive_fitting.fit_primitives(vertices, triangles)
+    assert [x.shape for x in fits] == list(primitive_fitting.PRIMITIVE_ORDER)
+    for fit in fits:
+        assert encloses(fit, vertices), fit.shape
+        assert fit.volume_error >= 0.0
+
+def test_flat_mesh_has_no_fit():
+    vertices = numpy.array(((0, 0, 0), (1, 0, 0), (0, 1, 0), (1, 1, 0)), dtype=numpy.float32)
+    triangles = numpy.array(((0, 1, 2), (2, 1, 3)), dtype=numpy.int32)
+    assert primitive_fitting.fit_primitives(vertices, triangles) == []
+    assert primitive_fitting.best_primitive(vertices, triangles, 1.0) is None
@@ -0,0 +1,67 @@
+import numpy
+import pytest
+
+from dos2de_bullet_exporter import geometry, quantized_bvh
+
+def check_bvh(bvh, parts):
+    """Walk the tree, checking escape indices, bounds and that every triangle is a leaf once."""
+    nodes = bvh.nodes[:bvh.node_count]
+    escapes = nodes["m_escapeIndexOrTriangleIndex"].astype(numpy.int64)
+    lower = nodes["m_quantizedAabbMin"].astype(numpy.int64)
+    upper = nodes["m_quantizedAabbMax"].astype(numpy.int64)
+    leaves = []
+
+    def walk(position):
+        """Return the size of the subtree at position."""
+        if escapes[position] >= 0:
+            leaves.append(escapes[position])
+            return 1
+        left = position + 1
+        left_size = walk(left)
+        right = left + left_size
+        right_size = walk(right)
+        assert 1 + left_size + right_size == -escapes[position]
+        for child in (left, right):
+            assert (lower[position] <= lower[child]).all() and (upper[child] <= upper[position]).all()
+        return -escapes[position]
+
+    assert walk(0) == bvh.node_count
+    leaves = numpy.array(leaves)
+    expected = numpy.concatenate([(index << 21) + numpy.arange(len(t)) for index, (v, t) in enumerate(parts)])
+    assert numpy.array_equal(numpy.sort(leaves), numpy.sort(expected))
+
+    # Every leaf's box holds its triangle.
+    positions = numpy.flatnonzero(escapes >= 0)
+    for position in positions:
+        part_vertices, part_triangles = parts[escapes[position] >> 21]
+        corners = numpy.asarray(part_vertices, dtype=numpy.float32)[part_triangles[escapes[position] & ((1 << 21) - 1)]]
+        quantized_min = quantized_bvh._quantize(corners.min(axis=0), bvh.aabb_min, bvh.aabb_max, bvh.quantization, False)
+        quantized_max = quantized_bvh._quantize(corners.max(axis=0), bvh.aabb_min, bvh.aabb_max, bvh.quantization, True)
+        assert (lower[position] <= quantized_min).all() and (quantized_max <= upper[position]).all()
+
+    for subtree in bvh.subtrees:
+        assert subtree["m_subtreeSize"] <= quantized_bvh.MAX_SUBTREE_NODES
+
+@pytest.mark.parametrize("segments, rings", [(3, 2), (8, 6), (40, 30)])
+def test_single_part_bvh(sphere, segments, rings):
+    vertices, triangles = sphere(segments, rings)
+    bvh = quantized_bvh.build_quantized_bvh(vertices, triangles)
+    assert bvh.node_count == 2 * len(triangles) - 1
+    check_bvh(bvh, [(vertices, triangles)])
+
+def test_parts_bvh(sphere):
+    vertices, triangles = sphere(48, 32)
+    parts = geometry.split_mesh_parts(vertices, triangles, 300)
+    assert len(parts) > 1
+    check_bvh(quantized_bvh.build_parts_bvh(parts), parts)
+
+def test_single_leaf_root_subtree_is_empty():
+    bvh = quantized_bvh.build_quantized_bvh(((0, 0, 0), (1, 0, 0), (0, 1, 0)), ((0, 1, 2),))
+    assert bvh.node_count == 1
+    assert len(bvh.subtrees) == 1
+    assert bvh.subtrees[0]["m_subtreeSize"] == 0
+
+def test_bvh_limits():
+    assert quantized_bvh.build_quantized_bvh(numpy.zeros((0, 3)), numpy.zeros((0, 3), dtype=numpy.int32)) is None
+    part = (((0, 0, 0), (1, 0, 0), (0, 1, 0)), ((0, 1, 2),))
+    assert quantized_bvh.build_parts_bvh([part] * (quantized_bvh.MAX_PARTS + 1)) is None